@@ -0,0 +1,213 @@
+"""
+Bear-off databases
+One-sided: for every distribution of up to 15 checkers on a player's six home points
+(54264 positions) the database holds the exact probability distribution of
+the number of rolls needed to bear off with optimal play, plus its mean.
+Two one-sided distributions give the exact cubeless winning chance of any
+position where both sides are bearing off (gammons are not modelled).
+
+Two-sided: for every pair of home boards with up to 6 checkers each (924 x 924
+positions) the exact cubeless winning chance of the side on roll and its
+money-game cubeful equity for each cube position, solved jointly for both
+sides (no gammons are possible with 9+ checkers already off).
+
+Both files are generated by build_bearoff_db.py and memory-mapped read-only,
+so every gunicorn worker shares a single copy through the page cache.
+
+One-sided file layout (little-endian):
+    header  - magic (8 bytes), positions (uint32), checkers (uint16), rolls (uint16)
+    means   - float32[positions]: expected rolls to bear off
+    dists   - uint16[positions][rolls]: P(done in exactly i rolls) * 65535, i = 0..rolls-1
+
+Two-sided file layout (little-endian), indexed [on-roll rank][other rank]:
+    header  - magic (8 bytes), positions (uint32), checkers (uint16), equity tables (uint16, 3)
+    wins    - uint16[positions][positions]: cubeless P(side on roll wins) * 65535
+    equity  - int16[3][positions][positions]: cubeful equity * 32767 before any
+              cube action, with the cube centered / owned by the side on roll /
+              owned by the other side
+"""
+
+import mmap
+import os
+import struct
+from math import comb
+
+import numpy as np
+
+from board import CHECKERS_PER_PLAYER, HOME_BOARD
+
+BEAROFF_MAGIC = b'BGBEAR1\n'
+HEADER_FORMAT = '<8sIHH'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+HOME_POINTS = 6
+MAX_ROLLS = 32
+NUM_POSITIONS = comb(CHECKERS_PER_PLAYER + HOME_POINTS, HOME_POINTS)  # 54264
+DIST_SCALE = 65535
+
+TWO_SIDED_MAGIC = b'BGBEAR2\n'
+TWO_SIDED_CHECKERS = 6
+TWO_SIDED_POSITIONS = comb(TWO_SIDED_CHECKERS + HOME_POINTS, HOME_POINTS)  # 924
+EQUITY_SCALE = 32767
+
+# Cube positions, from the point of view of the side on roll
+CUBE_CENTERED = 0
+CUBE_OWNED = 1
+CUBE_OPPONENT = 2
+
+DEFAULT_BEAROFF_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bearoff1.db')
+DEFAULT_BEAROFF2_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bearoff2.db')
+
+# C(n, k) lookup for ranking; n up to 20, k up to 6
+_COMB = [[comb(n, k) for k in range(HOME_POINTS + 1)] for n in range(CHECKERS_PER_PLAYER + HOME_POINTS)]
+
+
+def rank_position(counts):
+    """
+    Index of a home-board distribution in the database, in O(1).
+    counts[i] is the number of checkers i + 1 pips from bearing off.
+    Uses the combinatorial number system: the running totals, shifted to be
+    strictly increasing, form a 6-subset of 0..20 that is ranked directly.
+    """
+    rank = 0
+    total = 0
+    for i in range(HOME_POINTS):
+        total += counts[i]
+        rank += _COMB[total + i][i + 1]
+    return rank
+
+
+def home_counts(board, player):
+    """A player's checkers per home point, ordered from 1 pip away to 6 pips away"""
+    counts = board.player_points(player)[HOME_BOARD[player]].tolist()
+    return counts[::-1] if player == 1 else counts
+
+
+def is_bearoff_position(board):
+    """True when both players have every remaining checker in their home board"""
+    for player in (1, 2):
+        if board.bar[player - 1] or board.home_count(player) + board.off[player - 1] != CHECKERS_PER_PLAYER:
+            return False
+    return True
+
+
+def is_two_sided_position(board):
+    """True for bear-offs where neither side has more than 6 checkers left"""
+    return (is_bearoff_position(board) and
+            min(board.off) >= CHECKERS_PER_PLAYER - TWO_SIDED_CHECKERS)
+
+
+class BearoffDB:
+    """Read-only view of a one-sided bear-off database file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, positions, checkers, rolls = struct.unpack_from(HEADER_FORMAT, self._mmap, 0)
+        if magic != BEAROFF_MAGIC or positions != NUM_POSITIONS or checkers != CHECKERS_PER_PLAYER:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a {CHECKERS_PER_PLAYER}-checker one-sided bear-off database")
+
+        self.rolls = rolls
+        self.means = np.frombuffer(self._mmap, dtype='<f4', count=positions, offset=HEADER_SIZE)
+        self.dists = np.frombuffer(self._mmap, dtype='<u2', count=positions * rolls,
+                                   offset=HEADER_SIZE + 4 * positions).reshape(positions, rolls)
+
+    def mean_rolls(self, counts):
+        """Expected number of rolls to bear off"""
+        return float(self.means[rank_position(counts)])
+
+    def distribution(self, counts):
+        """P(bear off in exactly i rolls) for i = 0..rolls-1"""
+        return self.dists[rank_position(counts)] / DIST_SCALE
+
+    def win_probability(self, board, on_roll):
+        """
+        Cubeless probability that `on_roll` wins a bear-off position
+        (is_bearoff_position(board) must hold)
+        """
+        other = 1 if on_roll == 2 else 2
+        mover = self.dists[rank_position(home_counts(board, on_roll))].astype(np.int64)
+        waiter = self.dists[rank_position(home_counts(board, other))].astype(np.int64)
+        # The side on roll wins in i rolls unless the other side finished within i - 1 rolls
+        waiter_done_before = np.cumsum(waiter) - waiter
+        wins = float(np.dot(mover, DIST_SCALE - waiter_done_before)) / (DIST_SCALE * DIST_SCALE)
+        return min(1.0, max(0.0, wins))
+
+
+class TwoSidedBearoffDB:
+    """Read-only view of a two-sided bear-off database file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, positions, checkers, tables = struct.unpack_from(HEADER_FORMAT, self._mmap, 0)
+        if magic != TWO_SIDED_MAGIC or positions != TWO_SIDED_POSITIONS or checkers != TWO_SIDED_CHECKERS:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a {TWO_SIDED_CHECKERS}-checker two-sided bear-off database")
+
+        size = positions * positions
+        self.wins = np.frombuffer(self._mmap, dtype='<u2', count=size,
+                                  offset=HEADER_SIZE).reshape(positions, positions)
+        self.equity = np.frombuffer(self._mmap, dtype='<i2', count=3 * size,
+                                    offset=HEADER_SIZE + 2 * size).reshape(3, positions, positions)
+
+    @staticmethod
+    def index(board, on_roll):
+        other = 1 if on_roll == 2 else 2
+        return rank_position(home_counts(board, on_roll)), rank_position(home_counts(board, other))
+
+    def win_probability(self, board, on_roll):
+        """Cubeless probability that `on_roll` wins (is_two_sided_position(board) must hold)"""
+        return int(self.wins[self.index(board, on_roll)]) / DIST_SCALE
+
+    def no_double_equity(self, board, on_roll, cube):
+        """Cubeful equity of `on_roll` (per unit of cube value) if it rolls without doubling"""
+        mover, other = self.index(board, on_roll)
+        return int(self.equity[cube, mover, other]) / EQUITY_SCALE
+
+    def double_take_equity(self, board, on_roll):
+        """Equity of `on_roll` after doubling and being taken (the opponent then owns a doubled cube)"""
+        return 2.0 * self.no_double_equity(board, on_roll, CUBE_OPPONENT)
+
+    def cubeful_equity(self, board, on_roll, cube):
+        """Cubeful equity of `on_roll` with the optimal cube action before rolling"""
+        no_double = self.no_double_equity(board, on_roll, cube)
+        if cube == CUBE_OPPONENT:
+            return no_double
+        # After a double the opponent either takes or passes (conceding one unit)
+        return max(no_double, min(1.0, self.double_take_equity(board, on_roll)))
+
+
+def load_bearoff_db(path=None):
+    """Memory-map the database (BEAROFF_DB_PATH or bearoff1.db next to this file); None if missing"""
+    path = path or os.environ.get('BEAROFF_DB_PATH') or DEFAULT_BEAROFF_DB_PATH
+    if not os.path.exists(path):
+        print(f"ℹ Bear-off database not found at {path} - run build_bearoff_db.py to enable exact bear-off play")
+        return None
+    try:
+        db = BearoffDB(path)
+    except Exception as e:
+        print(f"✗ Could not load bear-off database {path}: {e}")
+        return None
+    print(f"✓ Bear-off database loaded ({path})")
+    return db
+
+
+def load_bearoff2_db(path=None):
+    """Memory-map the two-sided database (BEAROFF2_DB_PATH or bearoff2.db next to this file); None if missing"""
+    path = path or os.environ.get('BEAROFF2_DB_PATH') or DEFAULT_BEAROFF2_DB_PATH
+    if not os.path.exists(path):
+        print(f"ℹ Two-sided bear-off database not found at {path} - run build_bearoff_db.py to enable it")
+        return None
+    try:
+        db = TwoSidedBearoffDB(path)
+    except Exception as e:
+        print(f"✗ Could not load two-sided bear-off database {path}: {e}")
+        return None
+    print(f"✓ Two-sided bear-off database loaded ({path})")
+    return db
@@ -0,0 +1,281 @@
+"""
+Benchmarks for the evaluation hot paths and the move / evaluation endpoints
+
+Usage:
+    python benchmark.py                         # run everything and print a table
+    python benchmark.py --json results.json     # also write the results as JSON
+    python benchmark.py --compare results.json  # show the change against an earlier run
+    python benchmark.py --only apply_move,get_best_move_simple --min-time 2
+
+Runs on the fixed corpus in benchmark_positions.json: opening, middle game,
+prime-vs-prime, back game, race and bear-off positions (as Position IDs), each
+with its dice and the legalMoves the frontend sends. The functions every CPU
+move goes through are timed one call at a time:
+- evaluate_position_simple
+- evaluate_positions_simple over all of a position's plays
+- apply_move for every legal move
+- generate_plays
+- Position ID encoding and decoding
+- get_best_move_simple
+The /api/cpu/move, /api/evaluate and /api/cpu/double endpoints are timed through
+Flask's test client, so nothing leaves the process and it runs offline.
+
+Every benchmark reports calls per second and latency percentiles, overall and
+per corpus category. The evaluation cache is cleared before every timed call, so
+the numbers are for uncached work. The random move choice is seeded.
+
+The JSON results record the environment: whether GNU Backgammon and the
+neural-network weights were found, the Python and NumPy versions, and the git
+commit. They also hold a digest of the corpus. --compare warns when two runs
+differ in these, as their numbers are then not comparable. It exits with status 1
+when a benchmark's median got slower by more than --threshold percent.
+"""
+
+import argparse
+import contextlib
+import datetime
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS_PATH = os.path.join(SCRIPT_DIR, 'benchmark_positions.json')
+RESULTS_FORMAT = 1
+# Latency percentiles reported for every benchmark
+PERCENTILES = (50, 90, 99)
+
+# Importing the service prints its start-up report (bear-off databases, GNU Backgammon, ...)
+with contextlib.redirect_stdout(io.StringIO()):
+    import python_ai_service as service
+from board import Board
+from move_wire import MOVE_MEDIA_TYPE, encode_move_request
+from movegen import generate_plays
+from position_codec import decode_position_id
+
+
+def load_corpus(path=DEFAULT_CORPUS_PATH):
+    """
+    Corpus positions with their gameState and Board built from the Position ID.
+    Raises ValueError when move generation no longer finds the recorded number
+    of plays, since the timings would then not be for the same work.
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    positions = json.loads(raw)['positions']
+    for position in positions:
+        dice = position['dice']
+        moves_allowed = dice * 2 if dice[0] == dice[1] else list(dice)
+        board = Board.from_position_id(position['positionId'], position['currentPlayer'])
+        game_state = board.to_game_state()
+        game_state.update({'movesAllowed': moves_allowed, 'usedDice': []})
+        position['board'] = board
+        position['gameState'] = game_state
+        position['movesAllowed'] = moves_allowed
+        position['playList'] = generate_plays(board, position['currentPlayer'], moves_allowed)
+        if len(position['playList']) != position['plays']:
+            raise ValueError(f"{position['name']}: {len(position['playList'])} plays, corpus expects "
+                             f"{position['plays']}")
+    return positions, hashlib.sha256(raw).hexdigest()
+
+
+def function_benchmarks(corpus):
+    """(name, [(category, call), ...]) for the functions on the evaluation hot path"""
+    return [
+        ('evaluate_position_simple',
+         [(p['category'], lambda p=p: service.evaluate_position_simple(p['gameState'])) for p in corpus]),
+        ('evaluate_positions_simple',
+         [(p['category'], lambda p=p: service.evaluate_positions_simple([play.board for play in p['playList']]))
+          for p in corpus]),
+        ('apply_move',
+         [(p['category'], lambda p=p, move=move: service.apply_move(p['gameState'], move))
+          for p in corpus for move in p['legalMoves']]),
+        ('generate_plays',
+         [(p['category'], lambda p=p: generate_plays(p['board'], p['currentPlayer'], p['movesAllowed']))
+          for p in corpus]),
+        ('position_id',
+         [(p['category'], lambda p=p: p['board'].position_id()) for p in corpus]),
+        ('decode_position_id',
+         [(p['category'], lambda p=p: decode_position_id(p['positionId'], p['currentPlayer'])) for p in corpus]),
+        ('get_best_move_simple',
+         [(p['category'], lambda p=p: service.get_best_move_simple(p['gameState'], 5, p['legalMoves']))
+          for p in corpus]),
+    ]
+
+
+def endpoint_benchmarks(corpus, client):
+    """(name, [(category, call), ...]) for the endpoints, called through the Flask test client"""
+    def post(path, **kwargs):
+        response = client.post(path, **kwargs)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} answered {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response
+
+    binary_headers = {'Content-Type': MOVE_MEDIA_TYPE, 'Accept': MOVE_MEDIA_TYPE}
+    return [
+        ('POST /api/cpu/move',
+         [(p['category'], lambda p=p: post('/api/cpu/move', json={
+             'gameState': p['gameState'], 'difficulty': 5, 'legalMoves': p['legalMoves']}))
+          for p in corpus]),
+        ('POST /api/cpu/move (binary)',
+         [(p['category'], lambda p=p, body=encode_move_request(p['gameState'], 5):
+           post('/api/cpu/move', data=body, headers=binary_headers))
+          for p in corpus]),
+        ('POST /api/evaluate',
+         [(p['category'], lambda p=p: post('/api/evaluate', json={'gameState': p['gameState']})) for p in corpus]),
+        ('POST /api/cpu/double',
+         [(p['category'], lambda p=p: post('/api/cpu/double', json={'gameState': p['gameState'], 'difficulty': 5}))
+          for p in corpus]),
+    ]
+
+
+def run_benchmark(calls, min_time, min_rounds):
+    """
+    Time every call in rounds until `min_time` seconds and `min_rounds` rounds have
+    passed (after one warm-up round). Returns the statistics in microseconds.
+    """
+    for _, call in calls:
+        service.EVAL_CACHE.clear()
+        call()
+
+    timings = {category: [] for category, _ in calls}
+    started = time.perf_counter()
+    rounds = 0
+    while rounds < min_rounds or time.perf_counter() - started < min_time:
+        for category, call in calls:
+            service.EVAL_CACHE.clear()
+            start = time.perf_counter_ns()
+            call()
+            timings[category].append(time.perf_counter_ns() - start)
+        rounds += 1
+
+    every = np.array([t for category_timings in timings.values() for t in category_timings]) / 1000.0
+    result = {
+        'calls': int(len(every)),
+        'ops_per_sec': round(1e6 / every.mean(), 1),
+        'mean_us': round(float(every.mean()), 2),
+    }
+    for percentile in PERCENTILES:
+        result[f'p{percentile}_us'] = round(float(np.percentile(every, percentile)), 2)
+    result['max_us'] = round(float(every.max()), 2)
+    result['p50_us_by_category'] = {category: round(float(np.percentile(np.array(values) / 1000.0, 50)), 2)
+                                    for category, values in timings.items()}
+    return result
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR, capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'gnubg': service.GNUBG_AVAILABLE,
+        'nn_evaluator': service.NN_EVALUATOR is not None,
+        'bearoff_db': service.BEAROFF_DB is not None,
+        'bearoff2_db': service.BEAROFF2_DB is not None,
+        'opening_book': service.OPENING_BOOK is not None,
+    }
+
+
+def print_results(results):
+    print(f"{'benchmark':<30} {'calls':>7} {'ops/s':>10} {'p50 us':>10} {'p90 us':>10} {'p99 us':>10} {'max us':>10}")
+    for name, result in results.items():
+        print(f"{name:<30} {result['calls']:>7} {result['ops_per_sec']:>10.1f} {result['p50_us']:>10.1f} "
+              f"{result['p90_us']:>10.1f} {result['p99_us']:>10.1f} {result['max_us']:>10.1f}")
+
+
+def compare(previous, current, threshold):
+    """Print the change of every benchmark's median against `previous`; returns the names that got slower"""
+    if previous.get('corpus', {}).get('sha256') != current['corpus']['sha256']:
+        print("⚠ The corpus differs from the earlier run; timings are not comparable")
+    for key in ('gnubg', 'nn_evaluator', 'bearoff_db', 'bearoff2_db', 'opening_book', 'python', 'numpy'):
+        if previous.get('environment', {}).get(key) != current['environment'][key]:
+            print(f"⚠ {key} differs from the earlier run ({previous.get('environment', {}).get(key)} → "
+                  f"{current['environment'][key]})")
+
+    print(f"\nChange against {previous.get('environment', {}).get('commit') or 'the earlier run'} "
+          f"(median latency, ±{threshold:g}% marked):")
+    slower = []
+    for name, result in current['results'].items():
+        before = previous.get('results', {}).get(name)
+        if before is None:
+            print(f"  {name:<30} new")
+            continue
+        change = (result['p50_us'] - before['p50_us']) / before['p50_us'] * 100 if before['p50_us'] else 0.0
+        mark = ''
+        if change > threshold:
+            mark = '  ✗ slower'
+            slower.append(name)
+        elif change < -threshold:
+            mark = '  ✓ faster'
+        print(f"  {name:<30} {before['p50_us']:>10.1f} → {result['p50_us']:>10.1f} us  {change:+6.1f}%{mark}")
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the evaluation hot paths and the service endpoints")
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS_PATH, help="position corpus (JSON)")
+    parser.add_argument('--json', dest='json_path', help="write the results to this file")
+    parser.add_argument('--compare', dest='compare_path', help="earlier results to compare against")
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help="percent change of the median reported as slower / faster (default: 10)")
+    parser.add_argument('--only', help="comma-separated benchmark names to run")
+    parser.add_argument('--min-time', type=float, default=1.0, help="seconds per benchmark (default: 1.0)")
+    parser.add_argument('--min-rounds', type=int, default=3, help="rounds over the corpus per benchmark (default: 3)")
+    args = parser.parse_args()
+
+    corpus, corpus_digest = load_corpus(args.corpus)
+    benchmarks = function_benchmarks(corpus) + endpoint_benchmarks(corpus, service.app.test_client())
+    if args.only:
+        wanted = {name.strip() for name in args.only.split(',')}
+        unknown = wanted - {name for name, _ in benchmarks}
+        if unknown:
+            parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+        benchmarks = [(name, calls) for name, calls in benchmarks if name in wanted]
+
+    env = environment()
+    print(f"Corpus: {len(corpus)} positions ({os.path.basename(args.corpus)}); GNU Backgammon: "
+          f"{'yes' if env['gnubg'] else 'no'}; neural network: {'yes' if env['nn_evaluator'] else 'no'}")
+    results = {}
+    for name, calls in benchmarks:
+        random.seed(0)
+        # The service logs every move and evaluation; keep that out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[name] = run_benchmark(calls, args.min_time, args.min_rounds)
+    print_results(results)
+
+    report = {
+        'format': RESULTS_FORMAT,
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'environment': env,
+        'corpus': {'file': os.path.basename(args.corpus), 'positions': len(corpus), 'sha256': corpus_digest},
+        'settings': {'min_time': args.min_time, 'min_rounds': args.min_rounds},
+        'results': results,
+    }
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Wrote {args.json_path}")
+
+    if args.compare_path:
+        with open(args.compare_path) as f:
+            previous = json.load(f)
+        if compare(previous, report, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
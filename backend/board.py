@@ -0,0 +1,398 @@
+"""
+Compact board representation for the AI service
+Holds a position as two int8 point-count arrays (one per player) plus bar and
+borne-off counters, so evaluators work on a handful of array operations
+instead of rescanning the JSON list of per-checker dicts.
+
+Point numbering is the frontend's: points 0-23, player 1 moves up (home 18-23),
+player 2 moves down (home 0-5). In the JSON, checkers on the bar use point 24
+(player 1) or -1 (player 2).
+"""
+
+import numpy as np
+
+import position_codec
+
+NUM_POINTS = 24
+CHECKERS_PER_PLAYER = 15
+
+# Bar point value used by the frontend for checkers that have been hit
+BAR_POINT = {1: 24, 2: -1}
+
+# Home board slices (points 18-23 for player 1, 0-5 for player 2)
+HOME_BOARD = {1: slice(18, 24), 2: slice(0, 6)}
+
+# Distance from each point to bearing off, per player
+PIP_DISTANCE = {
+    1: np.arange(NUM_POINTS, 0, -1, dtype=np.int16),  # point p -> 24 - p
+    2: np.arange(1, NUM_POINTS + 1, dtype=np.int16),  # point p -> p + 1
+}
+
+# Starting position: point -> (player, checkers)
+START_POSITION = {0: (1, 2), 11: (1, 5), 16: (1, 3), 18: (1, 5),
+                  23: (2, 2), 12: (2, 5), 7: (2, 3), 5: (2, 5)}
+
+# Pseudo-points for moves: entering from the bar and bearing off
+BAR = 'bar'
+OFF = 'off'
+
+# Keys of gameState that Board models; everything else is carried through untouched
+BOARD_KEYS = ('checkers', 'bar', 'borneOff')
+
+# Board.to_bytes(): position key (see position_codec), side to move | cube owner << 2
+PACKED_SIZE = position_codec.POSITION_KEY_SIZE + 1
+
+
+def _json_player_key(mapping, player):
+    """JSON objects arrive with string keys ('1'), but accept int keys too"""
+    if str(player) in mapping:
+        return mapping[str(player)]
+    return mapping.get(player)
+
+
+class BoardFeatures:
+    """
+    Evaluation features of a Board, indexed by player - 1.
+    Board.apply()/undo() keep them current by looking only at the points a move
+    touches; trapped counts are recomputed lazily (None = stale) and only when a
+    move makes or breaks a point, hits, or moves a checker they depend on.
+    """
+
+    __slots__ = ('pips', 'blots', 'home', 'trapped')
+
+    def __init__(self, pips, blots, home, trapped):
+        self.pips = pips
+        self.blots = blots
+        self.home = home
+        self.trapped = trapped
+
+    @classmethod
+    def compute(cls, board):
+        """Full scan of a board (done once; moves then update incrementally)"""
+        return cls(
+            [int(np.dot(board.points[p], PIP_DISTANCE[p + 1])) + board.bar[p] * 25 for p in (0, 1)],
+            [int(np.count_nonzero(board.points[p] == 1)) for p in (0, 1)],
+            [int(board.points[p][HOME_BOARD[p + 1]].sum()) for p in (0, 1)],
+            [None, None],
+        )
+
+    def snapshot(self):
+        return (tuple(self.pips), tuple(self.blots), tuple(self.home), tuple(self.trapped))
+
+    def restore(self, snapshot):
+        pips, blots, home, trapped = snapshot
+        self.pips[:] = pips
+        self.blots[:] = blots
+        self.home[:] = home
+        self.trapped[:] = trapped
+
+    def copy(self):
+        return BoardFeatures(list(self.pips), list(self.blots), list(self.home), list(self.trapped))
+
+
+def _pip_distance(player, point):
+    """Pips from `point` (or BAR / OFF) to bearing off"""
+    if point == BAR:
+        return 25
+    if point == OFF:
+        return 0
+    return NUM_POINTS - point if player == 1 else point + 1
+
+
+def _in_home(player, point):
+    home = HOME_BOARD[player]
+    return point != BAR and point != OFF and home.start <= point < home.stop
+
+
+class Board:
+    """
+    Position as point-count arrays.
+    points[0] holds player 1's checkers per point, points[1] player 2's.
+    """
+
+    __slots__ = ('points', 'bar', 'off', 'current_player', 'extra', '_features')
+
+    def __init__(self, points=None, bar=None, off=None, current_player=2, extra=None, features=None):
+        self.points = points if points is not None else np.zeros((2, NUM_POINTS), dtype=np.int8)
+        self.bar = bar if bar is not None else [0, 0]
+        self.off = off if off is not None else [0, 0]
+        self.current_player = current_player
+        self.extra = extra if extra is not None else {}
+        self._features = features
+
+    @classmethod
+    def from_game_state(cls, game_state):
+        """Build a Board from the frontend's gameState dict (done once per request)"""
+        if isinstance(game_state, Board):
+            return game_state
+
+        board = cls(
+            current_player=game_state.get('currentPlayer', 2),
+            extra={k: v for k, v in game_state.items() if k not in BOARD_KEYS}
+        )
+
+        # Count into plain lists first; per-element numpy writes are slower than the whole conversion
+        counts = ([0] * NUM_POINTS, [0] * NUM_POINTS)
+        for checker in game_state.get('checkers', []):
+            if isinstance(checker, dict):
+                point = checker.get('point', -1)
+                player = checker.get('player', 0)
+            else:
+                point = getattr(checker, 'point', -1)
+                player = getattr(checker, 'player', 0)
+            try:
+                point = int(point)
+                player = int(player)
+            except (ValueError, TypeError):
+                continue
+            # Bar checkers are counted from the bar lists; borne-off ones from borneOff
+            if 0 <= point < NUM_POINTS and player in (1, 2):
+                counts[player - 1][point] += 1
+        board.points = np.array(counts, dtype=np.int8)
+
+        bar = game_state.get('bar') or {}
+        borne_off = game_state.get('borneOff') or {}
+        for player in (1, 2):
+            board.bar[player - 1] = len(_json_player_key(bar, player) or [])
+            board.off[player - 1] = int(_json_player_key(borne_off, player) or 0)
+
+        return board
+
+    def to_game_state(self):
+        """
+        Convert back to the JSON gameState shape.
+        Checker ids/offsets are not modelled; every other gameState key is preserved.
+        """
+        checkers = []
+        for player in (1, 2):
+            counts = self.points[player - 1]
+            for point in np.flatnonzero(counts):
+                checkers.extend({'player': player, 'point': int(point)} for _ in range(int(counts[point])))
+
+        game_state = dict(self.extra)
+        game_state['checkers'] = checkers
+        game_state['bar'] = {
+            str(player): [{'player': player, 'point': BAR_POINT[player]} for _ in range(self.bar[player - 1])]
+            for player in (1, 2)
+        }
+        game_state['borneOff'] = {str(player): self.off[player - 1] for player in (1, 2)}
+        game_state['currentPlayer'] = self.current_player
+        return game_state
+
+    def copy(self):
+        features = self._features.copy() if self._features is not None else None
+        return Board(self.points.copy(), list(self.bar), list(self.off), self.current_player, self.extra, features)
+
+    def features(self):
+        """BoardFeatures for this position (computed on first use, then maintained by apply/undo)"""
+        if self._features is None:
+            self._features = BoardFeatures.compute(self)
+        return self._features
+
+    def pip_count(self, player):
+        return self.features().pips[player - 1]
+
+    def blot_count(self, player):
+        return self.features().blots[player - 1]
+
+    def home_count(self, player):
+        return self.features().home[player - 1]
+
+    def trapped_count(self, player):
+        features = self.features()
+        if features.trapped[player - 1] is None:
+            features.trapped[player - 1] = self._count_trapped(player)
+        return features.trapped[player - 1]
+
+    def _count_trapped(self, player):
+        """
+        Count pieces that are trapped:
+        1. On bar with all entry points blocked (prime)
+        2. In opponent's home board behind a prime (6 consecutive blocked points)
+        """
+        trapped = 0
+        opponent = 1 if player == 2 else 2
+        blocked = self.points[opponent - 1] >= 2
+
+        # Check pieces on bar
+        bar_pieces = self.bar[player - 1]
+        if bar_pieces > 0:
+            # Player 1 enters on points 0-5, player 2 on points 18-23
+            blocked_entry_points = int(np.count_nonzero(blocked[HOME_BOARD[opponent]]))
+
+            # If all 6 entry points are blocked, pieces on bar are trapped
+            if blocked_entry_points >= 6:
+                trapped += bar_pieces
+            # If 4-5 entry points blocked, partially trapped
+            elif blocked_entry_points >= 4:
+                trapped += bar_pieces * 0.5
+
+        # Check pieces in opponent's home board that are behind a prime:
+        # every point from the checker's position forward (up to 6) must be blocked
+        counts = self.points[player - 1]
+        for point in np.flatnonzero(counts[HOME_BOARD[opponent]]) + HOME_BOARD[opponent].start:
+            if player == 1:
+                escape_route = blocked[point:point + 6]
+            else:  # player == 2
+                escape_route = blocked[max(0, point - 5):point + 1]
+            if escape_route.all():
+                trapped += int(counts[point])
+
+        return trapped
+
+    def apply(self, player, frm, to):
+        """
+        Move one checker in place (hitting a blot on `to` if there is one).
+        `frm` may be BAR and `to` may be OFF.
+        Returns an undo token; pass it to undo() to restore the position exactly.
+        Features are updated from the (at most three) points the move touches.
+        """
+        features = self.features()
+        saved = features.snapshot()
+        own = self.points[player - 1]
+        opponent = self.points[2 - player]
+        p = player - 1
+        o = 2 - player
+        made_point_changed = False
+
+        if frm == BAR:
+            self.bar[p] -= 1
+        else:
+            before = int(own[frm])
+            own[frm] = before - 1
+            features.blots[p] += (before == 2) - (before == 1)
+            made_point_changed = before == 2
+
+        hit = False
+        if to == OFF:
+            self.off[p] += 1
+        else:
+            if opponent[to] == 1:
+                opponent[to] = 0
+                self.bar[o] += 1
+                hit = True
+                features.blots[o] -= 1
+                features.pips[o] += 25 - _pip_distance(o + 1, to)
+                features.home[o] -= _in_home(o + 1, to)
+            before = int(own[to])
+            own[to] = before + 1
+            features.blots[p] += (before == 0) - (before == 1)
+            made_point_changed = made_point_changed or before == 1
+
+        features.pips[p] -= _pip_distance(player, frm) - _pip_distance(player, to)
+        features.home[p] += _in_home(player, to) - _in_home(player, frm)
+
+        # Trapped counts depend on the opponent's made points and the player's bar/advanced checkers
+        if made_point_changed or hit:
+            features.trapped[o] = None
+        if frm == BAR or _in_home(o + 1, frm) or _in_home(o + 1, to):
+            features.trapped[p] = None
+
+        return (player, frm, to, hit, saved)
+
+    def undo(self, token):
+        """Take back a move made with apply() (moves must be undone in reverse order)"""
+        player, frm, to, hit, saved = token
+        own = self.points[player - 1]
+
+        if to == OFF:
+            self.off[player - 1] -= 1
+        else:
+            own[to] -= 1
+            if hit:
+                self.points[2 - player][to] = 1
+                self.bar[2 - player] -= 1
+
+        if frm == BAR:
+            self.bar[player - 1] += 1
+        else:
+            own[frm] += 1
+
+        self._features.restore(saved)
+
+    def player_points(self, player):
+        """Checker counts per point for one player (a view, not a copy)"""
+        return self.points[player - 1]
+
+    def key(self):
+        """Hashable identity of the position (checkers, bar, borne off; not side to move)"""
+        return self.points.tobytes() + bytes(self.bar) + bytes(self.off)
+
+    def position_key(self, on_roll=None):
+        """
+        10-byte gnubg position key with `on_roll` (default: the side to move) on roll.
+        Compact but about ten times slower to build than key(), so hot caches use key().
+        """
+        return position_codec.position_key(self.points.tolist(), self.bar, on_roll or self.current_player)
+
+    def position_id(self, on_roll=None):
+        """GNU Backgammon Position ID (14 characters), for gnubg commands and logs"""
+        return position_codec.position_id(self.points.tolist(), self.bar, on_roll or self.current_player)
+
+    @classmethod
+    def from_position_key(cls, key, on_roll):
+        """Board from a position key with `on_roll` to move"""
+        points, bar, off = position_codec.decode_position_key(key, on_roll)
+        return cls(np.array(points, dtype=np.int8), bar, off, on_roll)
+
+    @classmethod
+    def from_position_id(cls, text, on_roll):
+        """Board from a GNU Backgammon Position ID with `on_roll` to move"""
+        points, bar, off = position_codec.decode_position_id(text, on_roll)
+        return cls(np.array(points, dtype=np.int8), bar, off, on_roll)
+
+    def to_bytes(self):
+        """
+        Compact PACKED_SIZE-byte encoding for shipping positions to other processes.
+        Keeps the side to move and gameState.cubeOwner (the only extra key evaluation reads).
+        """
+        owner = self.extra.get('cubeOwner')
+        owner = int(owner) if owner in (1, 2, '1', '2') else 0
+        return self.position_key() + bytes((self.current_player | owner << 2,))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Inverse of to_bytes()"""
+        flags = data[position_codec.POSITION_KEY_SIZE]
+        board = cls.from_position_key(data[:position_codec.POSITION_KEY_SIZE], flags & 3)
+        owner = flags >> 2
+        if owner:
+            board.extra['cubeOwner'] = owner
+        return board
+
+    def __eq__(self, other):
+        return isinstance(other, Board) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return f"Board(p1={self.points[0].tolist()}, p2={self.points[1].tolist()}, bar={self.bar}, off={self.off})"
+
+
+def starting_board(current_player=2):
+    """Board with both sides' checkers in the starting position"""
+    board = Board(current_player=current_player)
+    for point, (player, count) in START_POSITION.items():
+        board.points[player - 1][point] = count
+    return board
+
+
+def stack_boards(boards):
+    """
+    Stack boards into one N x 26 int8 matrix for batch evaluation.
+    Columns 0-23 are signed point counts (player 1 positive, player 2 negative),
+    column 24 is player 1's bar and column 25 player 2's bar.
+    Borne-off counts are returned alongside as an N x 2 array.
+    """
+    count = len(boards)
+    matrix = np.zeros((count, NUM_POINTS + 2), dtype=np.int8)
+    borne_off = np.zeros((count, 2), dtype=np.int16)
+    if count == 0:
+        return matrix, borne_off
+
+    points = np.stack([board.points for board in boards])
+    matrix[:, :NUM_POINTS] = points[:, 0] - points[:, 1]
+    matrix[:, NUM_POINTS:] = [board.bar for board in boards]
+    borne_off[:] = [board.off for board in boards]
+    return matrix, borne_off
@@ -0,0 +1,247 @@
+"""
+Build the bear-off databases used by bearoff.py
+
+Usage:
+    python build_bearoff_db.py [one-sided output path] [two-sided output path]
+
+One-sided: solves every home-board distribution of up to 15 checkers exactly.
+Positions are processed in order of increasing pip count, so every position
+reachable by a roll is already solved. For each of the 21 rolls the play
+minimising the expected number of rolls is chosen, and the roll distribution
+follows from the chosen successors. Takes about ten seconds (~3.7 MB).
+
+Two-sided: solves every pair of home boards with up to 6 checkers each for
+the cubeless winning chance and the cubeful money equity in each cube
+position. Rows (side on roll) and columns (side waiting) of the 924 x 924
+tables are filled one pip level at a time with vectorised NumPy passes, each
+needing only positions with fewer pips. Takes under a minute (~6.8 MB).
+"""
+
+import os
+import struct
+import sys
+import time
+from itertools import product
+
+import numpy as np
+
+from bearoff import (BEAROFF_MAGIC, CUBE_CENTERED, CUBE_OPPONENT, CUBE_OWNED, DEFAULT_BEAROFF2_DB_PATH,
+                     DEFAULT_BEAROFF_DB_PATH, DIST_SCALE, EQUITY_SCALE, HEADER_FORMAT, HOME_POINTS, MAX_ROLLS,
+                     NUM_POSITIONS, TWO_SIDED_CHECKERS, TWO_SIDED_MAGIC, TWO_SIDED_POSITIONS, rank_position)
+from board import CHECKERS_PER_PLAYER
+
+# Longest bear-off (15 checkers on the 6 point rolling 2-1 every time) stays well below this
+WORK_ROLLS = 64
+
+# The 21 distinct rolls and how many of the 36 dice combinations produce each
+ROLLS = [(a, b) for a in range(1, 7) for b in range(a, 7)]
+ROLL_WEIGHTS = np.array([1 if a == b else 2 for a, b in ROLLS], dtype=np.float64) / 36.0
+
+
+def all_positions(checkers=CHECKERS_PER_PLAYER):
+    """Every distribution of 0-`checkers` checkers over the six home points"""
+    for counts in product(range(checkers + 1), repeat=HOME_POINTS):
+        if sum(counts) <= checkers:
+            yield counts
+
+
+def pips(counts):
+    return sum((i + 1) * n for i, n in enumerate(counts))
+
+
+def single_steps(counts, die):
+    """Positions reachable by moving one checker `die` pips (bear-off rules included)"""
+    results = []
+    if counts[die - 1]:
+        # Bear off exactly
+        moved = list(counts)
+        moved[die - 1] -= 1
+        results.append(tuple(moved))
+    higher = False
+    for point in range(die + 1, HOME_POINTS + 1):
+        if counts[point - 1]:
+            higher = True
+            moved = list(counts)
+            moved[point - 1] -= 1
+            moved[point - die - 1] += 1
+            results.append(tuple(moved))
+    if not counts[die - 1] and not higher:
+        # A larger die bears off from the highest occupied point
+        for point in range(die - 1, 0, -1):
+            if counts[point - 1]:
+                moved = list(counts)
+                moved[point - 1] -= 1
+                results.append(tuple(moved))
+                break
+    return results
+
+
+def build():
+    positions = sorted(all_positions(), key=pips)
+    ranks = {counts: rank_position(counts) for counts in positions}
+    assert len(ranks) == NUM_POSITIONS and sorted(ranks.values()) == list(range(NUM_POSITIONS))
+
+    means = np.zeros(NUM_POSITIONS)
+    dists = np.zeros((NUM_POSITIONS, WORK_ROLLS))
+    # best[level, die][rank]: position reached by playing `die` `level` times (1-4) as well as possible
+    best = {(level, die): np.zeros(NUM_POSITIONS, dtype=np.int32) for level in range(1, 5) for die in range(1, 7)}
+    start_time = time.time()
+    empty = ranks[(0,) * HOME_POINTS]
+    dists[empty, 0] = 1.0
+    for table in best.values():
+        table[empty] = empty
+
+    for counts in positions:
+        rank = ranks[counts]
+        if rank == empty:
+            continue
+
+        steps = {die: [ranks[s] for s in single_steps(counts, die)] for die in range(1, 7)}
+
+        # Best position after playing one die 1-4 times (doubles and the second half of a roll)
+        for die in range(1, 7):
+            for level in range(1, 5):
+                options = steps[die] if level == 1 else [best[level - 1, die][s] for s in steps[die]]
+                best[level, die][rank] = min(options, key=lambda r: means[r])
+
+        successors = []
+        for a, b in ROLLS:
+            if a == b:
+                successors.append(best[4, a][rank])
+            else:
+                options = [best[1, b][s] for s in steps[a]] + [best[1, a][s] for s in steps[b]]
+                successors.append(min(options, key=lambda r: means[r]))
+
+        means[rank] = 1.0 + float(np.dot(ROLL_WEIGHTS, means[successors]))
+        dists[rank, 1:] = ROLL_WEIGHTS @ dists[successors, :-1]
+
+    print(f"Solved {NUM_POSITIONS} positions in {time.time() - start_time:.1f}s "
+          f"(15 checkers on the 6 point: {means[ranks[(0, 0, 0, 0, 0, 15)]]:.3f} rolls)")
+    return means, dists
+
+
+def write_database(path, means, dists):
+    """Quantise the distributions to uint16 and write the file described in bearoff.py"""
+    tail = dists[:, MAX_ROLLS:].sum(axis=1)
+    assert tail.max() < 1e-9, f"Bear-off needs more than {MAX_ROLLS} rolls ({tail.max():.2e})"
+    quantised = np.rint(dists[:, :MAX_ROLLS] * DIST_SCALE).astype('<u2')
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(struct.pack(HEADER_FORMAT, BEAROFF_MAGIC, NUM_POSITIONS, CHECKERS_PER_PLAYER, MAX_ROLLS))
+        f.write(means.astype('<f4').tobytes())
+        f.write(quantised.tobytes())
+    os.replace(tmp_path, path)
+    print(f"✓ Wrote {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+
+def play_results(counts, roll):
+    """Every distinct position a full play of `roll` can leave (stops once all checkers are off)"""
+    a, b = roll
+    orders = [[a] * 4] if a == b else [[a, b], [b, a]]
+    results = set()
+    for order in orders:
+        level = {counts}
+        for die in order:
+            level = {moved for position in level
+                     for moved in (single_steps(position, die) if any(position) else [position])}
+        results |= level
+    return results
+
+
+def build_two_sided():
+    """
+    Solve the two-sided tables. All arrays are indexed [on-roll rank, other rank].
+    Returns (wins, no-double equity per cube position).
+    """
+    positions = sorted(all_positions(TWO_SIDED_CHECKERS), key=pips)
+    ranks = {counts: rank_position(counts) for counts in positions}
+    assert sorted(ranks.values()) == list(range(TWO_SIDED_POSITIONS))
+    n = TWO_SIDED_POSITIONS
+    empty = ranks[(0,) * HOME_POINTS]
+
+    # successors[rank, roll, k]: positions the side on roll can reach (padded by repeating one)
+    plays = {ranks[c]: [[ranks[r] for r in play_results(c, roll)] for roll in ROLLS] for c in positions}
+    width = max(len(options) for per_roll in plays.values() for options in per_roll)
+    successors = np.zeros((n, len(ROLLS), width), dtype=np.int32)
+    for rank, per_roll in plays.items():
+        for roll_index, options in enumerate(per_roll):
+            successors[rank, roll_index] = options + [options[0]] * (width - len(options))
+
+    # wins: P(on roll wins); no_double[cube]: equity rolling without doubling;
+    # equity[cube]: equity with the optimal cube action first (what the opponent faces after our roll)
+    wins = np.zeros((n, n))
+    no_double = np.zeros((3, n, n))
+    equity = np.zeros((3, n, n))
+    # The side with no checkers left has already won
+    wins[empty, :] = 1.0
+    no_double[:, empty, :] = equity[:, empty, :] = 1.0
+    wins[:, empty] = 0.0
+    no_double[:, :, empty] = equity[:, :, empty] = -1.0
+    # After our roll the opponent is on roll: a cube we own is "opponent owns" for them, and vice versa
+    opponent_cube = {CUBE_CENTERED: CUBE_CENTERED, CUBE_OWNED: CUBE_OPPONENT, CUBE_OPPONENT: CUBE_OWNED}
+
+    def settle(rows, cols):
+        for cube in (CUBE_CENTERED, CUBE_OWNED):
+            double_take = np.minimum(1.0, 2.0 * no_double[CUBE_OPPONENT][rows, cols])
+            equity[cube][rows, cols] = np.maximum(no_double[cube][rows, cols], double_take)
+        equity[CUBE_OPPONENT][rows, cols] = no_double[CUBE_OPPONENT][rows, cols]
+
+    def best_reply(values):
+        # values: (..., rolls, width) outcomes for the side on roll; best play per roll, averaged over rolls
+        return values.max(axis=-1) @ ROLL_WEIGHTS
+
+    start_time = time.time()
+    levels = {}
+    for counts in positions:
+        levels.setdefault(pips(counts), []).append(ranks[counts])
+
+    others = np.arange(n)
+    for level in sorted(levels):
+        if level == 0:
+            continue
+        # Rows: this level on roll against every other position (needs columns of lower levels only)
+        for rank in levels[level]:
+            reached = successors[rank]  # rolls x width
+            wins[rank] = best_reply(1.0 - wins[:, reached])
+            for cube in (CUBE_CENTERED, CUBE_OWNED, CUBE_OPPONENT):
+                no_double[cube][rank] = best_reply(-equity[opponent_cube[cube]][:, reached])
+            wins[rank, empty] = 0.0
+            no_double[:, rank, empty] = -1.0
+            settle(rank, others)
+            equity[:, rank, empty] = -1.0
+        # Columns: every position on roll against this level (needs the rows just computed)
+        for rank in levels[level]:
+            wins[:, rank] = best_reply(1.0 - wins[rank][successors])
+            for cube in (CUBE_CENTERED, CUBE_OWNED, CUBE_OPPONENT):
+                no_double[cube][:, rank] = best_reply(-equity[opponent_cube[cube]][rank][successors])
+            wins[empty, rank] = 1.0
+            no_double[:, empty, rank] = 1.0
+            settle(others, rank)
+            equity[:, empty, rank] = 1.0
+
+    print(f"Solved {n} x {n} two-sided positions in {time.time() - start_time:.1f}s")
+    return wins, no_double
+
+
+def write_two_sided_database(path, wins, no_double):
+    """
+    Quantise and write the file described in bearoff.py: the cubeless
+    win-probability table, then one equity table per cube position (the header's
+    table count is the number of equity tables)
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(struct.pack(HEADER_FORMAT, TWO_SIDED_MAGIC, TWO_SIDED_POSITIONS, TWO_SIDED_CHECKERS,
+                            len(no_double)))
+        f.write(np.rint(wins * DIST_SCALE).astype('<u2').tobytes())
+        f.write(np.rint(np.clip(no_double, -1.0, 1.0) * EQUITY_SCALE).astype('<i2').tobytes())
+    os.replace(tmp_path, path)
+    print(f"✓ Wrote {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    one_sided_path = sys.argv[1] if len(sys.argv) > 1 else (os.environ.get('BEAROFF_DB_PATH') or DEFAULT_BEAROFF_DB_PATH)
+    two_sided_path = sys.argv[2] if len(sys.argv) > 2 else (os.environ.get('BEAROFF2_DB_PATH') or DEFAULT_BEAROFF2_DB_PATH)
+    write_database(one_sided_path, *build())
+    write_two_sided_database(two_sided_path, *build_two_sided())
@@ -0,0 +1,64 @@
+"""
+Build the match equity table used by match_equity.py
+
+Usage:
+    python build_met.py [output path] [size] [gammon rate]
+
+Post-Crawford equities follow from the trailer doubling at once (the leader
+drops when that is better, the free drop). The Crawford game is played
+without a cube. Every earlier score is valued with the cube model of cube.py
+from the equities of the scores it can lead to, so scores are filled in by
+increasing total of points needed. `gammon rate` is the share of games won
+that are gammons (default 0.26; backgammons are counted as gammons).
+"""
+
+import os
+import sys
+import time
+
+from bearoff import CUBE_CENTERED
+from cube import match_model
+from match_equity import DEFAULT_MET_PATH, MatchEquityTable
+
+
+def post_crawford_trailer(size, gammon_rate):
+    """Chance of the side needing n (index n) against 1-away, post-Crawford; index 0 is a won match"""
+    trailer = [1.0, 0.5]
+    for away in range(2, size + 1):
+        def need(points):
+            return trailer[points] if points > 0 else 1.0
+        doubled = 0.5 * ((1.0 - gammon_rate) * need(away - 2) + gammon_rate * need(away - 4))
+        trailer.append(min(need(away - 1), doubled))
+    return trailer
+
+
+def build(path, size, gammon_rate):
+    start_time = time.time()
+    trailer = post_crawford_trailer(size, gammon_rate)
+    post_crawford = [1.0 - trailer[away] for away in range(1, size + 1)]
+    pre_crawford = [[0.0] * size for _ in range(size)]
+    pre_crawford[0][0] = 0.5
+    for away in range(2, size + 1):
+        # Crawford game: no cube; a loss leaves the leader post-Crawford
+        leader = 0.5 + 0.5 * ((1.0 - gammon_rate) * post_crawford[away - 2] +
+                              gammon_rate * (post_crawford[away - 3] if away > 2 else 0.0))
+        pre_crawford[0][away - 1] = leader
+        pre_crawford[away - 1][0] = 1.0 - leader
+
+    met = MatchEquityTable(pre_crawford, post_crawford, gammon_rate)
+    rates = (1.0 - gammon_rate, gammon_rate, 0.0)
+    for total in range(4, 2 * size + 1):
+        for away in range(max(2, total - size), min(size, total - 2) + 1):
+            model = match_model(met, away, total - away, rates, rates)
+            pre_crawford[away - 1][total - away - 1] = model.value(CUBE_CENTERED, 1, 0.5)
+
+    met.save(path)
+    print(f"✓ Wrote {path} ({size}-point, gammon rate {gammon_rate}) in {time.time() - start_time:.1f}s")
+    for away in range(1, min(size, 7) + 1):
+        print('  ' + ' '.join(f"{met.equity(away, other):.3f}" for other in range(1, min(size, 7) + 1)))
+
+
+if __name__ == '__main__':
+    output_path = sys.argv[1] if len(sys.argv) > 1 else (os.environ.get('MET_PATH') or DEFAULT_MET_PATH)
+    build(output_path, int(sys.argv[2]) if len(sys.argv) > 2 else 25,
+          float(sys.argv[3]) if len(sys.argv) > 3 else 0.26)
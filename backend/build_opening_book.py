@@ -0,0 +1,63 @@
+"""
+Build the opening book used by opening_book.py
+
+Usage:
+    python build_opening_book.py [output path]
+
+Writes the first roll: the standard opening plays from rollouts (FIRST_ROLL below),
+doubles included for games whose first turn may be a double. Every play is checked
+against the move generator and written in canonical notation.
+
+Later turns are not generated: the book is played ahead of GNU Backgammon and the
+search at the strongest levels, so a reply only belongs in it once it has been
+taken from GNU Backgammon or rollouts. Such lines can be added to the file by hand
+in the format described in opening_book.py.
+"""
+
+import os
+import sys
+
+from board import starting_board
+from movegen import generate_plays
+from opening_book import DEFAULT_OPENING_BOOK_PATH, apply_play, format_play, parse_play
+
+# Standard opening plays (mover's point of view)
+FIRST_ROLL = {
+    '21': '13/11 6/5', '31': '8/5 6/5', '41': '24/23 13/9', '51': '13/8 24/23', '61': '13/7 8/7',
+    '32': '24/21 13/11', '42': '8/4 6/4', '52': '13/8 13/11', '62': '24/18 13/11', '43': '24/20 13/10',
+    '53': '8/3 6/3', '63': '24/18 13/10', '54': '24/20 13/8', '64': '8/2 6/2', '65': '24/13',
+    '11': '8/7(2) 6/5(2)', '22': '13/11(2) 6/4(2)', '33': '8/5(2) 6/3(2)', '44': '24/20(2) 13/9(2)',
+    '55': '13/3(2)', '66': '24/18(2) 13/7(2)',
+}
+
+
+def roll_dice(roll):
+    high, low = int(roll[0]), int(roll[1])
+    return [high] * 4 if high == low else [high, low]
+
+
+def canonical_play(board, roll, text):
+    """`text` in canonical notation; raises if it is not a legal play of `roll` for player 2 in `board`"""
+    result = apply_play(board, 2, parse_play(text))
+    for play in generate_plays(board, 2, roll_dice(roll)):
+        if play.board.key() == result.key():
+            return format_play(2, play.steps, board)
+    raise ValueError(f"{roll} {text} is not a legal play")
+
+
+def build(path):
+    start = starting_board(2)
+    lines = ["# Opening book (generated by build_opening_book.py; format described in opening_book.py)",
+             "# First roll"]
+    for roll, text in FIRST_ROLL.items():
+        lines.append(f"> {roll} {canonical_play(start, roll, text)}")
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+    print(f"✓ Wrote {path} ({len(FIRST_ROLL)} plays)")
+
+
+if __name__ == '__main__':
+    build(sys.argv[1] if len(sys.argv) > 1 else (os.environ.get('OPENING_BOOK_PATH') or DEFAULT_OPENING_BOOK_PATH))
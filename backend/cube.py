@@ -0,0 +1,199 @@
+"""
+Cubeful doubling decisions from gammon-aware probabilities
+The cube is modelled as in Janowski's and Zadeh's work: if the winning chance
+moved continuously, the side on roll would double exactly at the opponent's
+take point, so cubeful equity is piecewise linear in the winning chance between
+the take and cash points of each cube level. Those points are found level by
+level up to the last useful cube (a dead cube prices every outcome as it is),
+and the real game sits between that fully live cube and a dead one:
+
+    cubeful = CUBE_EFFICIENCY * live + (1 - CUBE_EFFICIENCY) * dead
+
+Outcomes are valued by a `result(points)` function: points won (positive) or
+lost (negative) for money play, match winning chances from the match equity
+table (match_equity.py) for match play. build_met.py uses the same model with a
+fully live cube to generate that table.
+"""
+
+import numpy as np
+
+from bearoff import CUBE_OPPONENT, CUBE_OWNED
+
+# Winning chances the equity curves are tabulated at
+GRID = np.linspace(0.0, 1.0, 201)
+# Share of the live-cube value realised over the board (Janowski's x)
+CUBE_EFFICIENCY = 0.68
+# Highest cube value in money play; a cube this high is treated as dead
+MAX_MONEY_CUBE = 64
+
+
+def _crossing(curve, target):
+    """Winning chance at which a non-decreasing equity curve first reaches `target`"""
+    # The tiny slope keeps the curve strictly increasing for np.interp across flat stretches
+    return float(np.interp(target, np.maximum.accumulate(curve) + GRID * 1e-9, GRID))
+
+
+class CubeModel:
+    """
+    Equity curves (over GRID) for one position's gammon rates at every cube level.
+    result(points) values an outcome for the side on roll; can_double(side, cube)
+    says whether 'me' or 'opponent' may still turn a cube of that value.
+    win_rates / lose_rates are the single, gammon and backgammon shares of wins / losses.
+    """
+
+    def __init__(self, result, can_double, win_rates, lose_rates):
+        self.result = result
+        self.can_double = can_double
+        self.win_rates = win_rates
+        self.lose_rates = lose_rates
+        self._curves = {}
+
+    def win_value(self, cube):
+        return sum(rate * self.result(cube * points) for points, rate in enumerate(self.win_rates, 1))
+
+    def lose_value(self, cube):
+        return sum(rate * self.result(-cube * points) for points, rate in enumerate(self.lose_rates, 1))
+
+    def dead(self, cube):
+        lose = self.lose_value(cube)
+        return lose + GRID * (self.win_value(cube) - lose)
+
+    def curve(self, owner, cube):
+        """Live-cube equity over GRID with the cube at `cube`, centered, owned by the side on roll or by the opponent"""
+        key = (owner, cube)
+        if key not in self._curves:
+            self._curves[key] = self._build(owner, cube)
+        return self._curves[key]
+
+    def _build(self, owner, cube):
+        dead = self.dead(cube)
+        cash, drop = self.result(cube), self.result(-cube)
+        # Our doubling point is the opponent's take point, and theirs is ours
+        double_at = None
+        if owner != CUBE_OPPONENT and self.can_double('me', cube):
+            double_at = _crossing(self.curve(CUBE_OPPONENT, 2 * cube), cash)
+        redouble_at = None
+        if owner != CUBE_OWNED and self.can_double('opponent', cube):
+            redouble_at = _crossing(self.curve(CUBE_OWNED, 2 * cube), drop)
+        if double_at is None and redouble_at is None:
+            return dead
+        if double_at is not None and redouble_at is not None and redouble_at >= double_at:
+            redouble_at = double_at = (redouble_at + double_at) / 2
+
+        low, high = (redouble_at, drop) if redouble_at is not None else (0.0, dead[0])
+        top, top_value = (double_at, cash) if double_at is not None else (1.0, dead[-1])
+        live = np.interp(GRID, [low, top], [high, top_value])
+        # Past the doubling point a side may prefer to play on for gammons (too good)
+        if double_at is not None:
+            live = np.where(GRID >= double_at, np.maximum(live, dead), live)
+        if redouble_at is not None:
+            live = np.where(GRID <= redouble_at, np.minimum(live, dead), live)
+        return live
+
+    def value(self, owner, cube, win, efficiency=CUBE_EFFICIENCY):
+        """Cubeful equity at winning chance `win`: the live curve blended with the dead cube"""
+        live = float(np.interp(win, GRID, self.curve(owner, cube)))
+        dead = float(np.interp(win, GRID, self.dead(cube)))
+        return efficiency * live + (1.0 - efficiency) * dead
+
+
+def outcome_rates(probabilities):
+    """
+    (win chance, single/gammon/backgammon shares of wins, same for losses) from
+    the five outputs win, win gammon, win backgammon, lose gammon, lose backgammon
+    """
+    win, win_gammon, win_backgammon, lose_gammon, lose_backgammon = (float(p) for p in probabilities)
+    win = min(1.0, max(0.0, win))
+    lose = 1.0 - win
+
+    def shares(total, gammon, backgammon):
+        if total <= 0.0:
+            return (1.0, 0.0, 0.0)
+        gammon = min(gammon, total) / total
+        backgammon = min(backgammon / total, gammon)
+        return (1.0 - gammon, gammon - backgammon, backgammon)
+
+    return win, shares(win, win_gammon, win_backgammon), shares(lose, lose_gammon, lose_backgammon)
+
+
+def cube_action(no_double, double_take, double_pass, drop_value, can_double, beaver_line=None):
+    """
+    Offer, take and beaver decisions from the three equities of the side on roll.
+    `drop_value` is the equity of passing the current cube the other way (it and
+    `double_pass` scale the 'normalized' equities to -1 .. +1); the opponent may
+    beaver when the side doubling is an underdog at the new cube, i.e. below
+    `beaver_line` (None when beavers are not played).
+    """
+    take = double_take <= double_pass
+    offer = can_double and min(double_take, double_pass) > no_double
+
+    def normalized(equity):
+        if double_pass == drop_value:
+            return 0.0
+        return 2.0 * (equity - drop_value) / (double_pass - drop_value) - 1.0
+
+    if not can_double:
+        action = 'no double (cannot double)'
+    elif offer:
+        action = 'double, take' if take else 'double, pass'
+    elif no_double >= double_pass:
+        action = 'too good, take' if take else 'too good, pass'
+    else:
+        action = 'no double, take' if take else 'no double, pass'
+
+    return {
+        'offer': offer,
+        'take': take,
+        'beaver': beaver_line is not None and take and double_take < beaver_line,
+        'action': action,
+        'equities': {
+            'noDouble': no_double,
+            'doubleTake': double_take,
+            'doublePass': double_pass,
+        },
+        'normalized': {
+            'noDouble': normalized(no_double),
+            'doubleTake': normalized(double_take),
+            'doublePass': normalized(double_pass),
+        },
+    }
+
+
+def cube_decision(model, win, cube, owner, beavers=False, efficiency=CUBE_EFFICIENCY):
+    """
+    No double / double-take / double-pass equities for the side on roll with the
+    cube at `cube` and `owner` (relative to the side on roll), in model.result()
+    units, and the decisions they give (see cube_action)
+    """
+    no_double = model.value(owner, cube, win, efficiency)
+    double_take = model.value(CUBE_OPPONENT, 2 * cube, win, efficiency)
+    return cube_action(no_double, double_take, model.result(cube), model.result(-cube),
+                       owner != CUBE_OPPONENT and model.can_double('me', cube),
+                       beaver_line=model.result(0) if beavers else None)
+
+
+def money_model(win_rates, lose_rates):
+    """Money play: outcomes are worth the points won or lost"""
+    return CubeModel(float, lambda side, cube: cube < MAX_MONEY_CUBE, win_rates, lose_rates)
+
+
+def match_model(met, away, opponent_away, win_rates, lose_rates, crawford=False, post_crawford=False):
+    """
+    Match play: outcomes are worth match winning chances from the match equity
+    table, with the side on roll needing `away` points and the opponent `opponent_away`.
+    Nobody may double in the Crawford game, and a side stops doubling once a
+    single win at the current cube would take the match.
+    """
+    # Games after the Crawford game are post-Crawford
+    after_crawford = crawford or post_crawford
+
+    def result(points):
+        if points >= 0:
+            return met.equity(away - points, opponent_away, after_crawford)
+        return met.equity(away, opponent_away + points, after_crawford)
+
+    def can_double(side, cube):
+        needed = away if side == 'me' else opponent_away
+        return not crawford and needed > cube
+
+    return CubeModel(result, can_double, win_rates, lose_rates)
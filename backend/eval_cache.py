@@ -0,0 +1,111 @@
+"""
+Bounded LRU cache of position evaluations
+The frontend re-requests evaluation of the same board after every animation
+step, and move selection scores the same positions again and again, so
+equities are cached in-process keyed by position + side to move + evaluator.
+
+Limits (per service worker):
+    EVAL_CACHE_MAX_ENTRIES  - maximum number of cached equities (default: 100000)
+    EVAL_CACHE_MAX_BYTES    - optional approximate memory limit in bytes (default: no byte limit)
+"""
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+# Approximate per-entry bookkeeping cost of an OrderedDict slot (hash entry + linked-list node)
+ENTRY_OVERHEAD_BYTES = 100
+
+
+def eval_cache_key(board, context):
+    """
+    Cache key for one evaluation: canonical position, side to move and the
+    evaluator/eval-context that produced the equity (e.g. 'simple', 'gnubg:2ply').
+    """
+    return (board.key(), board.current_player, context)
+
+
+def _deep_size(obj):
+    """
+    Approximate size in bytes of `obj` and what it holds: containers (tuples,
+    lists, dicts such as cube analyses) are sized recursively.
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(k) + _deep_size(v) for k, v in obj.items())
+    elif isinstance(obj, (tuple, list, set, frozenset)):
+        size += sum(_deep_size(item) for item in obj)
+    return size
+
+
+class EvalCache:
+    """Thread-safe LRU mapping of cache keys to equities"""
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        if max_entries is None:
+            max_entries = int(os.environ.get('EVAL_CACHE_MAX_ENTRIES', 100000))
+        if max_bytes is None:
+            max_bytes = int(os.environ.get('EVAL_CACHE_MAX_BYTES', 0)) or None
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _entry_size(key, value):
+        return _deep_size(key) + _deep_size(value) + ENTRY_OVERHEAD_BYTES
+
+    def get(self, key):
+        """Return the cached value (marking it most recently used), or None on a miss"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store a value, evicting least recently used entries past the limits"""
+        if value is None or self.max_entries <= 0:
+            return
+        size = self._entry_size(key, value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes += size - self._entry_size(key, self._entries[key])
+                self._entries.move_to_end(key)
+                self._entries[key] = value
+                return
+            self._entries[key] = value
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or
+                                     (self.max_bytes is not None and self._bytes > self.max_bytes)):
+                old_key, old_value = self._entries.popitem(last=False)
+                self._bytes -= self._entry_size(old_key, old_value)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Hit/miss/eviction counters and current size (exposed on /api/health)"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'approx_bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,76 @@
+"""
+Move log replay for whole-game analysis (/api/analyze/game)
+A move log is a list of turns, each with the side that moved, its dice and the
+play made, either in standard notation from the mover's point of view
+("8/5 6/5", "bar/22*", "-" for no move) or as the frontend's steps
+([{"from": 7, "to": 4}, ...] with 'bar' and 'off'):
+
+    {"player": 2, "dice": [3, 1], "play": "8/5 6/5"}
+    {"player": 1, "dice": [6, 4], "moves": [{"from": 0, "to": 6}, {"from": 0, "to": 4}]}
+
+Turns without 'player' alternate sides. Replaying the log gives the position
+before every turn and all of its legal plays, so the turns can then be
+evaluated independently and in any order.
+"""
+
+from collections import namedtuple
+
+from board import BAR, OFF
+from movegen import generate_plays
+from opening_book import apply_play, parse_play
+
+# board: position before the turn; plays: all legal plays (movegen); played: the
+# play made (one of plays), or None when it is not legal, with `error` saying why
+Turn = namedtuple('Turn', ['index', 'player', 'dice', 'board', 'plays', 'played', 'error'])
+
+
+def _json_point(point):
+    if point in (BAR, OFF):
+        return point
+    return int(point)
+
+
+def _apply_steps(board, player, steps):
+    board = board.copy()
+    for step in steps:
+        board.apply(player, _json_point(step['from']), _json_point(step['to']))
+    board.current_player = 1 if player == 2 else 2
+    return board
+
+
+def replay_game(board, moves, first_player=1):
+    """
+    Turns of a move log played from `board` (see module docstring).
+    Raises ValueError for an entry that cannot be read, as the rest of the game
+    cannot be replayed past it. A readable but illegal play is reported in its
+    Turn's `error` and replay goes on from the position it produces.
+    """
+    turns = []
+    player = first_player
+    for index, entry in enumerate(moves):
+        try:
+            player = int(entry.get('player', player))
+            dice = [int(die) for die in entry['dice']]
+            if player not in (1, 2) or len(dice) != 2 or not all(1 <= die <= 6 for die in dice):
+                raise ValueError("needs 'player' 1 or 2 and two 'dice'")
+            board.current_player = player
+            if 'play' in entry:
+                result = apply_play(board, player, parse_play(entry['play']))
+            else:
+                result = _apply_steps(board, player, entry.get('moves') or [])
+            if (result.points < 0).any() or min(result.bar) < 0:
+                raise ValueError("moves a checker that is not there")
+        except (KeyError, TypeError, ValueError, IndexError) as e:
+            raise ValueError(f"move {index}: {e}")
+
+        plays = generate_plays(board, player, dice * 2 if dice[0] == dice[1] else dice)
+        key = result.key()
+        played = next((play for play in plays if play.board.key() == key), None)
+        error = None
+        if played is None and (plays or key != board.key()):
+            error = 'play is not legal'
+        turns.append(Turn(index, player, dice, board, plays, played, error))
+
+        board = played.board if played is not None else result
+        player = 1 if player == 2 else 2
+    return turns
@@ -0,0 +1,455 @@
+"""
+Pool of persistent GNU Backgammon workers
+Each worker is a long-lived `gnubg -t` process that has already loaded its
+neural network weights and imported gnubg_eval.py, so evaluations and hints
+only pay for the command round-trip instead of a full process start-up.
+Replies are framed by the gnubg prompt and read without blocking, so a stuck
+command is cut off at its deadline (and the worker replaced) instead of
+hanging the request thread. gnubg's default prompt depends on the game state
+and is not always printed, so every worker sets its own (GNUBG_PROMPT) when it
+starts, and a worker that does not print it is not used. A command can also carry a cancel token (see
+move_executor.CancelToken): cancelling it mid-flight kills and replaces the
+worker as well.
+
+The pool is sized per gunicorn worker (every gunicorn worker process gets its
+own pool, created lazily after the fork) and is configured with:
+    GNUBG_POOL_SIZE          - number of gnubg processes (default: CPU cores / WEB_CONCURRENCY)
+    GNUBG_POOL_WAIT_TIMEOUT  - seconds a request may wait for a free worker (default: 2.0)
+    GNUBG_START_TIMEOUT      - seconds a new worker may take to print its first prompt (default: 5.0)
+
+Time spent waiting for a worker, starting one, and in command round-trips is
+recorded as metrics stages (gnubg_wait, gnubg_spawn, gnubg_io); evaluations
+split their round-trip into gnubg_eval (reported by gnubg_eval.py) and gnubg_io.
+"""
+
+import json
+import os
+import selectors
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import count, observe_stage
+
+GNUBG_PROMPT = "gnubg>"
+# Seconds a new worker gets to load its weights and answer `set prompt`
+GNUBG_START_TIMEOUT = float(os.environ.get('GNUBG_START_TIMEOUT', 5.0))
+EVAL_READY_MARKER = "GNUBG_EVAL_READY"
+# How often a command waiting for its reply checks its cancel token (seconds)
+CANCEL_POLL_INTERVAL = 0.05
+
+
+def default_pool_size():
+    """
+    Number of gnubg processes per gunicorn worker.
+    Spreads the machine's cores across the gunicorn workers (WEB_CONCURRENCY is
+    the worker count gunicorn itself reads), with at least one gnubg per worker.
+    """
+    configured = os.environ.get('GNUBG_POOL_SIZE')
+    if configured:
+        try:
+            return max(1, int(configured))
+        except ValueError:
+            print(f"⚠ Invalid GNUBG_POOL_SIZE={configured!r}, using default")
+
+    cores = os.cpu_count() or 1
+    try:
+        web_workers = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+    except ValueError:
+        web_workers = 1
+    return max(1, cores // web_workers)
+
+
+class GnubgTimeout(Exception):
+    """A gnubg command did not finish before its deadline (the worker is killed)"""
+
+
+class GnubgCancelled(Exception):
+    """A gnubg command was cancelled while waiting for its reply (the worker is killed)"""
+
+
+class GnubgWorker:
+    """
+    A single persistent GNU Backgammon process driven over stdin/stdout.
+    stdout is read without blocking (selectors + os.read) and split into one
+    response per command on the gnubg prompt, so every command has a real
+    deadline and several commands can be written before reading any reply.
+    """
+
+    def __init__(self, gnubg_path, worker_id):
+        self.gnubg_path = gnubg_path
+        self.worker_id = worker_id
+        self.process = None
+        self.python_ready = False  # True once gnubg_eval.py is imported inside the process
+        self.commands_sent = 0
+        self.timeouts = 0
+        self.cancellations = 0
+        self._selector = None
+        self._buffer = b""
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """Start the gnubg process and import the evaluation helpers into its Python interpreter"""
+        subprocess_kwargs = {
+            'stdin': subprocess.PIPE,
+            'stdout': subprocess.PIPE,
+            'stderr': subprocess.DEVNULL,  # Never read; a PIPE here would eventually fill up and block gnubg
+            'bufsize': 0,  # Unbuffered bytes; framing is done on our side
+            'cwd': os.path.dirname(self.gnubg_path) if os.path.dirname(self.gnubg_path) else None,
+        }
+
+        if sys.platform == 'win32':
+            try:
+                subprocess_kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
+            except AttributeError:
+                pass
+
+        try:
+            # Start gnubg-cli in command-line mode
+            self.process = subprocess.Popen(
+                [self.gnubg_path, '-t', '--no-rc', '--quiet'],
+                **subprocess_kwargs
+            )
+            os.set_blocking(self.process.stdout.fileno(), False)
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(self.process.stdout, selectors.EVENT_READ)
+            self._buffer = b""
+        except Exception as e:
+            print(f"✗ Error starting GNU Backgammon worker {self.worker_id}: {e}")
+            self.kill()
+            return False
+
+        # Replies are framed on our own prompt: the banner and any default prompts
+        # end up in the reply to `set prompt`, which ends with the first GNUBG_PROMPT
+        try:
+            self.process.stdin.write(f"set prompt {GNUBG_PROMPT}\n".encode())
+            self.process.stdin.flush()
+            self._read_response(time.monotonic() + GNUBG_START_TIMEOUT)
+        except GnubgTimeout:
+            print(f"✗ GNU Backgammon worker {self.worker_id} printed no {GNUBG_PROMPT!r} prompt within "
+                  f"{GNUBG_START_TIMEOUT:g}s of `set prompt`; its replies cannot be framed")
+            self.kill()
+            return False
+        except Exception:
+            print(f"✗ GNU Backgammon worker {self.worker_id} did not start correctly")
+            if self.process is not None and self.process.poll() is not None:
+                print(f"  Process exited with code: {self.process.returncode}")
+            self.kill()
+            return False
+
+        # Lines starting with '>' are handed to gnubg's embedded Python interpreter.
+        # Import gnubg_eval once so every later evaluation is a single function call.
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        try:
+            responses, _ = self._exchange(
+                [f">import sys; sys.path.insert(0, {script_dir!r}); import gnubg_eval; "
+                 f"print({EVAL_READY_MARKER!r}, flush=True)"],
+                2.0, None
+            )
+            reply = responses[0]
+            self.python_ready = EVAL_READY_MARKER in reply
+        except Exception:
+            self.python_ready = False
+
+        if not self.is_alive():
+            return False
+
+        if self.python_ready:
+            print(f"✓ GNU Backgammon worker {self.worker_id} started (pid {self.process.pid})")
+        else:
+            print(f"⚠ GNU Backgammon worker {self.worker_id} started without Python support (hints only)")
+        return True
+
+    def _read_response(self, deadline, cancel=None):
+        """
+        Return the output up to (not including) the next prompt.
+        Raises GnubgTimeout if the prompt has not arrived by `deadline` (time.monotonic()),
+        or GnubgCancelled as soon as `cancel` is cancelled.
+        """
+        prompt = GNUBG_PROMPT.encode()
+        while True:
+            index = self._buffer.find(prompt)
+            if index >= 0:
+                response = self._buffer[:index]
+                self._buffer = self._buffer[index + len(prompt):].lstrip(b" ")
+                return response.decode(errors='replace')
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise GnubgTimeout(f"GNU Backgammon worker {self.worker_id} timed out waiting for the prompt")
+            if cancel is not None:
+                if cancel.cancelled:
+                    raise GnubgCancelled(f"GNU Backgammon worker {self.worker_id} command cancelled")
+                remaining = min(remaining, CANCEL_POLL_INTERVAL)
+            if not self._selector.select(remaining):
+                continue
+            try:
+                chunk = os.read(self.process.stdout.fileno(), 65536)
+            except BlockingIOError:
+                continue
+            if not chunk:
+                raise Exception(f"GNU Backgammon worker {self.worker_id} exited")
+            self._buffer += chunk
+
+    def send_many(self, commands, timeout=1.0, cancel=None):
+        """
+        Pipeline several commands: write them all at once, then read one
+        prompt-framed response per command.
+        `timeout` is a per-command budget (a number, or one number per command),
+        counted from when the previous response finished arriving.
+        On a timeout or cancellation the process is killed, since its output can
+        no longer be matched to commands, and the pool starts a replacement.
+        """
+        if not self.is_alive():
+            raise Exception(f"GNU Backgammon worker {self.worker_id} is not running")
+
+        responses, elapsed = self._exchange(commands, timeout, cancel)
+        observe_stage('gnubg_io', elapsed)
+        return responses
+
+    def _exchange(self, commands, timeout, cancel):
+        # send_many without the metrics: (responses, round-trip seconds)
+        commands = list(commands)
+        timeouts = list(timeout) if isinstance(timeout, (list, tuple)) else [timeout] * len(commands)
+
+        start_time = time.perf_counter()
+        try:
+            self.process.stdin.write("".join(command + '\n' for command in commands).encode())
+            self.process.stdin.flush()
+            self.commands_sent += len(commands)
+
+            responses = []
+            for command, command_timeout in zip(commands, timeouts):
+                responses.append(self._read_response(time.monotonic() + command_timeout, cancel).strip())
+            return responses, time.perf_counter() - start_time
+        except GnubgTimeout as e:
+            self.timeouts += 1
+            count('gnubg_timeout')
+            print(f"✗ {e} (command: {command[:40]!r})")
+            self.kill()
+            raise
+        except GnubgCancelled as e:
+            self.cancellations += 1
+            count('gnubg_cancelled')
+            print(f"ℹ {e}, replacing the process")
+            self.kill()
+            raise
+        except Exception as e:
+            print(f"✗ Error sending command to GNU Backgammon worker {self.worker_id}: {e}")
+            self.kill()
+            raise
+
+    def send(self, command, timeout=1.0, cancel=None):
+        """Send one command and return its output (everything before the next prompt)"""
+        return self.send_many([command], timeout=timeout, cancel=cancel)[0]
+
+    def evaluate(self, game_state, timeout=2.0, cancel=None):
+        """
+        Evaluate a game state (or batch payload) with gnubg_eval inside this worker.
+        Returns the parsed JSON result dict, or None if no reply arrived.
+        """
+        payload = json.dumps(game_state)
+        if not self.is_alive():
+            raise Exception(f"GNU Backgammon worker {self.worker_id} is not running")
+        responses, elapsed = self._exchange([f">gnubg_eval.serve_request({payload!r})"], timeout, cancel)
+
+        for line in reversed(responses[0].split('\n')):
+            if '{' not in line:
+                continue
+            try:
+                reply = json.loads(line[line.index('{'):].strip())
+            except json.JSONDecodeError:
+                continue
+            evaluating = min(elapsed, reply.get('elapsedMs', 0) / 1000) if isinstance(reply, dict) else 0
+            observe_stage('gnubg_eval', evaluating)
+            observe_stage('gnubg_io', elapsed - evaluating)
+            return reply
+        observe_stage('gnubg_io', elapsed)
+        return None
+
+    def evaluate_batch(self, game_states, eval_context=None, timeout=None, cancel=None):
+        """
+        Evaluate several game states in one round-trip (gnubg_eval.evaluate_batch).
+        Returns a list of result dicts in input order, or None if no reply arrived.
+        """
+        payload = {'positions': list(game_states)}
+        if eval_context:
+            payload['evalContext'] = eval_context
+        if timeout is None:
+            timeout = 2.0 + 0.5 * len(payload['positions'])
+        reply = self.evaluate(payload, timeout=timeout, cancel=cancel)
+        if not reply or not isinstance(reply.get('results'), list):
+            return None
+        return reply['results']
+
+    def kill(self):
+        """Terminate the process; the pool starts a replacement on next use"""
+        if self._selector is not None:
+            try:
+                self._selector.close()
+            except:
+                pass
+            self._selector = None
+        if self.process is not None:
+            try:
+                self.process.kill()
+                self.process.wait(timeout=1.0)
+            except:
+                pass
+        self.process = None
+        self.python_ready = False
+        self._buffer = b""
+
+
+class GnubgPool:
+    """
+    Fixed-size pool of GnubgWorker processes shared by all request threads.
+    Workers are started lazily, so importing the service (or forking gunicorn
+    workers after import) does not spawn any gnubg processes.
+    """
+
+    def __init__(self, gnubg_path, size=None, wait_timeout=None):
+        self.gnubg_path = gnubg_path
+        self.size = size if size is not None else default_pool_size()
+        self.wait_timeout = wait_timeout if wait_timeout is not None else float(
+            os.environ.get('GNUBG_POOL_WAIT_TIMEOUT', 2.0))
+        self._condition = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = []  # Started workers that are free
+        self._spawned = 0  # Workers that exist (idle + busy)
+        self._next_id = 0
+        self._waiting = 0
+        self._acquired = 0
+        self._wait_timeouts = 0
+        self._replaced = 0  # Workers that died in use and will be started afresh
+        self._command_timeouts = 0
+        self._command_cancellations = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _check_fork(self):
+        # A pool created before a fork belongs to the parent process; start over in the child
+        if self._pid != os.getpid():
+            self._reset()
+
+    def acquire(self, timeout=None):
+        """Take a worker from the pool, starting one if below size. Returns None on timeout."""
+        timeout = self.wait_timeout if timeout is None else timeout
+        start_time = time.time()
+        deadline = start_time + timeout
+
+        with self._condition:
+            self._check_fork()
+            self._waiting += 1
+            try:
+                while True:
+                    if self._idle:
+                        worker = self._idle.pop()
+                        break
+                    if self._spawned < self.size:
+                        self._spawned += 1
+                        self._next_id += 1
+                        worker = GnubgWorker(self.gnubg_path, self._next_id)
+                        break
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self._wait_timeouts += 1
+                        count('gnubg_pool_exhausted')
+                        print(f"⚠ No GNU Backgammon worker free after {timeout:.1f}s (pool size {self.size})")
+                        return None
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+            waited = time.time() - start_time
+            observe_stage('gnubg_wait', waited)
+            self._acquired += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+
+        # Start outside the lock so other threads can keep using idle workers
+        if not worker.is_alive():
+            start_time = time.perf_counter()
+            started = worker.start()
+            observe_stage('gnubg_spawn', time.perf_counter() - start_time)
+            if not started:
+                self._discard(worker)
+                return None
+        return worker
+
+    def check(self):
+        """
+        Start one worker and stop it again: True if it came up and framed its replies.
+        Run once at service start-up so a gnubg that cannot be driven is reported
+        there instead of every request waiting out its deadline.
+        """
+        worker = GnubgWorker(self.gnubg_path, 0)
+        try:
+            return worker.start()
+        finally:
+            worker.kill()
+
+    def release(self, worker):
+        """Return a worker to the pool (dead workers free their slot for a replacement)"""
+        if worker is None:
+            return
+        with self._condition:
+            if self._pid != os.getpid():
+                return
+            if worker.is_alive():
+                self._idle.append(worker)
+            else:
+                self._spawned -= 1
+                self._replaced += 1
+                self._command_timeouts += worker.timeouts
+                self._command_cancellations += worker.cancellations
+            self._condition.notify()
+
+    def _discard(self, worker):
+        worker.kill()
+        with self._condition:
+            self._spawned -= 1
+            self._condition.notify()
+
+    @contextmanager
+    def worker(self, timeout=None):
+        """Context manager yielding a worker (or None if none became free in time)"""
+        worker = self.acquire(timeout)
+        try:
+            yield worker
+        finally:
+            self.release(worker)
+
+    def stats(self):
+        """Pool utilisation, queue depth and wait time (exposed on /api/health)"""
+        with self._condition:
+            self._check_fork()
+            return {
+                'size': self.size,
+                'started': self._spawned,
+                'idle': len(self._idle),
+                'busy': self._spawned - len(self._idle),
+                'queue_depth': self._waiting,
+                'acquired': self._acquired,
+                'wait_timeouts': self._wait_timeouts,
+                'replaced': self._replaced,
+                'command_timeouts': self._command_timeouts,
+                'command_cancellations': self._command_cancellations,
+                'avg_wait_ms': round(self._total_wait / self._acquired * 1000, 2) if self._acquired else 0.0,
+                'max_wait_ms': round(self._max_wait * 1000, 2),
+            }
+
+    def shutdown(self):
+        """Kill all idle workers (busy ones are killed when released)"""
+        with self._condition:
+            for worker in self._idle:
+                worker.kill()
+                self._spawned -= 1
+            self._idle = []
@@ -0,0 +1,78 @@
+"""
+Match equity table (MET) for cube decisions in match play
+Match winning chances by the number of points each side still needs, loaded
+once at startup from a JSON file (MET_PATH, default met.json next to this
+file) written by build_met.py:
+
+    {"gammon_rate": 0.26, "size": 25,
+     "pre_crawford": [[...]],   # [a - 1][b - 1]: chance of the side needing a against b;
+                                # 1-away rows and columns are the Crawford game
+     "post_crawford": [...]}    # [b - 1]: chance of the side needing 1 against b, post-Crawford
+"""
+
+import json
+import os
+
+DEFAULT_MET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'met.json')
+
+
+class MatchEquityTable:
+    """Match winning chances; scores beyond the table are looked up at its edge"""
+
+    def __init__(self, pre_crawford, post_crawford, gammon_rate=None, path=None):
+        self.pre_crawford = pre_crawford
+        self.post_crawford = post_crawford
+        self.gammon_rate = gammon_rate
+        self.path = path
+        self.size = len(post_crawford)
+        if len(pre_crawford) != self.size or any(len(row) != self.size for row in pre_crawford):
+            raise ValueError(f"expected a {self.size} x {self.size} pre-Crawford table")
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data['pre_crawford'], data['post_crawford'], data.get('gammon_rate'), path=path)
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'gammon_rate': self.gammon_rate,
+                'size': self.size,
+                'pre_crawford': [[round(equity, 6) for equity in row] for row in self.pre_crawford],
+                'post_crawford': [round(equity, 6) for equity in self.post_crawford],
+            }, f)
+        os.replace(tmp_path, path)
+
+    def equity(self, away, opponent_away, post_crawford=False):
+        """
+        Chance that the side needing `away` points wins the match against one
+        needing `opponent_away`. At 1-away the next game is the Crawford game
+        unless `post_crawford` is set.
+        """
+        if away <= 0:
+            return 1.0
+        if opponent_away <= 0:
+            return 0.0
+        away, opponent_away = min(away, self.size), min(opponent_away, self.size)
+        if post_crawford and away == 1 and opponent_away > 1:
+            return self.post_crawford[opponent_away - 1]
+        if post_crawford and opponent_away == 1 and away > 1:
+            return 1.0 - self.post_crawford[away - 1]
+        return self.pre_crawford[away - 1][opponent_away - 1]
+
+
+def load_met(path=None):
+    """Load the match equity table (MET_PATH or met.json next to this file); None if missing"""
+    path = path or os.environ.get('MET_PATH') or DEFAULT_MET_PATH
+    if not os.path.exists(path):
+        print(f"ℹ Match equity table not found at {path} - run build_met.py to enable match-play cube decisions")
+        return None
+    try:
+        met = MatchEquityTable.load(path)
+    except Exception as e:
+        print(f"✗ Could not load match equity table {path}: {e}")
+        return None
+    print(f"✓ Match equity table loaded ({met.size}-point)")
+    return met
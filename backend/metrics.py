@@ -0,0 +1,256 @@
+"""
+Request-stage latency histograms and event counters (served on /metrics)
+Each request runs inside request_metrics(endpoint), which records its total
+time (for a streamed response, until the stream ends: see stream()); code along the way times its stages with stage(name) and counts events
+(cache hits, timeouts, fallbacks) with count(event). Stage timings and events
+are labelled with the endpoint and difficulty of the request they belong to.
+The labels live in a context variable, which MoveExecutor copies into its
+threads, so work handed to the executors is still attributed to its request.
+
+Stages nest (a GNU Backgammon round-trip happens inside a ranking stage), so
+they do not add up to the request total. Everything is kept per process: with
+several gunicorn workers, each one serves its own numbers.
+
+render() produces the Prometheus text exposition format.
+"""
+
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the latency buckets (seconds)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (endpoint, difficulty) of the request being served; empty labels outside requests
+_request_labels = contextvars.ContextVar('metrics_request_labels', default=('', ''))
+# Start time of the request being served, and whether a streamed body takes over its timing
+_request_timing = contextvars.ContextVar('metrics_request_timing', default=None)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class Counter:
+    """Monotonic counter per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        """Add `amount` to the counter for `labels` (one value per label name)"""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label combination (as Prometheus expects)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [count per bucket (the last one past every bound), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, labels=()):
+        with self._lock:
+            series = self._series.get(labels)
+            return sum(series[0]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        names = self.labelnames + ('le',)
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield (f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} "
+                       f"{cumulative}")
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class MetricsRegistry:
+    """The metrics of this process, in registration order"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+REQUEST_SECONDS = REGISTRY.histogram('backgammon_request_seconds', 'Request latency by endpoint',
+                                     ('endpoint', 'difficulty'))
+STAGE_SECONDS = REGISTRY.histogram('backgammon_stage_seconds', 'Latency of each stage of a request',
+                                   ('endpoint', 'stage'))
+EVENTS = REGISTRY.counter('backgammon_events_total', 'Cache hits and misses, timeouts and fallbacks',
+                          ('endpoint', 'difficulty', 'event'))
+CPU_MOVES = REGISTRY.counter('backgammon_cpu_moves_total', 'CPU moves by the stage that chose them',
+                             ('difficulty', 'method'))
+
+
+def _difficulty_label(difficulty):
+    try:
+        return str(int(difficulty))
+    except (TypeError, ValueError):
+        return ''
+
+
+@contextmanager
+def request_metrics(endpoint, difficulty=None):
+    """Label everything recorded inside with `endpoint` and record the request's total time"""
+    token = _request_labels.set((endpoint, _difficulty_label(difficulty)))
+    timing = {'start': time.perf_counter(), 'streamed': False}
+    timing_token = _request_timing.set(timing)
+    try:
+        yield
+    finally:
+        if not timing['streamed']:
+            REQUEST_SECONDS.observe(time.perf_counter() - timing['start'], _request_labels.get())
+        _request_timing.reset(timing_token)
+        _request_labels.reset(token)
+
+
+def instrument(endpoint):
+    """Decorator for a Flask view: run it inside request_metrics(endpoint)"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with request_metrics(endpoint):
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def stream(chunks):
+    """
+    Wrap the body of a streamed response returned by an instrumented view: the
+    body runs with the request's labels, and the request's total time is recorded
+    when the stream ends instead of when the view returns.
+    """
+    labels = _request_labels.get()
+    timing = _request_timing.get()
+    if timing is not None:
+        timing['streamed'] = True
+
+    def body():
+        token = _request_labels.set(labels)
+        try:
+            yield from chunks
+        finally:
+            if timing is not None:
+                REQUEST_SECONDS.observe(time.perf_counter() - timing['start'], _request_labels.get())
+            try:
+                _request_labels.reset(token)
+            except ValueError:
+                # Closed from a different context than it ran in
+                pass
+    return body()
+
+
+def set_difficulty(difficulty):
+    """Label the rest of the current request (or executor computation) with its difficulty"""
+    _request_labels.set((_request_labels.get()[0], _difficulty_label(difficulty)))
+
+
+def observe_stage(name, seconds):
+    STAGE_SECONDS.observe(seconds, (_request_labels.get()[0], name))
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as stage `name` of the current request"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start_time)
+
+
+def count(event, amount=1):
+    """Count `event` for the current request's endpoint and difficulty"""
+    if amount:
+        endpoint, difficulty = _request_labels.get()
+        EVENTS.inc((endpoint, difficulty, event), amount)
+
+
+def count_move(method):
+    CPU_MOVES.inc((_request_labels.get()[1], method or 'unranked'))
+
+
+def stats_lines(prefix, stats):
+    """Numeric fields of a stats() dict (as on /api/health) as Prometheus gauges"""
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f"{prefix}_{key}"
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_format_value(value)}")
+    return lines
+
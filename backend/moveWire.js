@@ -0,0 +1,160 @@
+// Binary /api/cpu/move format spoken to the Python AI service
+// (layout documented in move_wire.py). CPU turns travel as a 17-byte request
+// with the position key instead of the JSON gameState, and the chosen play
+// comes back as a few bytes.
+
+export const MOVE_MEDIA_TYPE = 'application/x-backgammon-move';
+
+const WIRE_VERSION = 1;
+const REQUEST_SIZE = 17;
+const NUM_POINTS = 24;
+const CHECKERS_PER_PLAYER = 15;
+const WIRE_BAR = 24;
+const WIRE_OFF = 25;
+const MOVE_METHODS = ['unranked', 'heuristic', 'gnubg', 'neural', 'book'];
+
+function playerEntry(mapping, player) {
+  if (!mapping) return undefined;
+  return mapping[String(player)] ?? mapping[player];
+}
+
+// Checker counts per point for both players, bar and side on roll
+function countCheckers(gameState) {
+  const points = [new Array(NUM_POINTS).fill(0), new Array(NUM_POINTS).fill(0)];
+  for (const checker of gameState.checkers || []) {
+    const point = Number(checker.point);
+    const player = Number(checker.player);
+    if (Number.isInteger(point) && point >= 0 && point < NUM_POINTS && (player === 1 || player === 2)) {
+      points[player - 1][point] += 1;
+    }
+  }
+  const bar = [1, 2].map((player) => (playerEntry(gameState.bar, player) || []).length);
+  return { points, bar };
+}
+
+// Position key (gnubg Position ID bits): side not on roll, then side on roll,
+// each from its ace point to its 24 point and then its bar, one 1-bit per checker
+// and a 0-bit per point, packed little-endian into 10 bytes
+export function positionKey(points, bar, onRoll) {
+  const key = new Uint8Array(10);
+  let bit = 0;
+  for (const player of [onRoll === 2 ? 1 : 2, onRoll]) {
+    const own = points[player - 1];
+    const runs = player === 2 ? [...own] : [...own].reverse();
+    runs.push(bar[player - 1]);
+    if (runs.reduce((sum, count) => sum + count, 0) > CHECKERS_PER_PLAYER) return null;
+    for (const count of runs) {
+      for (let i = 0; i < count; i++, bit++) key[bit >> 3] |= 1 << (bit & 7);
+      bit++;
+    }
+  }
+  return key;
+}
+
+// Binary request body, or null when the turn cannot be expressed in it
+// (dice unknown, or an invalid position); the caller then sends JSON
+export function encodeMoveRequest(gameState, difficulty, deadlineMs) {
+  if (!gameState) return null;
+  let movesAllowed = gameState.movesAllowed || [];
+  let used = new Set(gameState.usedDice || []);
+  if (!movesAllowed.length) {
+    const dice = (gameState.dice || []).filter(Boolean);
+    movesAllowed = dice.length === 2 && dice[0] === dice[1] ? [...dice, ...dice] : dice;
+    used = new Set();
+  }
+  if (!movesAllowed.length || movesAllowed.length > 4 || movesAllowed.every((_, i) => used.has(i))) return null;
+
+  let diceBits = 0;
+  for (let i = 0; i < movesAllowed.length; i++) {
+    const die = Number(movesAllowed[i]);
+    if (!Number.isInteger(die) || die < 1 || die > 6) return null;
+    diceBits |= (die | (used.has(i) ? 8 : 0)) << (4 * i);
+  }
+
+  const onRoll = Number(gameState.currentPlayer ?? 2);
+  const level = Number(difficulty ?? 5);
+  const deadline = Math.round(Number(deadlineMs || 0));
+  const cube = Number(gameState.cubeValue || gameState.gameStakes || 1);
+  const owner = [1, 2].includes(Number(gameState.cubeOwner)) ? Number(gameState.cubeOwner) : 0;
+  if ((onRoll !== 1 && onRoll !== 2) || !Number.isInteger(level) || level < 0 || level > 255 ||
+      !(deadline >= 0 && deadline <= 0xffff) || !(cube >= 1 && cube < 1 << 16)) {
+    return null;
+  }
+
+  const { points, bar } = countCheckers(gameState);
+  const key = positionKey(points, bar, onRoll);
+  if (!key) return null;
+
+  const body = Buffer.alloc(REQUEST_SIZE);
+  body.writeUInt8(WIRE_VERSION, 0);
+  body.set(key, 1);
+  body.writeUInt8(onRoll | (owner << 2) | (Math.floor(Math.log2(cube)) << 4), 11);
+  body.writeUInt8(level, 12);
+  body.writeUInt16LE(diceBits, 13);
+  body.writeUInt16LE(deadline, 15);
+  return body;
+}
+
+function jsonPoint(point) {
+  if (point === WIRE_BAR) return 'bar';
+  if (point === WIRE_OFF) return 'off';
+  return point;
+}
+
+// { method, deadline_reached, difficulty, moves } from a binary response
+export function decodeMoveResponse(data) {
+  const bytes = new Uint8Array(data);
+  const count = bytes[4];
+  if (bytes.length < 5 || bytes[0] !== WIRE_VERSION || bytes.length !== 5 + 3 * count) {
+    throw new Error('Malformed move response');
+  }
+  const code = bytes[1];
+  const moves = [];
+  for (let i = 5; i < bytes.length; i += 3) {
+    moves.push({ from: jsonPoint(bytes[i]), to: jsonPoint(bytes[i + 1]), die: bytes[i + 2] });
+  }
+  return {
+    method: code & 0x80 ? `search-${code & 0x7f}ply` : MOVE_METHODS[code],
+    deadline_reached: Boolean(bytes[2] & 1),
+    difficulty: bytes[3],
+    moves
+  };
+}
+
+// First step of a play in the frontend's legal-move format (movegen.step_to_legal_move):
+// the client's own legalMoves entry when it sent them, else built from the step
+export function stepToLegalMove(step, gameState, legalMoves = []) {
+  if (legalMoves.length) {
+    if (step.to === 'off') {
+      return legalMoves.includes('bearoff')
+        ? 'bearoff'
+        : legalMoves.find((move) => typeof move === 'string' && move.startsWith('bearoff')) ?? null;
+    }
+    return legalMoves.find((move) => step.from === 'bar'
+      ? typeof move === 'string' && move.startsWith(`${step.to}|1|bar|`)
+      : move === step.to || move === String(step.to)) ?? null;
+  }
+  if (step.to === 'off') return 'bearoff';
+  if (step.from === 'bar') {
+    const used = new Set(gameState.usedDice || []);
+    const dieIndex = (gameState.movesAllowed || []).findIndex((die, i) => !used.has(i) && Number(die) === step.die);
+    return `${step.to}|1|bar|${Math.max(dieIndex, 0)}`;
+  }
+  return step.to;
+}
+
+// [response, status] pairs from a binary /api/cpu/move/batch response: each record is
+// u16 status, u16 length, then a binary move response (status 200) or a JSON error
+export function decodeMoveBatchResponse(data) {
+  const bytes = Buffer.from(data);
+  const results = [];
+  let offset = 0;
+  while (offset + 4 <= bytes.length) {
+    const status = bytes.readUInt16LE(offset);
+    const length = bytes.readUInt16LE(offset + 2);
+    const payload = bytes.subarray(offset + 4, offset + 4 + length);
+    offset += 4 + length;
+    results.push([status === 200 ? decodeMoveResponse(payload) : JSON.parse(payload.toString()), status]);
+  }
+  return results;
+}
@@ -0,0 +1,216 @@
+"""
+Shared, fixed-size executor for CPU move computations
+Move selection runs on a bounded set of threads per service worker instead of
+one new thread per request. A request waits for its computation until its
+deadline; if the computation is still running it is cancelled through a
+CancelToken, which the search, the ranking stages and GNU Backgammon calls
+check so the thread (and any gnubg process it holds) is freed promptly.
+Computations still queued when their request gives up never start.
+Each computation runs in a copy of its submitter's context variables (so
+metrics recorded on the pool threads are attributed to the right request, and
+a profiled request's computations are sampled with it).
+
+Configured with:
+    MOVE_EXECUTOR_WORKERS  - threads per service worker (default: 4)
+"""
+
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+
+import profiling
+
+
+class Cancelled(Exception):
+    """The computation was cancelled because its request stopped waiting for it"""
+
+
+class CancelToken:
+    """Cooperative cancellation flag shared between a request and its computation"""
+
+    __slots__ = ('_event',)
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        """Raise Cancelled if the token has been cancelled"""
+        if self._event.is_set():
+            raise Cancelled()
+
+
+class InlineExecutor:
+    """
+    Runs a computation on the calling thread instead of a pool, with the same
+    run() contract as MoveExecutor: the cancel token is cancelled once `timeout`
+    passes. For callers that already are pool threads (one per game of a batch),
+    so their stages do not queue behind each other on the shared pool.
+    """
+
+    def run(self, fn, timeout):
+        token = CancelToken()
+        timer = threading.Timer(max(0.0, timeout), token.cancel)
+        timer.daemon = True
+        timer.start()
+        try:
+            fn(token)
+        except Cancelled:
+            pass
+        finally:
+            timer.cancel()
+        return not token.cancelled
+
+
+class MoveExecutor:
+    """
+    Fixed-size thread pool for move computations with cancellation and counters.
+    The threads are created lazily, so a service imported before gunicorn forks
+    gets a fresh pool in every worker process.
+    """
+
+    def __init__(self, max_workers=None):
+        if max_workers is None:
+            max_workers = int(os.environ.get('MOVE_EXECUTOR_WORKERS', 4))
+        self.max_workers = max(1, max_workers)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._executor = None
+        self._queued = 0
+        self._running = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._abandoned = 0  # Still running when their request returned (then cancelled)
+        self._abandoned_running = 0  # Abandoned computations that have not noticed the cancellation yet
+        self._dropped = 0  # Still queued when their request returned (never started)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='move-worker')
+            self._queued += 1
+            self._submitted += 1
+            return self._executor
+
+    def run(self, fn, timeout):
+        """
+        Run fn(cancel_token) on the pool and wait up to `timeout` seconds.
+        Returns True if it finished in time. Otherwise the computation is
+        cancelled (dropped if it never started) and False is returned; whatever
+        fn published before that remains the caller's to use.
+        """
+        return self.run_all([fn], timeout)[0]
+
+    def run_all(self, fns, timeout):
+        """
+        Run several fn(cancel_token) computations on the pool side by side and
+        wait up to `timeout` seconds for all of them. Returns one finished flag
+        per fn; computations still running or queued at the timeout are
+        cancelled as in run().
+        """
+        finished = [False] * len(fns)
+        for index in self.run_each(fns, timeout):
+            finished[index] = True
+        return finished
+
+    def run_each(self, fns, timeout):
+        """
+        Like run_all, but a generator yielding the index of each computation as
+        soon as it finishes (in completion order). The ones not finished after
+        `timeout` seconds are cancelled and never yielded; closing the generator
+        early cancels the rest too.
+        """
+        tasks = [self._submit(fn) for fn in fns]
+        pending = {future: index for index, (future, _, _) in enumerate(tasks)}
+        try:
+            try:
+                for future in as_completed(list(pending), timeout=max(0.0, timeout)):
+                    yield pending.pop(future)
+            except TimeoutError:
+                pass
+            for future, index in list(pending.items()):
+                del pending[future]
+                if self._abandon(*tasks[index]):
+                    # Finished between the timeout and the cancellation
+                    yield index
+        finally:
+            for index in pending.values():
+                self._abandon(*tasks[index])
+
+    def _abandon(self, future, token, state):
+        """Cancel a computation; returns True if it had finished after all"""
+        token.cancel()
+        with self._lock:
+            if future.done():
+                return True
+            if state['started']:
+                state['abandoned'] = True
+                self._abandoned += 1
+                self._abandoned_running += 1
+            else:
+                self._queued -= 1
+                self._dropped += 1
+        return False
+
+    def _submit(self, fn):
+        token = CancelToken()
+        state = {'started': False, 'abandoned': False}
+
+        def task():
+            with self._lock:
+                if token.cancelled:
+                    return
+                state['started'] = True
+                self._queued -= 1
+                self._running += 1
+            failed = False
+            try:
+                with profiling.thread_scope('move-worker'):
+                    fn(token)
+            except Cancelled:
+                pass
+            except Exception as e:
+                failed = True
+                print(f"✗ Error in move computation: {e}")
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    if state['abandoned']:
+                        self._abandoned_running -= 1
+                    elif failed:
+                        self._failed += 1
+                    else:
+                        self._completed += 1
+
+        return self._get_executor().submit(contextvars.copy_context().run, task), token, state
+
+    def stats(self):
+        """Executor size, load and abandoned computations (exposed on /api/health)"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            return {
+                'workers': self.max_workers,
+                'running': self._running,
+                'queued': self._queued,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'failed': self._failed,
+                'abandoned': self._abandoned,
+                'abandoned_running': self._abandoned_running,
+                'dropped': self._dropped,
+            }
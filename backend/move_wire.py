@@ -0,0 +1,171 @@
+"""
+Compact binary format for /api/cpu/move (content type MOVE_MEDIA_TYPE)
+server.js sends CPU turns in this format instead of the JSON gameState, so the
+hop to the service carries 17 bytes instead of a few kilobytes of per-checker
+dicts. Requests with this Content-Type are answered in it when the Accept
+header includes it; errors are always JSON. All integers are little-endian.
+
+Request (17 bytes):
+    u8      format version (1)
+    10s     position key with the side on roll (see position_codec)
+    u8      side on roll (1, 2) | cube owner (0 centered, 1, 2) << 2 | log2(cube value) << 4
+    u8      difficulty
+    u16     gameState.movesAllowed, one nibble per die from the low nibble up:
+            die value (1-6) | 8 when already used (usedDice), 0 past the end
+    u16     deadline in milliseconds (0: the service's CPU_MOVE_DEADLINE)
+
+Response (5 + 3 per step bytes):
+    u8      format version (1)
+    u8      method: MOVE_METHODS index, or 0x80 | depth for 'search-<depth>ply'
+    u8      flags: 1 = deadline reached
+    u8      difficulty
+    u8      number of steps, then per step u8 from, u8 to, u8 die
+            (points 0-23, WIRE_BAR for the bar, WIRE_OFF for bearing off)
+
+The response has no 'move' in the frontend's legal-move format; it is the
+first step, which the caller knows how to express (movegen.step_to_legal_move).
+
+/api/cpu/move/batch takes the concatenation of N requests and answers with N
+records in request order:
+    u16     status (200 for a move, otherwise the error's HTTP status)
+    u16     payload length
+            payload: the response above for status 200, else the JSON error object
+"""
+
+import json
+import struct
+
+from board import BAR, OFF, Board
+
+MOVE_MEDIA_TYPE = 'application/x-backgammon-move'
+WIRE_VERSION = 1
+
+_REQUEST = struct.Struct('<B10sBBHH')
+_RESPONSE_HEADER = struct.Struct('<BBBBB')
+_BATCH_RECORD = struct.Struct('<HH')
+REQUEST_SIZE = _REQUEST.size
+
+MOVE_METHODS = ('unranked', 'heuristic', 'gnubg', 'neural', 'book')
+_SEARCH_METHOD = 0x80
+WIRE_BAR, WIRE_OFF = 24, 25
+_USED_DIE = 8
+
+
+def encode_move_request(game_state, difficulty, deadline_ms=None):
+    """Binary request for a JSON gameState (the format server.js produces)"""
+    board = Board.from_game_state(game_state)
+    on_roll = int(game_state.get('currentPlayer', 2))
+    owner = game_state.get('cubeOwner')
+    owner = int(owner) if owner in (1, 2, '1', '2') else 0
+    cube = int(game_state.get('cubeValue') or game_state.get('gameStakes') or 1)
+    moves_allowed = game_state.get('movesAllowed') or []
+    used = set(game_state.get('usedDice') or [])
+    if len(moves_allowed) > 4:
+        raise ValueError("at most four dice")
+    dice = 0
+    for index, die in enumerate(moves_allowed):
+        dice |= (int(die) | (_USED_DIE if index in used else 0)) << (4 * index)
+    return _REQUEST.pack(WIRE_VERSION, board.position_key(on_roll),
+                         on_roll | owner << 2 | (cube.bit_length() - 1) << 4,
+                         int(difficulty), dice, int(deadline_ms or 0))
+
+
+def decode_move_request(data):
+    """
+    (gameState, difficulty, deadline in ms or None) from a binary request.
+    The gameState has the keys the move code reads: checkers, bar, borneOff,
+    currentPlayer, movesAllowed, usedDice, cubeOwner and gameStakes.
+    Raises ValueError for a malformed request.
+    """
+    if len(data) != REQUEST_SIZE:
+        raise ValueError(f"move request must be {REQUEST_SIZE} bytes, got {len(data)}")
+    version, key, flags, difficulty, dice, deadline_ms = _REQUEST.unpack(data)
+    if version != WIRE_VERSION:
+        raise ValueError(f"unsupported move request version {version}")
+    on_roll, owner = flags & 3, flags >> 2 & 3
+    if on_roll not in (1, 2) or owner == 3:
+        raise ValueError("invalid side on roll or cube owner")
+
+    game_state = Board.from_position_key(key, on_roll).to_game_state()
+    moves_allowed, used = [], []
+    for index in range(4):
+        nibble = dice >> (4 * index) & 15
+        if not nibble:
+            break
+        if not 1 <= nibble & 7 <= 6:
+            raise ValueError(f"invalid die {nibble & 7}")
+        moves_allowed.append(nibble & 7)
+        if nibble & _USED_DIE:
+            used.append(index)
+    game_state.update({'movesAllowed': moves_allowed, 'usedDice': used, 'gameStakes': 1 << (flags >> 4)})
+    if owner:
+        game_state['cubeOwner'] = owner
+    return game_state, difficulty, deadline_ms or None
+
+
+def _wire_point(point):
+    return WIRE_BAR if point == BAR else WIRE_OFF if point == OFF else point
+
+
+def _json_point(point):
+    return BAR if point == WIRE_BAR else OFF if point == WIRE_OFF else point
+
+
+def encode_move_response(response):
+    """Binary form of a /api/cpu/move JSON response with a full play ('moves')"""
+    method = response['method']
+    if method.startswith('search-'):
+        code = _SEARCH_METHOD | int(method[len('search-'):-len('ply')])
+    else:
+        code = MOVE_METHODS.index(method)
+    steps = response['moves']
+    header = _RESPONSE_HEADER.pack(WIRE_VERSION, code, int(bool(response.get('deadline_reached'))),
+                                   int(response.get('difficulty', 0)), len(steps))
+    return header + bytes(value for step in steps
+                          for value in (_wire_point(step['from']), _wire_point(step['to']), step['die']))
+
+
+def decode_move_response(data):
+    """Inverse of encode_move_response: method, deadline_reached, difficulty and moves"""
+    version, code, flags, difficulty, count = _RESPONSE_HEADER.unpack_from(data)
+    if version != WIRE_VERSION or len(data) != _RESPONSE_HEADER.size + 3 * count:
+        raise ValueError("malformed move response")
+    body = data[_RESPONSE_HEADER.size:]
+    return {
+        'method': f"search-{code & 0x7f}ply" if code & _SEARCH_METHOD else MOVE_METHODS[code],
+        'deadline_reached': bool(flags & 1),
+        'difficulty': difficulty,
+        'moves': [{'from': _json_point(body[i]), 'to': _json_point(body[i + 1]), 'die': body[i + 2]}
+                  for i in range(0, len(body), 3)],
+    }
+
+
+def split_move_batch(data):
+    """The individual requests of a binary batch request"""
+    if not data or len(data) % REQUEST_SIZE:
+        raise ValueError(f"batch body must be a multiple of {REQUEST_SIZE} bytes, got {len(data)}")
+    return [data[offset:offset + REQUEST_SIZE] for offset in range(0, len(data), REQUEST_SIZE)]
+
+
+def encode_move_batch_response(results):
+    """Binary batch response from (response dict, status) pairs"""
+    records = []
+    for response, status in results:
+        if status == 200:
+            payload = encode_move_response(response)
+        else:
+            payload = json.dumps(response).encode()
+        records.append(_BATCH_RECORD.pack(status, len(payload)) + payload)
+    return b''.join(records)
+
+
+def decode_move_batch_response(data):
+    """(response dict, status) pairs from a binary batch response"""
+    results, offset = [], 0
+    while offset < len(data):
+        status, length = _BATCH_RECORD.unpack_from(data, offset)
+        offset += _BATCH_RECORD.size
+        payload = data[offset:offset + length]
+        offset += length
+        results.append((decode_move_response(payload) if status == 200 else json.loads(payload), status))
+    return results
@@ -0,0 +1,197 @@
+"""
+Legal move generator for the AI service
+Produces every full-turn play for a Board and a roll (doubles, bar entry and
+bear-off rules included), collapsed so each distinct resulting position
+appears once. Evaluators then only ever see unique positions.
+
+A play is a sequence of steps (from, to, die) in the frontend's point
+numbering; `from` is BAR for a checker entering from the bar and `to` is OFF
+for a checker borne off.
+"""
+
+from collections import namedtuple
+
+from board import BAR, HOME_BOARD, NUM_POINTS, OFF
+
+# steps: tuple of (from, to, die); board: resulting Board
+Play = namedtuple('Play', ['steps', 'board'])
+
+
+def remaining_dice(game_state):
+    """
+    Dice still to be played this turn, from the frontend's gameState.
+    Uses movesAllowed/usedDice when present (usedDice holds indexes into
+    movesAllowed), otherwise the raw dice with doubles played four times.
+    """
+    moves_allowed = game_state.get('movesAllowed')
+    if moves_allowed:
+        used = set(game_state.get('usedDice') or [])
+        return [int(d) for i, d in enumerate(moves_allowed) if i not in used and d]
+
+    dice = [int(d) for d in (game_state.get('dice') or []) if d]
+    if len(dice) == 2 and dice[0] == dice[1]:
+        return dice * 2
+    return dice
+
+
+def entry_point(player, die):
+    """Point a checker enters on from the bar"""
+    return die - 1 if player == 1 else NUM_POINTS - die
+
+
+def legal_steps(board, player, die):
+    """All single-checker steps for one die: list of (from, to)"""
+    own = board.points[player - 1].tolist()
+    opponent = board.points[2 - player].tolist()
+
+    # Checkers on the bar must enter before anything else moves
+    if board.bar[player - 1] > 0:
+        to = entry_point(player, die)
+        return [(BAR, to)] if opponent[to] < 2 else []
+
+    home = HOME_BOARD[player]
+    can_bear_off = sum(own[home]) == sum(own)
+
+    steps = []
+    direction = 1 if player == 1 else -1
+    for frm in range(NUM_POINTS):
+        if not own[frm]:
+            continue
+        to = frm + die * direction
+        if 0 <= to < NUM_POINTS:
+            if opponent[to] < 2:
+                steps.append((frm, to))
+        elif can_bear_off:
+            # Exact bear-off, or a larger die when no checker sits farther from home
+            exact = to == (NUM_POINTS if player == 1 else -1)
+            if player == 1:
+                farther = any(own[home.start:frm])
+            else:
+                farther = any(own[frm + 1:home.stop])
+            if exact or not farther:
+                steps.append((frm, OFF))
+    return steps
+
+
+def apply_step(board, player, frm, to):
+    """Return a new Board with one checker moved (hitting a blot if present)"""
+    new_board = board.copy()
+    new_board.apply(player, frm, to)
+    return new_board
+
+
+def _expand(board, player, dice_order):
+    """
+    Play the dice in the given order as far as possible.
+    Returns {position key: Play} for the deepest level reached, and that depth.
+    """
+    level = {board.key(): Play((), board)}
+    depth = 0
+    for die in dice_order:
+        next_level = {}
+        for play in level.values():
+            # Make/unmake on the parent board; only positions not seen yet are copied
+            board = play.board
+            for frm, to in legal_steps(board, player, die):
+                token = board.apply(player, frm, to)
+                key = board.key()
+                if key not in next_level:
+                    next_level[key] = Play(play.steps + ((frm, to, die),), board.copy())
+                board.undo(token)
+        if not next_level:
+            break
+        level = next_level
+        depth += 1
+    return level, depth
+
+
+def generate_plays(board, player, dice):
+    """
+    Every legal full-turn play for `player` with the given dice, one per
+    distinct resulting position.
+    Applies the rules that as many dice as possible must be used and, when
+    only one of two different dice can be played, the larger one must be.
+    Returns an empty list when no checker can move.
+    Resulting boards have the opponent as current_player.
+    """
+    dice = [int(d) for d in dice if d]
+    if not dice:
+        return []
+
+    if len(set(dice)) == 1:
+        orders = [dice]
+    else:
+        orders = [dice, list(reversed(dice))]
+
+    results = {}
+    best_depth = 0
+    for order in orders:
+        level, depth = _expand(board, player, order)
+        if depth > best_depth:
+            results, best_depth = {}, depth
+        if depth == best_depth and depth > 0:
+            for key, play in level.items():
+                results.setdefault(key, play)
+
+    if best_depth == 0:
+        return []
+
+    # Only one die playable out of two different ones: the larger must be used if it can be
+    if best_depth == 1 and len(dice) == 2 and dice[0] != dice[1]:
+        larger = max(dice)
+        if any(play.steps[0][2] == larger for play in results.values()):
+            results = {key: play for key, play in results.items() if play.steps[0][2] == larger}
+
+    # The turn is over once the play is made: the opponent is on roll in every resulting position
+    for play in results.values():
+        play.board.current_player = 1 if player == 2 else 2
+    return list(results.values())
+
+
+def step_to_legal_move(step, game_state=None):
+    """
+    Express a single step in the frontend's legal-move format:
+    an integer destination, "to|1|bar|dieIndex" for bar entry, or "bearoff".
+    """
+    frm, to, die = step
+    if to == OFF:
+        return 'bearoff'
+    if frm == BAR:
+        die_index = 0
+        if game_state is not None:
+            used = set(game_state.get('usedDice') or [])
+            for i, d in enumerate(game_state.get('movesAllowed') or []):
+                if i not in used and int(d) == die:
+                    die_index = i
+                    break
+        return f"{to}|1|bar|{die_index}"
+    return to
+
+
+def match_legal_move(step, legal_moves):
+    """
+    Find the entry of the client's legalMoves list that performs `step`.
+    Returns None if the client did not offer it.
+    Entries only name the destination, so several checkers can share one; the
+    client tells them apart by the step's `from` (sent alongside as 'from').
+    """
+    frm, to, die = step
+    if to == OFF:
+        if 'bearoff' in legal_moves:
+            return 'bearoff'
+        return next((m for m in legal_moves if isinstance(m, str) and m.startswith('bearoff')), None)
+    for move in legal_moves:
+        if frm == BAR:
+            if isinstance(move, str) and move.startswith(f"{to}|1|bar|"):
+                return move
+        elif isinstance(move, int) and move == to:
+            return move
+        elif isinstance(move, str) and move == str(to):
+            return move
+    return None
+
+
+def steps_to_json(steps):
+    """JSON-friendly list of steps for API responses"""
+    return [{'from': frm, 'to': to, 'die': die} for frm, to, die in steps]
+
@@ -0,0 +1,131 @@
+"""
+Neural-network position evaluator (TD-Gammon / GNU Backgammon style) in NumPy
+A single-hidden-layer feed-forward network scores a whole batch of positions
+with two matrix multiplies, so levels 7-9 get a strong evaluator without a
+gnubg subprocess.
+
+Inputs (198, Tesauro's encoding), for player 1 then player 2:
+    24 points x 4 units - n >= 1, n >= 2, n >= 3, (n - 3) / 2 if n > 3
+                          (points in the order the player moves through them)
+    bar / 2, borne off / 15
+followed by two side-to-move units (player 1, player 2).
+
+Outputs (sigmoid), from the CPU's (player 2's) point of view:
+    P(win), P(win gammon), P(win backgammon), P(lose gammon), P(lose backgammon)
+
+Weights are a NumPy .npz archive (NN_WEIGHTS_PATH, default nn_weights.npz next
+to this file) holding hidden_weights (198 x H), hidden_bias (H), output_weights
+(H x 5) and output_bias (5). train_nn.py produces one by TD self-play.
+"""
+
+import os
+
+import numpy as np
+
+from board import NUM_POINTS
+
+NUM_INPUTS = 198
+NUM_OUTPUTS = 5
+WIN, WIN_GAMMON, WIN_BACKGAMMON, LOSE_GAMMON, LOSE_BACKGAMMON = range(NUM_OUTPUTS)
+
+DEFAULT_NN_WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nn_weights.npz')
+
+WEIGHT_KEYS = ('hidden_weights', 'hidden_bias', 'output_weights', 'output_bias')
+
+
+def encode_boards(boards):
+    """N x 198 float32 input matrix for a list of Boards"""
+    count = len(boards)
+    inputs = np.zeros((count, NUM_INPUTS), dtype=np.float32)
+    if count == 0:
+        return inputs
+
+    points = np.stack([board.points for board in boards]).astype(np.float32)  # N x 2 x 24
+    # Player 2 moves from point 23 down to 0: reverse so both players' points run start to home
+    points[:, 1] = points[:, 1, ::-1]
+    units = np.stack([points >= 1, points >= 2, points >= 3, np.maximum(points - 3, 0) / 2], axis=-1)
+    per_player = 4 * NUM_POINTS + 2
+    for player in (0, 1):
+        start = player * per_player
+        inputs[:, start:start + 4 * NUM_POINTS] = units[:, player].reshape(count, -1)
+        inputs[:, start + 4 * NUM_POINTS] = [board.bar[player] / 2.0 for board in boards]
+        inputs[:, start + 4 * NUM_POINTS + 1] = [board.off[player] / 15.0 for board in boards]
+    on_roll = np.array([board.current_player for board in boards])
+    inputs[:, 2 * per_player] = on_roll == 1
+    inputs[:, 2 * per_player + 1] = on_roll == 2
+    return inputs
+
+
+def sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def cubeless_equity(probabilities):
+    """Money-game equity per unit stake from N x 5 output probabilities (-3..3)"""
+    p = probabilities
+    return (2.0 * p[:, WIN] - 1.0 + p[:, WIN_GAMMON] - p[:, LOSE_GAMMON] +
+            p[:, WIN_BACKGAMMON] - p[:, LOSE_BACKGAMMON])
+
+
+class NeuralEvaluator:
+    """Feed-forward network with one sigmoid hidden layer"""
+
+    def __init__(self, hidden_weights, hidden_bias, output_weights, output_bias, path=None):
+        self.hidden_weights = np.asarray(hidden_weights, dtype=np.float32)
+        self.hidden_bias = np.asarray(hidden_bias, dtype=np.float32)
+        self.output_weights = np.asarray(output_weights, dtype=np.float32)
+        self.output_bias = np.asarray(output_bias, dtype=np.float32)
+        self.path = path
+        hidden = self.hidden_bias.shape[0]
+        if (self.hidden_weights.shape != (NUM_INPUTS, hidden) or self.output_weights.shape != (hidden, NUM_OUTPUTS) or
+                self.output_bias.shape != (NUM_OUTPUTS,)):
+            raise ValueError(f"expected {NUM_INPUTS} x H, H, H x {NUM_OUTPUTS} and {NUM_OUTPUTS} weight arrays")
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as weights:
+            return cls(*(weights[key] for key in WEIGHT_KEYS), path=path)
+
+    @classmethod
+    def random(cls, hidden=80, seed=None):
+        """Untrained network (starting point for train_nn.py)"""
+        rng = np.random.default_rng(seed)
+        return cls(rng.normal(0.0, 0.1, (NUM_INPUTS, hidden)), np.zeros(hidden),
+                   rng.normal(0.0, 0.1, (hidden, NUM_OUTPUTS)), np.zeros(NUM_OUTPUTS))
+
+    def save(self, path):
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **{key: getattr(self, key) for key in WEIGHT_KEYS})
+        os.replace(tmp_path, path)
+
+    @property
+    def hidden_units(self):
+        return self.hidden_bias.shape[0]
+
+    def forward(self, inputs):
+        """(hidden activations, output probabilities) for an N x 198 input matrix"""
+        hidden = sigmoid(inputs @ self.hidden_weights + self.hidden_bias)
+        return hidden, sigmoid(hidden @ self.output_weights + self.output_bias)
+
+    def probabilities(self, boards):
+        """N x 5 output probabilities for a list of Boards (CPU's point of view)"""
+        return self.forward(encode_boards(boards))[1]
+
+    def equities(self, boards):
+        """Cubeless equities for a list of Boards, clipped to -1 (CPU losing) .. 1 (CPU winning)"""
+        return np.clip(cubeless_equity(self.probabilities(boards)), -1.0, 1.0)
+
+
+def load_nn_evaluator(path=None):
+    """Load the network weights (NN_WEIGHTS_PATH or nn_weights.npz next to this file); None if missing"""
+    path = path or os.environ.get('NN_WEIGHTS_PATH') or DEFAULT_NN_WEIGHTS_PATH
+    if not os.path.exists(path):
+        print(f"ℹ Neural network weights not found at {path} - run train_nn.py to enable the neural evaluator")
+        return None
+    try:
+        evaluator = NeuralEvaluator.load(path)
+    except Exception as e:
+        print(f"✗ Could not load neural network weights {path}: {e}")
+        return None
+    print(f"✓ Neural network evaluator loaded ({path}, {evaluator.hidden_units} hidden units)")
+    return evaluator
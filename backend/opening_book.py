@@ -0,0 +1,194 @@
+"""
+Opening book for the first turns of a game
+Book moves are looked up in O(1) by canonical position + dice, before any
+evaluation runs. The position key is taken from the point of view of the side
+to move, so one entry serves either colour.
+
+The book is a text file (OPENING_BOOK_PATH, default opening_book.txt next to
+this file) with one book move per line:
+
+    <earlier turns> > <dice> <play>
+
+Turns are written "<dice> <play>" from the moving side's point of view in
+standard notation (points 1-24 counted from the mover's home board, bar, off,
+"(2)" for a repeated move, "-" when nothing can be played) and separated by
+" ; ". Lines without earlier turns are played from the starting position, and
+the earlier turns alternate sides. The position a line applies to is rebuilt
+by replaying its turns when the book is loaded; build_opening_book.py writes
+the file and checks every play against the move generator.
+"""
+
+import os
+import re
+
+from board import BAR, NUM_POINTS, OFF, starting_board
+
+DEFAULT_OPENING_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.txt')
+
+_MOVE_PATTERN = re.compile(r'^(bar|\d+)/(off|\d+)\*?(?:\((\d)\))?$')
+
+
+def parse_play(text):
+    """'13/7(2) 8/7*' -> [(13, 7), (13, 7), (8, 7)]; bar is 25 and off is 0"""
+    moves = []
+    if text.strip() == '-':
+        return moves
+    for token in text.split():
+        match = _MOVE_PATTERN.match(token)
+        if not match:
+            raise ValueError(f"bad move {token!r}")
+        frm = 25 if match.group(1) == 'bar' else int(match.group(1))
+        to = 0 if match.group(2) == 'off' else int(match.group(2))
+        moves.extend([(frm, to)] * int(match.group(3) or 1))
+    return moves
+
+
+def notation_point(player, point):
+    """Frontend point (or BAR / OFF) -> the mover's 1-24 numbering (bar 25, off 0)"""
+    if point == BAR:
+        return 25
+    if point == OFF:
+        return 0
+    return point + 1 if player == 2 else NUM_POINTS - point
+
+
+def board_point(player, number):
+    """The mover's 1-24 numbering (bar 25, off 0) -> frontend point, BAR or OFF"""
+    if number == 25:
+        return BAR
+    if number == 0:
+        return OFF
+    return number - 1 if player == 2 else NUM_POINTS - number
+
+
+def format_play(player, steps, board=None):
+    """
+    Standard notation for a movegen play's steps, e.g. '13/7(2)' or '8/4 6/4(2)'
+    Steps of one checker are joined and repeated moves written once with a count,
+    highest starting point first. With `board` (the position before the play) hits are
+    marked with '*', and a checker that hits on its way is not joined past the hit.
+    """
+    if not steps:
+        return '-'
+    hits = set()
+    if board is not None:
+        board = board.copy()
+        for index, (frm, to, _) in enumerate(steps):
+            if to != OFF and board.points[2 - player][to] == 1:
+                hits.add(index)
+            board.apply(player, frm, to)
+    moves = [[notation_point(player, frm), notation_point(player, to), index in hits]
+             for index, (frm, to, _) in enumerate(steps)]
+    joined = True
+    while joined:
+        joined = False
+        for first in moves:
+            second = next((move for move in moves if move is not first and move[0] == first[1]), None)
+            if second is not None and not first[2]:
+                first[1:] = second[1:]
+                moves.remove(second)
+                joined = True
+                break
+    counts = {}
+    for move in moves:
+        counts[tuple(move)] = counts.get(tuple(move), 0) + 1
+    return ' '.join(f"{'bar' if frm == 25 else frm}/{'off' if to == 0 else to}{'*' if hit else ''}"
+                    f"{f'({count})' if count > 1 else ''}"
+                    for (frm, to, hit), count in sorted(counts.items(), key=lambda item: (-item[0][0], item[0][1])))
+
+
+def apply_play(board, player, moves):
+    """Copy of `board` after `player` makes `moves` (from parse_play); hits are applied, legality is not checked"""
+    board = board.copy()
+    for frm, to in moves:
+        board.apply(player, board_point(player, frm), board_point(player, to))
+    board.current_player = 1 if player == 2 else 2
+    return board
+
+
+def position_key(board, player):
+    """
+    Canonical key of a position with `player` to move: the gnubg position key,
+    which is relative to the side on roll, so mirrored positions share a key
+    """
+    return board.position_key(player)
+
+
+def dice_key(dice):
+    """'61' for any order of a 6 and a 1; doubles may be given two or four times"""
+    high, low = max(dice[0], dice[-1]), min(dice[0], dice[-1])
+    return f"{high}{low}"
+
+
+def parse_turn(text):
+    """'31 8/5 6/5' -> ('31', [(8, 5), (6, 5)])"""
+    dice, _, play = text.strip().partition(' ')
+    if not re.fullmatch(r'[1-6]{2}', dice):
+        raise ValueError(f"bad dice {dice!r}")
+    return dice_key((int(dice[0]), int(dice[1]))), parse_play(play)
+
+
+class OpeningBook:
+    """Mapping of (position key, dice) to the book play for the side to move"""
+
+    def __init__(self):
+        self.entries = {}
+
+    def add(self, board, player, dice, moves):
+        self.entries[(position_key(board, player), dice_key(dice))] = moves
+
+    def lookup(self, board, player, dice):
+        """The Board after the book play for `player` rolling `dice`, or None if the book has no entry"""
+        moves = self.entries.get((position_key(board, player), dice_key(dice)))
+        if moves is None:
+            return None
+        return apply_play(board, player, moves)
+
+    def __len__(self):
+        return len(self.entries)
+
+    @classmethod
+    def load(cls, path):
+        book = cls()
+        positions = {'': starting_board(2)}  # Earlier turns -> position (side to move alternates)
+        with open(path) as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.split('#', 1)[0].strip()
+                if not line:
+                    continue
+                history, _, entry = line.rpartition('>')
+                turns = [turn.strip() for turn in history.split(';') if turn.strip()]
+                try:
+                    board = book._replay(positions, turns)
+                    dice, moves = parse_turn(entry)
+                except (ValueError, KeyError) as e:
+                    raise ValueError(f"{path}:{line_number}: {e}")
+                player = 2 if len(turns) % 2 == 0 else 1
+                book.entries[(position_key(board, player), dice)] = moves
+        return book
+
+    @staticmethod
+    def _replay(positions, turns):
+        # Positions reached by each prefix of turns are kept, so shared histories are replayed once
+        for count in range(1, len(turns) + 1):
+            prefix = ' ; '.join(turns[:count])
+            if prefix not in positions:
+                player = 2 if count % 2 == 1 else 1
+                positions[prefix] = apply_play(positions[' ; '.join(turns[:count - 1])], player,
+                                               parse_turn(turns[count - 1])[1])
+        return positions[' ; '.join(turns)]
+
+
+def load_opening_book(path=None):
+    """Load the opening book (OPENING_BOOK_PATH or opening_book.txt next to this file); None if missing"""
+    path = path or os.environ.get('OPENING_BOOK_PATH') or DEFAULT_OPENING_BOOK_PATH
+    if not os.path.exists(path):
+        print(f"ℹ Opening book not found at {path}")
+        return None
+    try:
+        book = OpeningBook.load(path)
+    except Exception as e:
+        print(f"✗ Could not load opening book {path}: {e}")
+        return None
+    print(f"✓ Opening book loaded ({len(book)} positions)")
+    return book
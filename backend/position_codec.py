@@ -0,0 +1,215 @@
+"""
+Compact position and match identifiers shared by the service and gnubg_eval.py
+Plain Python (no NumPy) so that it also imports inside GNU Backgammon's embedded
+interpreter.
+
+Position key / Position ID (GNU Backgammon's format): for the side not on roll
+and then the side on roll, each of its points from its own ace point up to its
+24 point and then its bar contributes one 1-bit per checker followed by a
+0-bit. The 80 bits are packed little-endian into the 10-byte key, and the key
+in base64 without padding is the 14-character Position ID ("4HPwATDgc/ABMA" for
+the starting position). Checkers borne off are implied (15 minus the rest), and
+the side on roll is not part of the key, so decoding needs it.
+
+Match ID: cube, side on roll, Crawford flag, game state, dice, match length and
+score packed into 66 bits, 12 characters of base64.
+
+Players are numbered as in the frontend (1 and 2; gnubg's players 0 and 1).
+Points are the frontend's 0-23 (player 2 bears off below point 0, player 1
+above point 23); `points` is [player 1 counts, player 2 counts] and `bar` /
+`off` are [player 1, player 2].
+
+The round trips are tested in test_position_codec.py.
+"""
+
+import base64
+
+NUM_POINTS = 24
+CHECKERS_PER_PLAYER = 15
+POSITION_KEY_SIZE = 10
+POSITION_ID_LENGTH = 14
+MATCH_ID_LENGTH = 12
+
+# Match ID game states
+GAME_NONE, GAME_PLAYING, GAME_OVER, GAME_RESIGNED, GAME_DROPPED = range(5)
+
+# Match ID fields: (name, first bit, width)
+MATCH_ID_FIELDS = (
+    ('cube_log2', 0, 4),
+    ('cube_owner', 4, 2),       # gnubg player 0 / 1, 3 = centered
+    ('on_roll', 6, 1),
+    ('crawford', 7, 1),
+    ('game_state', 8, 3),
+    ('turn', 11, 1),            # side to make the next decision (differs from on_roll after a double)
+    ('double_offered', 12, 1),
+    ('resigned', 13, 2),        # 1 single, 2 gammon, 3 backgammon
+    ('die1', 15, 3),
+    ('die2', 18, 3),
+    ('match_length', 21, 15),   # 0 for money play
+    ('score1', 36, 15),
+    ('score2', 51, 15),
+)
+
+# A point with n checkers as bits: n ones then a zero (written most significant bit last)
+_UNARY = ['1' * count + '0' for count in range(CHECKERS_PER_PLAYER + 1)]
+
+
+def _b64encode(data, length):
+    return base64.b64encode(data).decode('ascii')[:length]
+
+
+def _b64decode(text, size, what):
+    try:
+        data = base64.b64decode(text + '=' * (-len(text) % 4), validate=True)
+    except ValueError:
+        raise ValueError(f"invalid {what} {text!r}")
+    if len(data) != size:
+        raise ValueError(f"invalid {what} {text!r}")
+    return data
+
+
+def counts_from_game_state(game_state):
+    """(points, bar, off, current player) from the frontend's gameState dict"""
+    points = [[0] * NUM_POINTS, [0] * NUM_POINTS]
+    for checker in game_state.get('checkers', []):
+        if isinstance(checker, dict):
+            point, player = checker.get('point', -1), checker.get('player', 0)
+        else:
+            point, player = getattr(checker, 'point', -1), getattr(checker, 'player', 0)
+        try:
+            point, player = int(point), int(player)
+        except (ValueError, TypeError):
+            continue
+        # Bar checkers are counted from the bar lists; borne-off ones from borneOff
+        if 0 <= point < NUM_POINTS and player in (1, 2):
+            points[player - 1][point] += 1
+
+    bar_lists = game_state.get('bar') or {}
+    borne_off = game_state.get('borneOff') or {}
+    bar = [len(bar_lists.get(str(player), bar_lists.get(player)) or []) for player in (1, 2)]
+    off = [int(borne_off.get(str(player), borne_off.get(player)) or 0) for player in (1, 2)]
+    return points, bar, off, int(game_state.get('currentPlayer', 2))
+
+
+def _runs(points, bar, player):
+    # The player's points from its ace point to its 24 point, then its bar
+    own = points[player - 1]
+    return (list(own) if player == 2 else list(own)[::-1]) + [bar[player - 1]]
+
+
+def position_key(points, bar, on_roll):
+    """10-byte key of a position (see module docstring); `on_roll` is 1 or 2"""
+    opponent = 1 if on_roll == 2 else 2
+    try:
+        bits = ''.join([_UNARY[count] for count in _runs(points, bar, opponent) + _runs(points, bar, on_roll)])
+    except (IndexError, TypeError):
+        raise ValueError("point counts must be 0-15")
+    if len(bits) > 8 * POSITION_KEY_SIZE:
+        raise ValueError("more than 15 checkers per side")
+    return int(bits[::-1], 2).to_bytes(POSITION_KEY_SIZE, 'little')
+
+
+def decode_position_key(key, on_roll):
+    """(points, bar, off) from a 10-byte key, with `on_roll` (1 or 2) the side on roll"""
+    if len(key) != POSITION_KEY_SIZE:
+        raise ValueError(f"position key must be {POSITION_KEY_SIZE} bytes")
+    value = int.from_bytes(key, 'little')
+    runs, count = [], 0
+    for bit in range(8 * POSITION_KEY_SIZE):
+        if value >> bit & 1:
+            count += 1
+        else:
+            runs.append(count)
+            count = 0
+            if len(runs) == 2 * (NUM_POINTS + 1):
+                break
+    if len(runs) < 2 * (NUM_POINTS + 1) or value >> (bit + 1):
+        raise ValueError("malformed position key")
+
+    opponent = 1 if on_roll == 2 else 2
+    points, bar, off = [None, None], [0, 0], [0, 0]
+    for player, player_runs in ((opponent, runs[:NUM_POINTS + 1]), (on_roll, runs[NUM_POINTS + 1:])):
+        checkers = sum(player_runs)
+        if checkers > CHECKERS_PER_PLAYER:
+            raise ValueError("more than 15 checkers per side")
+        own = player_runs[:NUM_POINTS]
+        points[player - 1] = own if player == 2 else own[::-1]
+        bar[player - 1] = player_runs[NUM_POINTS]
+        off[player - 1] = CHECKERS_PER_PLAYER - checkers
+    return points, bar, off
+
+
+def position_id(points, bar, on_roll):
+    """14-character GNU Backgammon Position ID"""
+    return _b64encode(position_key(points, bar, on_roll), POSITION_ID_LENGTH)
+
+
+def decode_position_id(text, on_roll):
+    """(points, bar, off) from a Position ID, with `on_roll` (1 or 2) the side on roll"""
+    if len(text) != POSITION_ID_LENGTH:
+        raise ValueError(f"invalid position ID {text!r}")
+    return decode_position_key(_b64decode(text, POSITION_KEY_SIZE, 'position ID'), on_roll)
+
+
+def match_id(on_roll, dice=None, cube_value=1, cube_owner=None, match_length=0, score=(0, 0),
+             crawford=False, game_state=GAME_PLAYING, turn=None, double_offered=False, resigned=0):
+    """
+    12-character GNU Backgammon Match ID. `cube_owner` is 1, 2 or None (centered),
+    `dice` the two dice (or None before the roll), `score` (player 1, player 2).
+    """
+    cube_log2 = max(int(cube_value), 1).bit_length() - 1
+    if 1 << cube_log2 != int(cube_value) or cube_log2 > 15:
+        raise ValueError(f"invalid cube value {cube_value}")
+    dice = tuple(dice or (0, 0))
+    fields = {
+        'cube_log2': cube_log2,
+        'cube_owner': 3 if cube_owner not in (1, 2) else cube_owner - 1,
+        'on_roll': on_roll - 1,
+        'crawford': int(bool(crawford)),
+        'game_state': game_state,
+        'turn': (turn or on_roll) - 1,
+        'double_offered': int(bool(double_offered)),
+        'resigned': resigned,
+        'die1': dice[0],
+        'die2': dice[1],
+        'match_length': match_length,
+        'score1': score[0],
+        'score2': score[1],
+    }
+    value = 0
+    for name, first, width in MATCH_ID_FIELDS:
+        field = int(fields[name])
+        if not 0 <= field < 1 << width:
+            raise ValueError(f"match ID field {name} out of range: {field}")
+        value |= field << first
+    return _b64encode(value.to_bytes(9, 'little'), MATCH_ID_LENGTH)
+
+
+def decode_match_id(text):
+    """The keyword arguments of match_id() that produce `text`"""
+    if len(text) != MATCH_ID_LENGTH:
+        raise ValueError(f"invalid match ID {text!r}")
+    value = int.from_bytes(_b64decode(text, 9, 'match ID'), 'little')
+    fields = {name: value >> first & ((1 << width) - 1) for name, first, width in MATCH_ID_FIELDS}
+    dice = (fields['die1'], fields['die2'])
+    return {
+        'on_roll': fields['on_roll'] + 1,
+        'dice': dice if all(dice) else None,
+        'cube_value': 1 << fields['cube_log2'],
+        'cube_owner': None if fields['cube_owner'] == 3 else fields['cube_owner'] + 1,
+        'match_length': fields['match_length'],
+        'score': (fields['score1'], fields['score2']),
+        'crawford': bool(fields['crawford']),
+        'game_state': fields['game_state'],
+        'turn': fields['turn'] + 1,
+        'double_offered': bool(fields['double_offered']),
+        'resigned': fields['resigned'],
+    }
+
+
+def set_board_commands(points, bar, on_roll):
+    """
+    gnubg commands that set up a position. The turn is set first, because
+    `set board` reads the Position ID relative to the side on roll.
+    """
+    return [f"set turn {on_roll - 1}", f"set board {position_id(points, bar, on_roll)}"]
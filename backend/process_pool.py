@@ -0,0 +1,192 @@
+"""
+Optional process pool for CPU-bound move search
+Expectiminimax search is Python code that holds the GIL, so concurrent move
+requests inside one gunicorn worker take turns on a single core. With
+SEARCH_PROCESS_POOL_SIZE > 0 whole search jobs are shipped to worker processes
+instead: the root position travels as Board.to_bytes() (11 bytes) with the dice,
+and the ranking comes back as packed index and score arrays, so search
+throughput grows with the number of cores.
+
+Worker processes are spawned (forking a threaded Flask worker is unsafe) lazily
+on first use, once per gunicorn worker; until they have started, searches keep
+running in-process. Each worker process keeps its own evaluation cache.
+
+Configured with:
+    SEARCH_PROCESS_POOL_SIZE  - worker processes per service worker (default: 0, disabled)
+"""
+
+import importlib
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+import numpy as np
+
+from board import Board
+from movegen import generate_plays
+from search import ExpectiminimaxSearch, SearchStats, SearchTimeout
+
+# Worker processes stop searching this long before the request deadline so the result arrives in time
+RESULT_MARGIN = 0.05
+# How often a request thread waiting for a job checks its cancel token (seconds)
+CANCEL_POLL_INTERVAL = 0.05
+
+# Module providing the static evaluators inside a worker process (set by _init_worker)
+_evaluators = None
+
+
+def _init_worker(module_name):
+    global _evaluators
+    _evaluators = importlib.import_module(module_name)
+
+
+def _warm_up():
+    return os.getpid()
+
+
+def search_job(position, dice, evaluator, max_depth, deadline, top_k, root_top_k):
+    """
+    Runs in a worker process: deepen from 2 plies up to `max_depth` until `deadline`,
+    scoring leaves with the evaluator function named `evaluator`.
+    Plays are regenerated from the position, in the same order as the caller's
+    generate_plays(). Returns (depth reached, play indices as uint16 bytes,
+    scores as float32 bytes, SearchStats dict, compute seconds); depth 0 if no
+    pass finished.
+    """
+    start_time = time.time()
+    board = Board.from_bytes(position)
+    plays = generate_plays(board, board.current_player, dice)
+    index = {id(play): i for i, play in enumerate(plays)}
+    stats = SearchStats()
+    search = ExpectiminimaxSearch(getattr(_evaluators, evaluator), top_k=top_k, root_top_k=root_top_k,
+                                  stats=stats, deadline=deadline)
+
+    ranked = None
+    for depth in range(2, max_depth + 1):
+        try:
+            ranked = search.rank(plays, board.current_player, depth)
+        except SearchTimeout:
+            break
+    if ranked is None:
+        return 0, b'', b'', stats.as_dict(), time.time() - start_time
+
+    order = np.array([index[id(play)] for play, _ in ranked], dtype='<u2')
+    scores = np.array([score for _, score in ranked], dtype='<f4')
+    return stats.depth, order.tobytes(), scores.tobytes(), stats.as_dict(), time.time() - start_time
+
+
+class SearchProcessPool:
+    """
+    Pool of spawned processes running search_job, with latency and serialization counters.
+    The workers import `module_name` and look the static evaluators up in it by name.
+    """
+
+    def __init__(self, size, module_name):
+        self.size = size
+        self.module_name = module_name
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._executor = None
+        self._warm_ups = []
+        self._tasks = 0
+        self._failed = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+        self._total_compute = 0.0
+        self._total_serialize = 0.0
+        self._total_bytes = 0
+
+    def _start(self):
+        # Called with the lock held
+        if self._pid != os.getpid():
+            self._reset()
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.size,
+                                                 mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=_init_worker, initargs=(self.module_name,))
+            self._warm_ups = [self._executor.submit(_warm_up) for _ in range(self.size)]
+            print(f"ℹ Starting {self.size} search worker processes")
+
+    def ready(self):
+        """True once the worker processes are up (starts them on first call)"""
+        with self._lock:
+            self._start()
+            return all(future.done() and not future.exception() for future in self._warm_ups)
+
+    def search(self, board, dice, evaluator, max_depth, deadline, top_k, root_top_k, cancel=None):
+        """
+        Rank the plays of `board` (side to move = board.current_player) in a worker process,
+        using the evaluator function named `evaluator` (e.g. 'evaluate_positions_simple').
+        Returns (ranking as [(play index, score), ...] best first, depth reached, SearchStats dict),
+        or None if no pass finished before the deadline or the job failed.
+        """
+        start_time = time.time()
+        args = (board.to_bytes(), tuple(int(d) for d in dice), evaluator, max_depth, deadline - RESULT_MARGIN,
+                top_k, root_top_k)
+        payload_bytes = len(pickle.dumps(args))
+        serialize_time = time.time() - start_time
+
+        with self._lock:
+            self._start()
+            future = self._executor.submit(search_job, *args)
+        try:
+            while True:
+                try:
+                    depth, order, scores, stats, compute_time = future.result(timeout=CANCEL_POLL_INTERVAL)
+                    break
+                except TimeoutError:
+                    if cancel is not None and cancel.cancelled:
+                        # A running job stops by itself at its deadline
+                        future.cancel()
+                        return None
+        except Exception as e:
+            print(f"✗ Search worker process failed: {e}")
+            with self._lock:
+                self._failed += 1
+            return None
+
+        decode_start = time.time()
+        ranking = list(zip(np.frombuffer(order, dtype='<u2').tolist(), np.frombuffer(scores, dtype='<f4').tolist()))
+        end_time = time.time()
+        payload_bytes += len(order) + len(scores)
+        serialize_time += end_time - decode_start
+
+        with self._lock:
+            latency = end_time - start_time
+            self._tasks += 1
+            self._total_latency += latency
+            self._max_latency = max(self._max_latency, latency)
+            self._total_compute += compute_time
+            self._total_serialize += serialize_time
+            self._total_bytes += payload_bytes
+        if not depth:
+            return None
+        return ranking, depth, stats
+
+    def stats(self):
+        """Pool size, task latency and serialization cost (exposed on /api/health)"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            tasks = self._tasks
+
+            def average_ms(total):
+                return round(total / tasks * 1000, 2) if tasks else 0.0
+
+            return {
+                'size': self.size,
+                'started': self._executor is not None,
+                'tasks': tasks,
+                'failed': self._failed,
+                'avg_latency_ms': average_ms(self._total_latency),
+                'max_latency_ms': round(self._max_latency * 1000, 2),
+                'avg_compute_ms': average_ms(self._total_compute),
+                'avg_serialize_ms': average_ms(self._total_serialize),
+                'avg_payload_bytes': round(self._total_bytes / tasks) if tasks else 0,
+            }
@@ -0,0 +1,175 @@
+"""
+On-demand request profiling with collapsed-stack output
+A request is profiled when it carries the X-Profile header (unless turned off
+with PROFILE_HEADER_ENABLED=0) or is picked by PROFILE_SAMPLE_RATE. While it
+runs, a sampler thread records the wall-clock stack of every thread working for
+it (the request thread, and MoveExecutor threads running its computations)
+every PROFILE_INTERVAL_MS. Time blocked on GNU Backgammon replies, locks or the
+executors therefore shows up as well as CPU time. Processes of the search
+process pool are not sampled.
+
+Profiles are kept in memory (the last PROFILE_MAX_STORED per service worker)
+and read back in the collapsed-stack format of flamegraph.pl and speedscope:
+one "frame;frame;...;frame count" line per distinct stack, root first.
+
+When no request is being profiled, the cost is a header lookup per request and
+a context-variable lookup per executor computation.
+"""
+
+import collections
+import contextvars
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_HEADER_ENABLED = os.environ.get('PROFILE_HEADER_ENABLED', '1') != '0'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL_MS', 2)) / 1000
+PROFILE_MAX_STORED = int(os.environ.get('PROFILE_MAX_STORED', 20))
+
+# Profile of the request being served (copied into executor threads with the context)
+_active = contextvars.ContextVar('active_profile', default=None)
+_ids = itertools.count(1)
+_recent = collections.deque(maxlen=max(1, PROFILE_MAX_STORED))
+_recent_lock = threading.Lock()
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profile:
+    """Stack samples of the threads working for one request"""
+
+    def __init__(self, label):
+        self.id = f"{os.getpid()}-{next(_ids)}"
+        self.label = label
+        self.started = time.time()
+        self.duration = None
+        self.status = None
+        self.samples = 0
+        self.stacks = collections.Counter()
+        self._threads = {}  # thread ident -> [root frame name, nesting depth]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._token = None
+        self._sampler = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def add_thread(self, root):
+        ident = threading.get_ident()
+        with self._lock:
+            entry = self._threads.setdefault(ident, [root, 0])
+            entry[1] += 1
+
+    def remove_thread(self):
+        ident = threading.get_ident()
+        with self._lock:
+            entry = self._threads.get(ident)
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._threads[ident]
+
+    def _run(self):
+        while not self._stop.wait(PROFILE_INTERVAL):
+            self.sample()
+
+    def sample(self):
+        """Record the current stack of every thread working for the request"""
+        with self._lock:
+            threads = [(ident, entry[0]) for ident, entry in self._threads.items()]
+        frames = sys._current_frames()
+        for ident, root in threads:
+            frame = frames.get(ident)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                stack.append(root)
+                self.stacks[';'.join(reversed(stack))] += 1
+        self.samples += 1
+
+    def collapsed(self):
+        """The samples in collapsed-stack format, most frequent stack first"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, top=5):
+        """Listing entry: what was profiled, for how long, and the frames with the most self time"""
+        leaves = collections.Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return {
+            'id': self.id,
+            'request': self.label,
+            'status': self.status,
+            'started': self.started,
+            'durationMs': round(self.duration * 1000, 1) if self.duration is not None else None,
+            'samples': self.samples,
+            'intervalMs': PROFILE_INTERVAL * 1000,
+            'top': [{'frame': frame, 'samples': count} for frame, count in leaves.most_common(top)],
+        }
+
+
+def requested(header_value):
+    """True if a request with this X-Profile header value (or None) should be profiled"""
+    if header_value and PROFILE_HEADER_ENABLED and header_value not in ('0', 'false'):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def start(label):
+    """Start profiling the current request; returns the Profile to pass to finish()"""
+    profile = Profile(label)
+    profile._token = _active.set(profile)
+    profile.add_thread('request')
+    profile._sampler.start()
+    return profile
+
+
+def finish(profile, status=None):
+    """Stop sampling and keep the profile among the recent ones"""
+    if profile.duration is not None:
+        return
+    profile.duration = time.time() - profile.started
+    profile.status = status
+    profile._stop.set()
+    profile._sampler.join()
+    profile.remove_thread()
+    try:
+        _active.reset(profile._token)
+    except ValueError:
+        # Finished from a different context than it was started in
+        pass
+    with _recent_lock:
+        _recent.append(profile)
+
+
+@contextmanager
+def thread_scope(root):
+    """Sample the current thread too while it works for the profiled request (if any)"""
+    profile = _active.get()
+    if profile is None:
+        yield
+        return
+    profile.add_thread(root)
+    try:
+        yield
+    finally:
+        profile.remove_thread()
+
+
+def recent():
+    """Stored profiles, newest first"""
+    with _recent_lock:
+        return list(reversed(_recent))
+
+
+def get(profile_id):
+    with _recent_lock:
+        return next((profile for profile in _recent if profile.id == profile_id), None)
@@ -3,7 +3,7 @@ GNU Backgammon AI Service for Backgammon Arena
 Provides CPU move calculation with difficulty levels (1-10)
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 import json
 import random
@@ -12,21 +12,86 @@ import subprocess
 import os
 import shutil
 import ctypes
-import threading
 import time
 import re
+import numpy as np
+from bearoff import (CUBE_CENTERED, CUBE_OPPONENT, CUBE_OWNED, is_bearoff_position, is_two_sided_position,
+                     load_bearoff2_db, load_bearoff_db)
+from board import Board, HOME_BOARD, NUM_POINTS, OFF, PIP_DISTANCE, stack_boards, starting_board
+from cube import cube_action, cube_decision, match_model, money_model, outcome_rates
+from eval_cache import EvalCache, eval_cache_key
+from game_analysis import replay_game
+from gnubg_pool import GnubgCancelled, GnubgPool, GnubgTimeout
+from match_equity import load_met
+import metrics
+from move_executor import InlineExecutor, MoveExecutor
+from movegen import (generate_plays, match_legal_move, remaining_dice,
+                     step_to_legal_move, steps_to_json)
+from nn_eval import LOSE_BACKGAMMON, LOSE_GAMMON, WIN, WIN_BACKGAMMON, WIN_GAMMON, load_nn_evaluator
+from move_wire import (MOVE_MEDIA_TYPE, decode_move_request, encode_move_batch_response, encode_move_response,
+                       split_move_batch)
+from opening_book import format_play, load_opening_book
+from position_codec import counts_from_game_state, set_board_commands
+import profiling
+from process_pool import SearchProcessPool
+from search import ExpectiminimaxSearch, SearchStats, SearchTimeout
 
 app = Flask(__name__)
 CORS(app)
 
+# In-process LRU cache of equities (in front of both the heuristic and GNU Backgammon)
+EVAL_CACHE = EvalCache()
+# Eval-context part of the cache key for default (2-ply cubeful) GNU Backgammon evaluations
+GNUBG_CACHE_CONTEXT = 'gnubg:2ply:1'
+
+# Expectiminimax lookahead (see search.py): maximum plies, and plays searched per node / at the root.
+# 3 plies routinely use the whole move deadline, and the frontend asks once per checker step.
+SEARCH_MAX_DEPTH = int(os.environ.get('SEARCH_MAX_DEPTH', 2))
+SEARCH_TOP_K = int(os.environ.get('SEARCH_TOP_K', 3))
+SEARCH_ROOT_TOP_K = int(os.environ.get('SEARCH_ROOT_TOP_K', 5))
+# Optional worker processes that run whole searches outside this process's GIL (0 = search in-process)
+SEARCH_PROCESS_POOL_SIZE = int(os.environ.get('SEARCH_PROCESS_POOL_SIZE', 0))
+SEARCH_PROCESS_POOL = SearchProcessPool(SEARCH_PROCESS_POOL_SIZE, __name__) if SEARCH_PROCESS_POOL_SIZE > 0 else None
+
+# Move selection time budget per request (seconds); a request can override it with 'deadlineMs'
+CPU_MOVE_DEADLINE = float(os.environ.get('CPU_MOVE_DEADLINE', 5.0))
+# Fixed-size thread pool shared by all move computations (cancelled when their request gives up)
+MOVE_EXECUTOR = MoveExecutor()
+# Games per /api/cpu/move/batch request, and the threads that wait on their computations
+MOVE_BATCH_MAX_ITEMS = int(os.environ.get('MOVE_BATCH_MAX_ITEMS', 64))
+MOVE_BATCH_EXECUTOR = MoveExecutor(int(os.environ.get('MOVE_BATCH_WORKERS', 16)))
+# Whole-game analysis: threads evaluating one game's turns side by side (kept apart from
+# MOVE_EXECUTOR so a review never delays live CPU moves), and the time budget per game
+GAME_ANALYSIS_EXECUTOR = MoveExecutor(int(os.environ.get('GAME_ANALYSIS_WORKERS', 4)))
+GAME_ANALYSIS_DEADLINE = float(os.environ.get('GAME_ANALYSIS_DEADLINE', 60.0))
+# Plays per turn that GNU Backgammon re-scores in an analysis, besides the one played
+ANALYSIS_GNUBG_CANDIDATES = 5
+
+# One-sided bear-off database (memory-mapped, shared by all gunicorn workers through the page cache)
+BEAROFF_DB = load_bearoff_db()
+# Two-sided bear-off database (exact cubeful equities when both sides have 6 or fewer checkers left)
+BEAROFF2_DB = load_bearoff2_db()
+
+# Neural-network evaluator for levels 7-9 when GNU Backgammon is not installed (NN_WEIGHTS_PATH)
+NN_EVALUATOR = load_nn_evaluator()
+
+# Match equity table for cube decisions in match play (MET_PATH)
+MATCH_EQUITY_TABLE = load_met()
+# Share of wins that are gammons when cube decisions only have the heuristic's equity to go on
+HEURISTIC_GAMMON_RATE = 0.2
+
 # GNU Backgammon integration
 # Check if gnubg is available in PATH
 GNUBG_AVAILABLE = False
 GNUBG_PATH = None
 
-# Persistent GNU Backgammon process for faster move recommendations
-GNUBG_PROCESS = None
-GNUBG_LOCK = threading.Lock()  # Lock to ensure only one thread interacts with GNUBG at a time
+# Pool of persistent GNU Backgammon processes for evaluations and move recommendations
+# (created below once GNUBG_PATH is known; processes are started lazily per gunicorn worker)
+GNUBG_POOL = None
+
+# Per-command deadlines (seconds) for the 'hint' exchange; a worker that misses one is replaced
+GNUBG_SETUP_TIMEOUT = float(os.environ.get('GNUBG_SETUP_TIMEOUT', 0.5))
+GNUBG_HINT_TIMEOUT = float(os.environ.get('GNUBG_HINT_TIMEOUT', 4.0))
 
 # Try to find gnubg executable
 if shutil.which('gnubg'):
@@ -66,6 +131,13 @@ if GNUBG_AVAILABLE:
     print("    - Trapped pieces detection (12-22% weight)")
     print("    - Exposed blots analysis (10% weight)")
     print("    - 100% won position detection")
+    GNUBG_POOL = GnubgPool(GNUBG_PATH)
+    if GNUBG_POOL.check():
+        print(f"  Worker pool: up to {GNUBG_POOL.size} persistent gnubg process(es) per service worker")
+    else:
+        print(f"✗ GNU Backgammon at {GNUBG_PATH} could not be driven over its prompt - using fallback AI")
+        GNUBG_AVAILABLE = False
+        GNUBG_POOL = None
 else:
     print("ℹ GNU Backgammon not found - using fallback AI")
     print("  To enable GNU Backgammon:")
@@ -74,143 +146,41 @@ else:
     print("    - Or: brew install gnubg (Mac)")
 
 
-def calculate_pip_count(checkers, bar, borne_off, player):
+def calculate_pip_count(board, player):
     """
     Calculate pip count (total distance all pieces need to travel to bear off)
+    Pieces on the bar count 25 pips each, pieces borne off count 0.
+    Maintained incrementally by the Board as checkers move (see board.BoardFeatures).
     """
-    pips = 0
-    
-    # Add pips for pieces on the board
-    for checker in checkers:
-        if checker.get('player') == player:
-            point = checker.get('point', 0)
-            if point >= 0 and point <= 23:  # On board
-                if player == 1:
-                    pips += 24 - point  # Distance from point to bear off
-                else:  # player == 2
-                    pips += point + 1  # Distance from point to bear off
-    
-    # Add pips for pieces on bar (25 pips each)
-    pips += len(bar.get(str(player), [])) * 25
-    
-    # Subtract pips for pieces already borne off (they count as 0)
-    # Already handled since borne off pieces aren't in checkers
-    
-    return pips
+    return board.pip_count(player)
 
 
-def is_point_blocked(checkers, point, blocking_player):
+def is_point_blocked(board, point, blocking_player):
     """
     Check if a point is blocked by the blocking player (2+ pieces)
     """
-    count = sum(1 for c in checkers if c.get('point') == point and c.get('player') == blocking_player)
-    return count >= 2
+    return board.player_points(blocking_player)[point] >= 2
 
 
-def count_exposed_blots(checkers, player):
+def count_exposed_blots(board, player):
     """
     Count exposed blots (single pieces that can be hit by opponent)
     A blot is a single piece on a point (not protected by having 2+ pieces)
     """
-    # Count unique points that have exactly 1 piece (blots)
-    blots_by_point = {}
-    
-    # First, count pieces per point for this player
-    for checker in checkers:
-        if checker.get('player') == player:
-            point = checker.get('point', -1)
-            if 0 <= point <= 23:  # On board (not bar or borne off)
-                if point not in blots_by_point:
-                    # Count how many pieces of this player are on this point
-                    pieces_on_point = sum(1 for c in checkers 
-                                        if c.get('point') == point and c.get('player') == player)
-                    # If only 1 piece, it's a blot (exposed/vulnerable)
-                    if pieces_on_point == 1:
-                        blots_by_point[point] = True
-                    else:
-                        blots_by_point[point] = False  # Mark as not a blot (protected)
-    
-    # Return count of points with blots
-    return sum(1 for is_blot in blots_by_point.values() if is_blot)
+    return board.blot_count(player)
 
 
-def count_trapped_pieces(checkers, bar, player):
+def count_trapped_pieces(board, player):
     """
     Count pieces that are trapped:
     1. On bar with all entry points blocked (prime)
     2. In opponent's home board behind a prime (6 consecutive blocked points)
+    Only recounted after moves that can change it (see Board.trapped_count).
     """
-    trapped = 0
-    opponent = 1 if player == 2 else 2
-    
-    # Check pieces on bar
-    bar_pieces = len(bar.get(str(player), []))
-    if bar_pieces > 0:
-        # Check if all entry points are blocked
-        # Player 1 enters on points 0-5 (points 1-6 on board)
-        # Player 2 enters on points 18-23 (points 19-24 on board)
-        if player == 1:
-            entry_points = [0, 1, 2, 3, 4, 5]  # Points 1-6 (0-indexed)
-        else:  # player == 2
-            entry_points = [18, 19, 20, 21, 22, 23]  # Points 19-24 (0-indexed)
-        
-        # Count how many entry points are blocked
-        blocked_entry_points = sum(1 for point in entry_points if is_point_blocked(checkers, point, opponent))
-        
-        # If all 6 entry points are blocked, pieces on bar are trapped
-        if blocked_entry_points >= 6:
-            trapped += bar_pieces
-        # If 4-5 entry points blocked, partially trapped
-        elif blocked_entry_points >= 4:
-            trapped += bar_pieces * 0.5
-    
-    # Check pieces in opponent's home board that are behind a prime
-    # Player 1's home: points 18-23 (points 19-24 on board)
-    # Player 2's home: points 0-5 (points 1-6 on board)
-    if player == 1:
-        # Player 1 pieces in Player 2's home (points 0-5)
-        opponent_home = list(range(0, 6))
-        player_checkers_in_opponent_home = [c for c in checkers 
-                                           if c.get('player') == player 
-                                           and 0 <= c.get('point', -1) <= 5]
-        
-        # Check if there's a prime blocking escape (6 consecutive blocked points)
-        for checker in player_checkers_in_opponent_home:
-            point = checker.get('point', 0)
-            # Check if all points from current position forward are blocked
-            escape_route_blocked = True
-            for i in range(min(6, 24 - point)):
-                check_point = point + i
-                if check_point < 24 and not is_point_blocked(checkers, check_point, opponent):
-                    escape_route_blocked = False
-                    break
-            if escape_route_blocked:
-                trapped += 1
-                
-    else:  # player == 2
-        # Player 2 pieces in Player 1's home (points 18-23)
-        opponent_home = list(range(18, 24))
-        player_checkers_in_opponent_home = [c for c in checkers 
-                                           if c.get('player') == player 
-                                           and 18 <= c.get('point', -1) <= 23]
-        
-        # Check if there's a prime blocking escape
-        for checker in player_checkers_in_opponent_home:
-            point = checker.get('point', 23)
-            # Check if all points from current position backward are blocked
-            escape_route_blocked = True
-            for i in range(min(6, point + 1)):
-                check_point = point - i
-                if check_point >= 0 and not is_point_blocked(checkers, check_point, opponent):
-                    escape_route_blocked = False
-                    break
-            if escape_route_blocked:
-                trapped += 1
-    
-    return trapped
+    return board.trapped_count(player)
 
 
-def is_position_won(checkers, bar, borne_off, player):
+def is_position_won(board, player):
     """
     Check if a position is 100% won (mathematically certain win)
     Conditions:
@@ -220,19 +190,12 @@ def is_position_won(checkers, bar, borne_off, player):
     4. Even worst-case scenario (all 1s) would still win
     """
     opponent = 1 if player == 2 else 2
+    home = HOME_BOARD[player]
     
     # Check if player has all pieces in home or borne off
-    if player == 1:
-        player_pieces_in_home = sum(1 for c in checkers 
-                                    if c.get('player') == player 
-                                    and 18 <= c.get('point', -1) <= 23)
-    else:  # player == 2
-        player_pieces_in_home = sum(1 for c in checkers 
-                                    if c.get('player') == player 
-                                    and 0 <= c.get('point', -1) <= 5)
-    
-    player_borne_off_count = borne_off.get(str(player), 0)
-    player_on_bar = len(bar.get(str(player), []))
+    player_pieces_in_home = board.home_count(player)
+    player_borne_off_count = board.off[player - 1]
+    player_on_bar = board.bar[player - 1]
     
     # All pieces must be in home or borne off, none on bar
     total_pieces = player_pieces_in_home + player_borne_off_count + player_on_bar
@@ -240,21 +203,12 @@ def is_position_won(checkers, bar, borne_off, player):
         return False
     
     # Check if opponent has any pieces in front of player's home
-    if player == 1:
-        opponent_in_front = sum(1 for c in checkers 
-                                if c.get('player') == opponent 
-                                and 18 <= c.get('point', -1) <= 23)
-    else:  # player == 2
-        opponent_in_front = sum(1 for c in checkers 
-                                if c.get('player') == opponent 
-                                and 0 <= c.get('point', -1) <= 5)
-    
-    if opponent_in_front > 0:
+    if board.player_points(opponent)[home].any():
         return False
     
     # Calculate worst-case scenario: player rolls all 1s, opponent rolls all 6s
-    player_pips = calculate_pip_count(checkers, bar, borne_off, player)
-    opponent_pips = calculate_pip_count(checkers, bar, borne_off, opponent)
+    player_pips = calculate_pip_count(board, player)
+    opponent_pips = calculate_pip_count(board, opponent)
     
     # If player has significantly fewer pips and all pieces in home, they win
     # Simple heuristic: if player has < 10 pips and opponent has > 20 pips, player wins
@@ -273,6 +227,77 @@ def evaluate_position_simple(game_state):
     Improved position evaluation
     Returns a score from -1 (CPU losing badly) to 1 (CPU winning badly)
     
+    Accepts a gameState dict or a Board (converted once, then evaluated on arrays).
+    Results are cached in EVAL_CACHE; see evaluate_board_simple for the heuristic itself.
+    """
+    board = Board.from_game_state(game_state)
+    cache_key = eval_cache_key(board, simple_cache_context(board))
+    evaluation = EVAL_CACHE.get(cache_key)
+    if evaluation is None:
+        evaluation = evaluate_board_simple(board)
+        EVAL_CACHE.put(cache_key, evaluation)
+    return evaluation
+
+
+def cube_position(game_state, on_roll):
+    """
+    Cube position relative to the side on roll, from the optional gameState.cubeOwner
+    (1 or 2; missing, 0 or null means the cube is centered)
+    """
+    owner = game_state.get('cubeOwner') if game_state else None
+    if owner in (1, 2, '1', '2'):
+        return CUBE_OWNED if int(owner) == on_roll else CUBE_OPPONENT
+    return CUBE_CENTERED
+
+
+def simple_cache_context(board):
+    """Eval-context part of the cache key for the heuristic (bear-off equities depend on the cube)"""
+    owner = board.extra.get('cubeOwner')
+    return f"simple:cube{owner}" if owner else 'simple'
+
+
+def evaluate_bearoff(board):
+    """
+    Exact equity of a bear-off (both sides have all checkers home), from -1 (CPU loses)
+    to 1 (CPU wins). The side to move is board.current_player.
+    With 6 or fewer checkers per side the two-sided database gives the cubeful equity
+    (cube action included, per unit of cube value); otherwise the one-sided database
+    gives the cubeless equity. Gammons are not counted.
+    Returns None if the position is not a bear-off or no database is loaded.
+    """
+    on_roll = board.current_player
+    if BEAROFF2_DB is not None and is_two_sided_position(board):
+        equity = BEAROFF2_DB.cubeful_equity(board, on_roll, cube_position(board.extra, on_roll))
+        return equity if on_roll == 2 else -equity
+    
+    if BEAROFF_DB is None or not is_bearoff_position(board):
+        return None
+    if on_roll == 1:
+        cpu_wins = 1.0 - BEAROFF_DB.win_probability(board, 1)
+    else:
+        cpu_wins = BEAROFF_DB.win_probability(board, 2)
+    return 2.0 * cpu_wins - 1.0
+
+
+def bearoff_cube_decision(board, doubler, owner):
+    """
+    Exact money-play cube decision from the two-sided bear-off database for
+    `doubler` (the side on roll), with the cube `owner` relative to it.
+    Equities are per unit of cube value; see cube.cube_action for the result.
+    Returns None if the database does not apply.
+    """
+    if BEAROFF2_DB is None or not is_two_sided_position(board):
+        return None
+    no_double = BEAROFF2_DB.no_double_equity(board, doubler, owner)
+    double_take = BEAROFF2_DB.double_take_equity(board, doubler)
+    return cube_action(no_double, double_take, 1.0, -1.0, owner != CUBE_OPPONENT, beaver_line=0.0)
+
+
+def evaluate_board_simple(board):
+    """
+    Heuristic evaluation of a Board (uncached)
+    Returns a score from -1 (CPU losing badly) to 1 (CPU winning badly)
+    
     First checks for 100% won/lost positions, then uses heuristic evaluation.
     
     Factors considered (weighted):
@@ -281,15 +306,16 @@ def evaluate_position_simple(game_state):
     3. Trapped pieces (~12%)
     4. Exposed blots (~10%)
     5. Position (pieces in home board) (~3%)
+    
+    Bear-offs are answered exactly from the bear-off database instead.
     """
-    checkers = game_state.get('checkers', [])
-    bar = game_state.get('bar', {})
-    borne_off = game_state.get('borneOff', {})
-    current_player = game_state.get('currentPlayer', 2)  # CPU is player 2
+    bearoff_equity = evaluate_bearoff(board)
+    if bearoff_equity is not None:
+        return bearoff_equity
     
     # Check for 100% won positions first
-    cpu_won = is_position_won(checkers, bar, borne_off, 2)
-    player_won = is_position_won(checkers, bar, borne_off, 1)
+    cpu_won = is_position_won(board, 2)
+    player_won = is_position_won(board, 1)
     
     if cpu_won and not player_won:
         return 1.0  # CPU has 100% win
@@ -297,8 +323,8 @@ def evaluate_position_simple(game_state):
         return -1.0  # Player has 100% win
     
     # Calculate pip counts
-    cpu_pips = calculate_pip_count(checkers, bar, borne_off, 2)
-    player_pips = calculate_pip_count(checkers, bar, borne_off, 1)
+    cpu_pips = calculate_pip_count(board, 2)
+    player_pips = calculate_pip_count(board, 1)
     
     # Pip advantage (negative means CPU is ahead)
     pip_diff = player_pips - cpu_pips
@@ -308,28 +334,26 @@ def evaluate_position_simple(game_state):
     pip_score = pip_diff / 100.0  # Max pip diff ~50-60 = 0.5-0.6 score
     
     # Pieces borne off (higher is better)
-    cpu_borne_off = borne_off.get('2', 0)
-    player_borne_off = borne_off.get('1', 0)
+    cpu_borne_off = board.off[1]
+    player_borne_off = board.off[0]
     borne_off_diff = cpu_borne_off - player_borne_off
     borne_off_score = borne_off_diff / 15.0  # Normalize by max pieces (15)
     
     # Trapped pieces (having trapped pieces is bad)
-    cpu_trapped = count_trapped_pieces(checkers, bar, 2)
-    player_trapped = count_trapped_pieces(checkers, bar, 1)
+    cpu_trapped = count_trapped_pieces(board, 2)
+    player_trapped = count_trapped_pieces(board, 1)
     trapped_diff = player_trapped - cpu_trapped
     trapped_score = trapped_diff / 5.0  # Normalize (max trapped ~3-5 pieces)
     
     # Exposed blots (single vulnerable pieces that can be hit)
-    cpu_blots = count_exposed_blots(checkers, 2)
-    player_blots = count_exposed_blots(checkers, 1)
+    cpu_blots = count_exposed_blots(board, 2)
+    player_blots = count_exposed_blots(board, 1)
     blots_diff = player_blots - cpu_blots
     blots_score = blots_diff / 10.0  # Normalize (max blots ~8-10 in a game)
     
     # Position evaluation (pieces in home board, safe points)
-    cpu_in_home = sum(1 for c in checkers 
-                     if c.get('player') == 2 and 0 <= c.get('point', -1) <= 5)
-    player_in_home = sum(1 for c in checkers 
-                        if c.get('player') == 1 and 18 <= c.get('point', -1) <= 23)
+    cpu_in_home = board.home_count(2)
+    player_in_home = board.home_count(1)
     position_diff = cpu_in_home - player_in_home
     position_score = position_diff / 15.0  # Normalize
     
@@ -366,205 +390,338 @@ def evaluate_position_simple(game_state):
     return evaluation
 
 
-def encode_position_to_gnubg(checkers, bar, borne_off, current_player):
+def count_trapped_pieces_batch(counts, bars, opponent_counts, player):
     """
-    Convert game state to GNU Backgammon position string format (same logic as gnubg_eval.py)
-    GNU Backgammon format: position X:Y where X is point (1-24, 25=bar, 0=bar), Y is checkers
-    Positive Y = player 1 (O), negative Y = player 2 (X)
+    Vectorized count_trapped_pieces for a batch of positions.
+    counts / opponent_counts are N x 24 point counts, bars the player's N bar counts.
     """
-    points = {}
+    opponent = 1 if player == 2 else 2
+    blocked = opponent_counts >= 2
     
-    # Process checkers on the board
-    for checker in checkers:
-        if isinstance(checker, dict):
-            point = checker.get('point', -1)
-            player = checker.get('player', 0)
-        else:
-            point = getattr(checker, 'point', -1)
-            player = getattr(checker, 'player', 0)
-        
-        try:
-            point = int(point)
-            player = int(player)
-        except (ValueError, TypeError):
-            continue
-        
-        if point < 0 or point > 23 or player not in [1, 2]:
-            continue
-        
-        if player == 1:
-            gnubg_point = 24 - point
-            points[gnubg_point] = points.get(gnubg_point, 0) + 1
+    # Pieces on the bar: fully trapped behind 6 blocked entry points, half-trapped behind 4-5
+    blocked_entry_points = blocked[:, HOME_BOARD[opponent]].sum(axis=1)
+    trapped = np.where(blocked_entry_points >= 6, bars,
+                       np.where(blocked_entry_points >= 4, bars * 0.5, 0.0))
+    
+    # Pieces in the opponent's home board with every point of their 6-point escape route blocked
+    windows = np.lib.stride_tricks.sliding_window_view(blocked, 6, axis=1).all(axis=2)  # N x 19, window start 0-18
+    if player == 1:
+        escape_blocked = windows[:, 0:6]  # checker on point p (0-5) needs p..p+5
+        in_opponent_home = counts[:, 0:6]
+    else:  # player == 2
+        escape_blocked = windows[:, 13:19]  # checker on point p (18-23) needs p-5..p
+        in_opponent_home = counts[:, 18:24]
+    trapped = trapped + (in_opponent_home * escape_blocked).sum(axis=1)
+    
+    return trapped
+
+
+def evaluate_positions_simple(boards):
+    """
+    Vectorized evaluate_position_simple for a batch of positions
+    
+    Stacks all positions into one N x 26 matrix and computes the pip, borne-off,
+    trapped, blot and home-board features for the whole batch in a few array
+    passes, with the same weights as evaluate_position_simple. Scoring 20-60
+    candidate moves costs roughly the same as scoring one.
+    
+    Positions already in EVAL_CACHE are not recomputed.
+    
+    Exact bear-off equities are on a different scale from the heuristic's scores,
+    so they are only returned when every position in the batch has one; otherwise
+    every position gets the heuristic score and the batch ranks consistently.
+    
+    Returns a NumPy array of scores from -1 (CPU losing badly) to 1 (CPU winning badly)
+    """
+    exact = exact_bearoff_equities(boards)
+    if exact is not None:
+        return exact
+    
+    evaluations = np.zeros(len(boards))
+    cache_keys = [eval_cache_key(board, simple_cache_context(board)) for board in boards]
+    missing = []
+    for index, cache_key in enumerate(cache_keys):
+        cached = EVAL_CACHE.get(cache_key)
+        if cached is None:
+            missing.append(index)
         else:
-            gnubg_point = point + 1
-            points[gnubg_point] = points.get(gnubg_point, 0) - 1
-    
-    # Handle bar
-    bar1 = len(bar.get('1', [])) if isinstance(bar, dict) else len(bar.get(1, []))
-    bar2 = len(bar.get('2', [])) if isinstance(bar, dict) else len(bar.get(2, []))
-    if bar1 > 0:
-        points[25] = bar1
-    if bar2 > 0:
-        points[0] = -bar2
-    
-    # Build position string
-    pos_parts = []
-    for point_num in sorted(points.keys(), reverse=True):
-        checker_count = points[point_num]
-        if checker_count != 0:
-            pos_parts.append(f"{point_num}:{checker_count}")
-    
-    return " ".join(pos_parts) if pos_parts else ""
-
-
-def start_gnubg_process():
-    """Start a persistent GNU Backgammon process for faster move recommendations"""
-    global GNUBG_PROCESS
-    if not GNUBG_AVAILABLE:
+            evaluations[index] = cached
+    
+    metrics.count('eval_cache_hit', len(boards) - len(missing))
+    metrics.count('eval_cache_miss', len(missing))
+    if missing:
+        computed = evaluate_boards_simple([boards[index] for index in missing])
+        for index, evaluation in zip(missing, computed):
+            evaluations[index] = evaluation
+            EVAL_CACHE.put(cache_keys[index], float(evaluation))
+    return evaluations
+
+
+def exact_bearoff_equities(boards):
+    """Exact bear-off equities (see evaluate_bearoff) if every board has one, else None"""
+    if not boards or (BEAROFF_DB is None and BEAROFF2_DB is None):
         return None
+    equities = np.zeros(len(boards))
+    for index, board in enumerate(boards):
+        equity = evaluate_bearoff(board)
+        if equity is None:
+            return None
+        equities[index] = equity
+    return equities
+
+
+def evaluate_boards_simple(boards):
+    """
+    Uncached vectorized heuristic for a batch of Boards (see evaluate_positions_simple)
+    Bear-offs get the heuristic score too; exact equities are chosen per batch.
+    """
+    matrix, borne_off = stack_boards(boards)
+    if len(matrix) == 0:
+        return np.zeros(0)
+    
+    signed = matrix[:, :NUM_POINTS].astype(np.int16)
+    p1 = np.maximum(signed, 0)
+    p2 = np.maximum(-signed, 0)
+    bar1 = matrix[:, NUM_POINTS].astype(np.int16)
+    bar2 = matrix[:, NUM_POINTS + 1].astype(np.int16)
+    off1 = borne_off[:, 0]
+    off2 = borne_off[:, 1]
+    
+    # Pip counts
+    player_pips = p1 @ PIP_DISTANCE[1] + bar1 * 25
+    cpu_pips = p2 @ PIP_DISTANCE[2] + bar2 * 25
+    
+    # Home board counts (also used for the 100% won check)
+    player_in_home = p1[:, HOME_BOARD[1]].sum(axis=1)
+    cpu_in_home = p2[:, HOME_BOARD[2]].sum(axis=1)
+    
+    # 100% won positions (same conditions as is_position_won)
+    player_won = ((player_in_home + off1 + bar1 >= 15) & (bar1 == 0) &
+                  ~p2[:, HOME_BOARD[1]].any(axis=1) &
+                  (((player_pips < 10) & (cpu_pips > 20)) | ((off1 >= 10) & (player_pips < 15))))
+    cpu_won = ((cpu_in_home + off2 + bar2 >= 15) & (bar2 == 0) &
+               ~p1[:, HOME_BOARD[2]].any(axis=1) &
+               (((cpu_pips < 10) & (player_pips > 20)) | ((off2 >= 10) & (cpu_pips < 15))))
+    
+    pip_score = (player_pips - cpu_pips) / 100.0
+    borne_off_score = (off2 - off1) / 15.0
+    trapped_score = (count_trapped_pieces_batch(p1, bar1, p2, 1) -
+                     count_trapped_pieces_batch(p2, bar2, p1, 2)) / 5.0
+    blots_score = ((p1 == 1).sum(axis=1) - (p2 == 1).sum(axis=1)) / 10.0
+    position_score = (cpu_in_home - player_in_home) / 15.0
+    
+    # Same weights as evaluate_position_simple (trapped pieces boosted when significant)
+    boosted = (
+        pip_score * 0.45 +
+        borne_off_score * 0.20 +
+        trapped_score * 0.22 +
+        blots_score * 0.10 +
+        position_score * 0.03
+    )
+    normal = (
+        pip_score * 0.55 +
+        borne_off_score * 0.20 +
+        trapped_score * 0.12 +
+        blots_score * 0.10 +
+        position_score * 0.03
+    )
+    evaluation = np.clip(np.where(np.abs(trapped_score) > 0.3, boosted, normal), -1.0, 1.0)
+    
+    evaluation = np.where(cpu_won & ~player_won, 1.0, evaluation)
+    evaluation = np.where(player_won & ~cpu_won, -1.0, evaluation)
+    return evaluation
+
+
+def evaluate_positions_nn(boards):
+    """
+    Score a batch of positions with the neural-network evaluator (see nn_eval.py)
     
-    if GNUBG_PROCESS and GNUBG_PROCESS.poll() is None:
-        return GNUBG_PROCESS  # Process is still running
+    One encoding pass and two matrix multiplies for the whole batch; bear-offs
+    use the exact database equity instead. Positions already in EVAL_CACHE are
+    not recomputed.
     
-    print("Starting persistent GNU Backgammon process...")
-    try:
-        subprocess_kwargs = {
-            'stdin': subprocess.PIPE,
-            'stdout': subprocess.PIPE,
-            'stderr': subprocess.PIPE,
-            'text': True,
-            'bufsize': 1,  # Line-buffered
-        }
-        
-        if sys.platform == 'win32':
-            try:
-                subprocess_kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
-            except AttributeError:
-                pass
-        
-        # Start gnubg-cli in command-line mode
-        process = subprocess.Popen(
-            [GNUBG_PATH, '-t', '-c', '--no-rc', '--quiet'],
-            **subprocess_kwargs
-        )
-        
-        # Read initial banner to clear buffer
-        output = ""
-        start_time = time.time()
-        while "gnubg>" not in output and time.time() - start_time < 2.0:
-            try:
-                line = process.stdout.readline()
-                if not line:
-                    break
-                output += line
-            except:
-                break
-        
-        if "gnubg>" in output:
-            print("✓ GNU Backgammon process started successfully")
-            GNUBG_PROCESS = process
-            return process
+    Returns a NumPy array of cubeless equities from -1 (CPU losing) to 1 (CPU winning)
+    """
+    evaluations = np.zeros(len(boards))
+    cache_keys = [eval_cache_key(board, 'nn:' + simple_cache_context(board)) for board in boards]
+    missing = []
+    for index, cache_key in enumerate(cache_keys):
+        cached = EVAL_CACHE.get(cache_key)
+        if cached is None:
+            missing.append(index)
         else:
-            print("✗ GNU Backgammon process did not start correctly")
-            if process.poll() is not None:
-                print(f"  Process exited with code: {process.returncode}")
-            GNUBG_PROCESS = None
-            return None
-    except Exception as e:
-        print(f"✗ Error starting GNU Backgammon process: {e}")
-        GNUBG_PROCESS = None
+            evaluations[index] = cached
+    
+    metrics.count('eval_cache_hit', len(boards) - len(missing))
+    metrics.count('eval_cache_miss', len(missing))
+    if missing:
+        missing_boards = [boards[index] for index in missing]
+        computed = NN_EVALUATOR.equities(missing_boards)
+        for index, board, evaluation in zip(missing, missing_boards, computed):
+            bearoff_equity = evaluate_bearoff(board)
+            if bearoff_equity is not None:
+                evaluation = bearoff_equity
+            evaluations[index] = evaluation
+            EVAL_CACHE.put(cache_keys[index], float(evaluation))
+    return evaluations
+
+
+def probabilities_json(probabilities):
+    """The five outcome probabilities (see nn_eval) as a JSON object"""
+    return {
+        'win': float(probabilities[WIN]),
+        'winGammon': float(probabilities[WIN_GAMMON]),
+        'winBackgammon': float(probabilities[WIN_BACKGAMMON]),
+        'loseGammon': float(probabilities[LOSE_GAMMON]),
+        'loseBackgammon': float(probabilities[LOSE_BACKGAMMON]),
+    }
+
+
+def cube_probabilities(board, doubler):
+    """
+    Gammon-aware outcome probabilities (see nn_eval) for `doubler` on roll in `board`,
+    and the evaluator that produced them. Without the neural network the heuristic
+    equity gives the winning chance, and either side wins a gammon at
+    HEURISTIC_GAMMON_RATE of its wins while the other has borne nothing off.
+    """
+    board = board.copy()
+    board.current_player = doubler
+    if NN_EVALUATOR is not None:
+        cpu, method = NN_EVALUATOR.probabilities([board])[0], 'neural'
+    else:
+        win = (evaluate_position_simple(board) + 1.0) / 2.0
+        cpu_gammons = HEURISTIC_GAMMON_RATE if board.off[0] == 0 else 0.0
+        player_gammons = HEURISTIC_GAMMON_RATE if board.off[1] == 0 else 0.0
+        cpu = np.array([win, win * cpu_gammons, 0.0, (1.0 - win) * player_gammons, 0.0])
+        method = 'heuristic'
+    if doubler == 2:
+        return cpu, method
+    return np.array([1.0 - cpu[WIN], cpu[LOSE_GAMMON], cpu[LOSE_BACKGAMMON], cpu[WIN_GAMMON],
+                     cpu[WIN_BACKGAMMON]]), method
+
+
+def match_state(game_state, doubler):
+    """
+    (points `doubler` needs, points its opponent needs, Crawford game, post-Crawford)
+    from the optional gameState.matchLength, matchScore ({'1': points, '2': points})
+    and crawford (true during the Crawford game); None for money play or when
+    no match equity table is loaded
+    """
+    length = int(game_state.get('matchLength') or 0)
+    if length <= 0 or MATCH_EQUITY_TABLE is None:
         return None
+    score = game_state.get('matchScore') or {}
+    away = {player: length - int(score.get(str(player), score.get(player, 0)) or 0) for player in (1, 2)}
+    crawford = bool(game_state.get('crawford'))
+    post_crawford = not crawford and min(away.values()) == 1
+    return away[doubler], away[1 if doubler == 2 else 2], crawford, post_crawford
 
 
-def send_gnubg_command(command, timeout=1.0):
-    """Send a command to the persistent GNU Backgammon process and return output"""
-    global GNUBG_PROCESS
+def cube_analysis(game_state, doubler):
+    """
+    Offer, take and beaver decisions with `doubler` on roll (see cube.cube_action),
+    plus the evaluator used ('method') and, unless the bear-off database answered,
+    the doubler's outcome probabilities. Money-play equities are per unit of cube
+    value, match-play equities are match winning chances.
+    Cached in EVAL_CACHE per position + cube value, owner and match score; the
+    returned dict is shared and must not be modified.
+    """
+    board = Board.from_game_state(game_state)
+    board.current_player = doubler
+    cube = int(game_state.get('cubeValue') or game_state.get('gameStakes') or 1)
+    owner = cube_position(game_state, doubler)
+    match = match_state(game_state, doubler)
+    cache_key = eval_cache_key(board, f"cube:{cube if match else 1}:{owner}:{match}")
+    analysis = EVAL_CACHE.get(cache_key)
+    if analysis is not None:
+        return analysis
+
+    analysis = bearoff_cube_decision(board, doubler, owner) if match is None else None
+    if analysis is not None:
+        analysis['method'] = 'bearoff'
+    else:
+        probabilities, method = cube_probabilities(board, doubler)
+        win, win_rates, lose_rates = outcome_rates(probabilities)
+        if match is None:
+            analysis = cube_decision(money_model(win_rates, lose_rates), win, 1, owner, beavers=True)
+        else:
+            away, opponent_away, crawford, post_crawford = match
+            model = match_model(MATCH_EQUITY_TABLE, away, opponent_away, win_rates, lose_rates,
+                                crawford=crawford, post_crawford=post_crawford)
+            analysis = cube_decision(model, win, cube, owner)
+        analysis['method'] = method
+        analysis['probabilities'] = probabilities_json(probabilities)
+    analysis['matchPlay'] = match is not None
+    EVAL_CACHE.put(cache_key, analysis)
+    return analysis
+
+
+def static_evaluator_for_difficulty(difficulty):
+    """
+    Batch static evaluator used to rank and search moves: the neural network for
+    levels 7-9 when its weights are loaded and GNU Backgammon is not available,
+    otherwise the heuristic
+    """
+    if NN_EVALUATOR is not None and difficulty >= 7 and not GNUBG_AVAILABLE:
+        return evaluate_positions_nn
+    return evaluate_positions_simple
+
+
+def send_gnubg_command(command, timeout=1.0, worker=None):
+    """
+    Send a command to a persistent GNU Backgammon process and return output.
+    Pass `worker` to keep a multi-command sequence on one process; otherwise a
+    worker is borrowed from the pool for this single command.
+    Raises GnubgTimeout if no reply (prompt) arrives within `timeout` seconds.
+    """
+    return send_gnubg_commands([command], timeout=timeout, worker=worker)[0]
+
+
+def send_gnubg_commands(commands, timeout=1.0, worker=None):
+    """
+    Pipeline several commands to one GNU Backgammon process and return their outputs.
+    All commands are written at once and the replies are read back framed by the
+    prompt; `timeout` is per command (a number, or a list with one entry per command).
+    """
+    if worker is not None:
+        return worker.send_many(commands, timeout=timeout)
     
-    if not GNUBG_PROCESS or GNUBG_PROCESS.poll() is not None:
-        start_gnubg_process()
-        if not GNUBG_PROCESS:
-            raise Exception("GNU Backgammon process not available")
+    if GNUBG_POOL is None:
+        raise Exception("GNU Backgammon process not available")
     
-    with GNUBG_LOCK:
-        try:
-            # Clear any pending output (try to read until prompt appears)
-            for _ in range(20):
-                try:
-                    line = GNUBG_PROCESS.stdout.readline()
-                    if not line or "gnubg>" in line:
-                        break
-                except:
-                    break
-            
-            # Send command
-            GNUBG_PROCESS.stdin.write(command + '\n')
-            GNUBG_PROCESS.stdin.flush()
-            
-            # Read output until we see the prompt
-            output_lines = []
-            start_time = time.time()
-            while time.time() - start_time < timeout:
-                try:
-                    line = GNUBG_PROCESS.stdout.readline()
-                    if not line:
-                        break
-                    output_lines.append(line.rstrip())
-                    if "gnubg>" in line:
-                        break
-                except:
-                    break
-            
-            return "\n".join(output_lines)
-        except Exception as e:
-            print(f"✗ Error sending command to GNU Backgammon: {e}")
-            # Try to restart process on error
-            try:
-                GNUBG_PROCESS.kill()
-            except:
-                pass
-            GNUBG_PROCESS = None
-            raise
+    with GNUBG_POOL.worker() as pooled:
+        if pooled is None:
+            raise Exception("GNU Backgammon process not available")
+        return pooled.send_many(commands, timeout=timeout)
 
 
 def get_gnubg_hint(game_state, dice):
     """
     Get move recommendation from GNU Backgammon using the 'hint' command.
     This is much faster than evaluating each move separately.
+    The set-up commands and the hint are pipelined in one write; the whole
+    exchange is bounded by the per-command deadlines (at most GNUBG_HINT_TIMEOUT
+    for the hint itself).
     """
-    if not GNUBG_AVAILABLE:
+    if not GNUBG_AVAILABLE or GNUBG_POOL is None:
         return None
     
     try:
-        start_gnubg_process()
-        if not GNUBG_PROCESS:
-            return None
-        
-        # Set board position
-        checkers = game_state.get('checkers', [])
-        bar = game_state.get('bar', {})
-        borne_off = game_state.get('borneOff', {})
-        current_player = game_state.get('currentPlayer', 1)
-        
-        pos_str = encode_position_to_gnubg(checkers, bar, borne_off, current_player)
-        
-        # Start new game and set position
-        send_gnubg_command("new game", timeout=0.5)
-        
-        if pos_str:
-            send_gnubg_command(f"set board position {pos_str}", timeout=0.5)
-        else:
-            send_gnubg_command("set board", timeout=0.5)  # Initial position
-        
-        # Set turn (GNU Backgammon uses 0 for first player, 1 for second)
-        gnubg_player = 0 if current_player == 1 else 1
-        send_gnubg_command(f"set turn {gnubg_player}", timeout=0.5)
+        # Start new game, then set the side on roll and the position by Position ID
+        points, bar, _, current_player = counts_from_game_state(game_state)
+        commands = ["new game"] + set_board_commands(points, bar, current_player)
         
         # Set dice
-        dice_str = f"{dice[0]} {dice[1]}"
-        send_gnubg_command(f"set dice {dice_str}", timeout=0.5)
+        commands.append(f"set dice {dice[0]} {dice[1]}")
         
         # Get hint (best move recommendation)
-        hint_output = send_gnubg_command("hint", timeout=4.0)
+        commands.append("hint")
+        timeouts = [GNUBG_SETUP_TIMEOUT] * (len(commands) - 1) + [GNUBG_HINT_TIMEOUT]
+        
+        with GNUBG_POOL.worker() as worker:
+            if worker is None:
+                return None
+            hint_output = send_gnubg_commands(commands, timeout=timeouts, worker=worker)[-1]
         
         # Parse hint output
         # Example: "Best move: 8/5 6/5 (equity -0.000)"
@@ -579,6 +736,9 @@ def get_gnubg_hint(game_state, dice):
             
             return {'move_str': move_str, 'equity': equity}
         
+        return None
+    except GnubgTimeout as e:
+        print(f"⚠ GNU Backgammon hint abandoned: {e}")
         return None
     except Exception as e:
         print(f"✗ Error getting GNU Backgammon hint: {e}")
@@ -589,12 +749,167 @@ def evaluate_position_gnubg(game_state):
     """
     Evaluate position using GNU Backgammon (if available)
     
-    Uses GNU Backgammon's Python API via subprocess execution.
-    Creates a temporary JSON file with game state, executes gnubg-cli with
-    a Python script that uses the gnubg module to evaluate the position.
+    Uses a persistent worker from GNUBG_POOL, so the gnubg start-up and weight
+    load are not paid per position. Falls back to a one-shot subprocess when the
+    workers cannot run gnubg_eval.py (e.g. gnubg built without Python support).
+    
+    Returns equity from -1 (CPU losing) to 1 (CPU winning), or None if unavailable
+    """
+    if not GNUBG_AVAILABLE:
+        return None
+    
+    cache_key = eval_cache_key(Board.from_game_state(game_state), GNUBG_CACHE_CONTEXT)
+    equity = EVAL_CACHE.get(cache_key)
+    if equity is not None:
+        metrics.count('gnubg_cache_hit')
+        return equity
+    metrics.count('gnubg_cache_miss')
+    
+    if GNUBG_POOL is not None:
+        try:
+            with GNUBG_POOL.worker() as worker:
+                if worker is None:
+                    # Every worker is busy - let the caller use the heuristic instead of queueing further
+                    return None
+                if worker.python_ready:
+                    equity = parse_gnubg_eval_output(worker.evaluate(game_state, timeout=2.0))
+                    EVAL_CACHE.put(cache_key, equity)
+                    return equity
+        except Exception as e:
+            print(f"✗ Error calling GNU Backgammon worker: {e} (falling back to simple evaluation)")
+            return None
+    
+    equity = evaluate_position_gnubg_subprocess(game_state)
+    EVAL_CACHE.put(cache_key, equity)
+    return equity
+
+
+def gnubg_cache_context(eval_context=None):
+    """Eval-context part of the cache key for a GNU Backgammon evalContext dict"""
+    if not eval_context:
+        return GNUBG_CACHE_CONTEXT
+    return f"gnubg:{eval_context.get('plies', 2)}ply:{eval_context.get('cubeful', 1)}"
+
+
+def evaluate_positions_gnubg(game_states, eval_context=None, cancel=None):
+    """
+    Evaluate several positions with GNU Backgammon in a single round-trip
+    
+    All positions go to one worker (or one one-shot gnubg process) as a batch,
+    so scoring N candidate moves costs one call instead of N. Cancelling
+    `cancel` while the batch is in flight kills and replaces the worker.
+    
+    Returns a list of equities in input order (None for positions that failed),
+    or None if GNU Backgammon is unavailable
+    """
+    if not GNUBG_AVAILABLE or not game_states:
+        return None
+    
+    # Only send positions that are not cached yet
+    context = gnubg_cache_context(eval_context)
+    cache_keys = [eval_cache_key(Board.from_game_state(state), context) for state in game_states]
+    cached = [EVAL_CACHE.get(cache_key) for cache_key in cache_keys]
+    missing = [index for index, equity in enumerate(cached) if equity is None]
+    metrics.count('gnubg_cache_hit', len(cached) - len(missing))
+    metrics.count('gnubg_cache_miss', len(missing))
+    if not missing:
+        return cached
+    all_states, game_states = game_states, [game_states[index] for index in missing]
+    
+    start_time = time.time()
+    results = None
+    try:
+        handled = False
+        if GNUBG_POOL is not None:
+            with GNUBG_POOL.worker() as worker:
+                if worker is None:
+                    return None
+                if cancel is not None and cancel.cancelled:
+                    return None
+                if worker.python_ready:
+                    results = worker.evaluate_batch(game_states, eval_context, cancel=cancel)
+                    handled = True
+        if not handled:
+            payload = {'positions': list(game_states)}
+            if eval_context:
+                payload['evalContext'] = eval_context
+            json_output = run_gnubg_eval_subprocess(payload, timeout=2 + 0.5 * len(game_states))
+            results = json_output.get('results') if json_output else None
+    except GnubgCancelled:
+        return None
+    except Exception as e:
+        print(f"✗ Error calling GNU Backgammon batch evaluation: {e} (falling back to simple evaluation)")
+        return None
+    
+    if results is None or len(results) != len(game_states):
+        print("✗ GNU Backgammon batch evaluation returned no usable results")
+        return None
+    
+    equities = []
+    for result in results:
+        equity = result.get('equity') if isinstance(result, dict) else None
+        if equity is None:
+            print(f"✗ GNU Backgammon evaluation error: {result.get('error') if isinstance(result, dict) else result}")
+            equities.append(None)
+        else:
+            equities.append(max(-1.0, min(1.0, float(equity))))
     
+    print(f"✓ GNU Backgammon batch evaluation: {len(game_states)} positions in {(time.time() - start_time) * 1000:.0f}ms ({len(all_states) - len(game_states)} cached)")
+    for index, equity in zip(missing, equities):
+        cached[index] = equity
+        EVAL_CACHE.put(cache_keys[index], equity)
+    return cached
+
+
+def parse_gnubg_eval_output(json_output):
+    """
+    Extract the equity from a gnubg_eval.py result dict and log its debug info.
+    Returns equity from -1 (CPU losing) to 1 (CPU winning), or None on error/missing output.
+    """
+    if json_output and 'equity' in json_output:
+        equity = json_output.get('equity')
+        if equity is not None:
+            # Ensure equity is in valid range
+            equity = max(-1.0, min(1.0, float(equity)))
+            # Log the position (decode the ID with position_codec.decode_position_id)
+            debug_info = json_output.get('debug', {})
+            print(f"✓ GNU Backgammon evaluation: {equity:.4f} (position={debug_info.get('position_id', '?')}, "
+                  f"turn={debug_info.get('current_player', '?')})")
+            return equity
+
+    # Check for error in output
+    if json_output and 'error' in json_output:
+        error_msg = json_output.get('error')
+        print(f"✗ GNU Backgammon evaluation error: {error_msg}")
+        if 'traceback' in json_output:
+            traceback_lines = json_output.get('traceback', '').split('\n')[:5]
+            print(f"  Traceback (first 5 lines):")
+            for tb_line in traceback_lines:
+                print(f"    {tb_line}")
+        return None
+    
+    return None
+
+
+def evaluate_position_gnubg_subprocess(game_state):
+    """
+    Evaluate position using a one-shot GNU Backgammon process
     Returns equity from -1 (CPU losing) to 1 (CPU winning), or None if unavailable
     """
+    return parse_gnubg_eval_output(run_gnubg_eval_subprocess(game_state))
+
+
+def run_gnubg_eval_subprocess(input_data, timeout=2):
+    """
+    Run gnubg_eval.py in a one-shot GNU Backgammon process
+    
+    Uses GNU Backgammon's Python API via subprocess execution.
+    Creates a temporary JSON file with the input (a game state, or a batch
+    payload with a 'positions' list), executes gnubg-cli with a Python script
+    that uses the gnubg module to evaluate it.
+    
+    Returns the parsed JSON result dict, or None if unavailable
+    """
     if not GNUBG_AVAILABLE:
         return None
     
@@ -603,7 +918,7 @@ def evaluate_position_gnubg(game_state):
         
         # Create temporary JSON file with game state
         with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as tmp_file:
-            json.dump(game_state, tmp_file)
+            json.dump(input_data, tmp_file)
             tmp_path = tmp_file.name
         
         try:
@@ -615,6 +930,8 @@ def evaluate_position_gnubg(game_state):
             # Pass the file path via environment variable instead
             env = os.environ.copy()
             env['GNUBG_EVAL_FILE'] = tmp_path
+            # gnubg_eval.py imports position_codec from this directory
+            env['PYTHONPATH'] = os.pathsep.join(filter(None, [script_dir, env.get('PYTHONPATH')]))
             
             # Execute GNU Backgammon with Python script
             # --no-rc prevents reading config files for faster startup
@@ -623,7 +940,7 @@ def evaluate_position_gnubg(game_state):
             subprocess_kwargs = {
                 'capture_output': True,
                 'text': True,
-                'timeout': 2,  # 2 second timeout per evaluation (balanced for speed/accuracy)
+                'timeout': timeout,  # 2 second timeout per evaluation by default (balanced for speed/accuracy)
                 'cwd': os.path.dirname(GNUBG_PATH) if os.path.dirname(GNUBG_PATH) else None,
                 'env': env,
                 'stdin': subprocess.DEVNULL,  # Suppress stdin to prevent any interactive prompts
@@ -657,10 +974,11 @@ def evaluate_position_gnubg(game_state):
                 except Exception:
                     pass  # If any beep suppression fails, continue anyway
             
-            result = subprocess.run(
-                gnubg_args,
-                **subprocess_kwargs
-            )
+            with metrics.stage('gnubg_subprocess'):
+                result = subprocess.run(
+                    gnubg_args,
+                    **subprocess_kwargs
+                )
             
             # GNU Backgammon prints banner to stdout, our JSON should be in stderr
             # But let's check both
@@ -693,52 +1011,8 @@ def evaluate_position_gnubg(game_state):
                         except json.JSONDecodeError:
                             continue
             
-            if json_output and 'equity' in json_output:
-                equity = json_output.get('equity')
-                if equity is not None:
-                    # Ensure equity is in valid range
-                    equity = max(-1.0, min(1.0, float(equity)))
-                    # Log debug info if available
-                    debug_info = json_output.get('debug', {})
-                    pos_hash = debug_info.get('pos_hash', 'unknown')
-                    checker_count = debug_info.get('checker_count', '?')
-                    bar1 = debug_info.get('bar1', '?')
-                    bar2 = debug_info.get('bar2', '?')
-                    borne1 = debug_info.get('borne1', '?')
-                    borne2 = debug_info.get('borne2', '?')
-                    pos_str_preview = debug_info.get('pos_str_preview', '?')
-                    pos_str_length = debug_info.get('pos_str_length', '?')
-                    sample_checkers = debug_info.get('sample_checkers', [])
-                    points_count = debug_info.get('points_count', '?')
-                    checker_dist = debug_info.get('checker_distribution', {})
-                    encoding_stats = debug_info.get('encoding_stats', {})
-                    points_dict = encoding_stats.get('points_dict', {})
-                    points_dict_all = encoding_stats.get('points_dict_all', {})
-                    total_gnu_checkers = encoding_stats.get('total_gnu_checkers', '?')
-                    our_points_count = encoding_stats.get('our_points_count', {})
-                    if pos_str_length == 0 or pos_str_preview == '(EMPTY!)':
-                        print(f"✗ GNU Backgammon: EMPTY POSITION STRING! (pos_hash={pos_hash}, checkers={checker_count}, processed={encoding_stats.get('processed', '?')}, total_gnu_checkers={total_gnu_checkers}, points_dict_all={points_dict_all}, our_points={our_points_count})")
-                    else:
-                        # Show full position string if it's not too long
-                        full_pos = debug_info.get('full_pos_str', '')
-                        if points_count < 10:  # If very few points, something is wrong
-                            print(f"⚠ GNU Backgammon evaluation: {equity:.4f} (pos_hash={pos_hash}, checkers={checker_count}, points={points_count} [SHOULD BE MORE!], pos_str='{full_pos}', processed={encoding_stats.get('processed', '?')}, total_gnu={total_gnu_checkers}, points_dict_all={points_dict_all})")
-                        elif len(full_pos) < 300:
-                            print(f"✓ GNU Backgammon evaluation: {equity:.4f} (pos_hash={pos_hash}, checkers={checker_count}, points={points_count}, pos_str='{full_pos}')")
-                        else:
-                            print(f"✓ GNU Backgammon evaluation: {equity:.4f} (pos_hash={pos_hash}, checkers={checker_count}, points={points_count}, preview='{pos_str_preview[:200]}')")
-                    return equity
-            
-            # Check for error in output
-            if json_output and 'error' in json_output:
-                error_msg = json_output.get('error')
-                print(f"✗ GNU Backgammon evaluation error: {error_msg}")
-                if 'traceback' in json_output:
-                    traceback_lines = json_output.get('traceback', '').split('\n')[:5]
-                    print(f"  Traceback (first 5 lines):")
-                    for tb_line in traceback_lines:
-                        print(f"    {tb_line}")
-                return None
+            if json_output:
+                return json_output
             
             # Debug output if no JSON found
             print(f"✗ GNU Backgammon: No JSON found in output")
@@ -774,53 +1048,6 @@ def evaluate_position_gnubg(game_state):
     return None  # Fall back to simple evaluation if GNU Backgammon fails
 
 
-def convert_to_gnubg_position(game_state):
-    """
-    Convert game state to GNU Backgammon position format
-    Format: "position 24:0 0:0 0:0 ..." where each number is point:checkers
-    """
-    checkers = game_state.get('checkers', [])
-    bar = game_state.get('bar', {})
-    borne_off = game_state.get('borneOff', {})
-    
-    # Initialize point counts (24 points + bar + borne off)
-    points = [0] * 26  # 24 points + bar (25) + borne off (26)
-    
-    # Count checkers on each point
-    for checker in checkers:
-        point = checker.get('point', -1)
-        player = checker.get('player', 0)
-        if 0 <= point <= 23:
-            if player == 1:
-                # Player 1: points 0-23 map to 24-1 (reversed)
-                gnubg_point = 24 - point
-                points[gnubg_point - 1] += 1
-            else:  # player == 2
-                # Player 2: points 0-23 map to 1-24 (normal)
-                points[point] += 1
-    
-    # Handle bar (point 25 in gnubg format)
-    player1_bar = len(bar.get('1', []))
-    player2_bar = len(bar.get('2', []))
-    if player1_bar > 0:
-        points[24] = player1_bar  # Bar for player 1
-    if player2_bar > 0:
-        points[24] = -player2_bar  # Bar for player 2 (negative)
-    
-    # Handle borne off (point 26 in gnubg format)
-    player1_borne = borne_off.get('1', 0)
-    player2_borne = borne_off.get('2', 0)
-    if player1_borne > 0:
-        points[25] = player1_borne
-    if player2_borne > 0:
-        points[25] = -player2_borne
-    
-    # Format as gnubg position string
-    # This is a simplified conversion - full implementation would need proper encoding
-    position_parts = [f"{i+1}:{points[i]}" for i in range(24)]
-    return " ".join(position_parts)
-
-
 def get_best_move_gnubg(game_state, difficulty):
     """
     Get best move using GNU Backgammon neural network
@@ -884,77 +1111,81 @@ def get_accuracy_for_difficulty(difficulty):
         return 0.998
 
 
-# Opening book - standard optimal opening moves in backgammon
-# These are memorized moves that all strong players use for the first few moves
-OPENING_BOOK = {
-    # First roll moves (for player 2 / CPU)
-    # Format: (dice1, dice2): [list of optimal moves as move descriptions]
-    # Moves are described as from_point-to_point or "bearoff" etc.
-    # We'll match these to actual legal moves
-    
-    # Opening roll 3-1: Best moves are 8/5 6/5 (move 8->5, 6->5) or 24/23 13/10
-    # Opening roll 4-1: Best is 13/9 6/5
-    # Opening roll 5-1: Best is 13/8 6/5  
-    # Opening roll 6-1: Best is 24/18 13/12
-    # Opening roll 4-2: Best is 8/4 6/4
-    # Opening roll 5-2: Best is 13/8 13/11
-    # Opening roll 6-2: Best is 24/18 13/11
-    # Opening roll 5-3: Best is 8/3 6/3
-    # Opening roll 6-3: Best is 24/18 13/10
-    # Opening roll 6-4: Best is 24/18 13/9
-    # Opening roll 6-5: Best is 24/18 24/19
-    # Doubles are played 4 times (doubling cube rules)
-}
+# Points each player starts the game on (used to detect the opening phase)
+PLAYER1_STARTING_POINTS = [0, 11, 16, 18]
+PLAYER2_STARTING_POINTS = [23, 12, 7, 5]
+
+# Opening book (OPENING_BOOK_PATH): book plays for the first turns, looked up before any evaluation
+OPENING_BOOK = load_opening_book()
+
+
+def book_play(game_state, plays, dice):
+    """
+    The opening book's play for this turn, or None
+    Only used at the start of a turn (the whole roll still to play), as the book
+    stores complete plays.
+    """
+    if OPENING_BOOK is None or not plays:
+        return None
+    full_roll = (len(dice) == 2 and dice[0] != dice[1]) or (len(dice) == 4 and len(set(dice)) == 1)
+    if not full_roll:
+        return None
+    board = Board.from_game_state(game_state)
+    result = OPENING_BOOK.lookup(board, game_state.get('currentPlayer', 2), dice)
+    if result is None:
+        return None
+    key = result.key()
+    return next((play for play in plays if play.board.key() == key), None)
+
 
 def is_opening_phase(game_state):
     """
     Determine if the game is still in the opening phase
     Opening phase = first few moves, typically when most pieces are still in starting positions
     """
-    checkers = game_state.get('checkers', [])
-    bar = game_state.get('bar', {})
-    borne_off = game_state.get('borneOff', {})
+    board = Board.from_game_state(game_state)
     
     # Count how many pieces have moved from starting positions
     # Starting positions: Player 1 has 2 at 0, 5 at 11, 3 at 16, 5 at 18
     # Player 2 has 2 at 23, 5 at 12, 3 at 7, 5 at 5
-    
-    player1_starting_positions = {0: 2, 11: 5, 16: 3, 18: 5}
-    player2_starting_positions = {23: 2, 12: 5, 7: 3, 5: 5}
-    
-    # Count pieces in starting positions
-    p1_in_start = sum(1 for c in checkers 
-                     if c.get('player') == 1 
-                     and c.get('point') in player1_starting_positions.keys())
-    
-    p2_in_start = sum(1 for c in checkers 
-                     if c.get('player') == 2 
-                     and c.get('point') in player2_starting_positions.keys())
-    
-    # Count pieces borne off
-    p1_borne = borne_off.get('1', 0)
-    p2_borne = borne_off.get('2', 0)
-    
-    # Count pieces on bar
-    p1_bar = len(bar.get('1', []))
-    p2_bar = len(bar.get('2', []))
+    p1_in_start = int(board.player_points(1)[PLAYER1_STARTING_POINTS].sum())
+    p2_in_start = int(board.player_points(2)[PLAYER2_STARTING_POINTS].sum())
+    total_in_start = p1_in_start + p2_in_start
     
     # Opening phase if:
     # - No pieces borne off
     # - No pieces on bar (for both players)
     # - Most pieces still in starting positions (>20 out of 30 total pieces still in starting spots)
-    total_in_start = p1_in_start + p2_in_start
-    total_pieces_on_board = len(checkers)
-    
-    # Opening phase: first ~10-15 moves, no pieces borne off, no pieces hit
-    is_opening = (p1_borne == 0 and p2_borne == 0 and 
-                  p1_bar == 0 and p2_bar == 0 and
+    is_opening = (board.off == [0, 0] and
+                  board.bar == [0, 0] and
                   total_in_start >= 20)
     
     return is_opening
 
 
-def get_best_move_simple(game_state, difficulty, legal_moves):
+def legal_move_candidates(game_state, legal_moves):
+    """
+    Simulate each move from the frontend's legalMoves list
+    Returns [(move, resulting Board or None if it could not be simulated), ...]
+    """
+    # Make/unmake on one board: only moves that change the position get their own copy
+    board = Board.from_game_state(game_state)
+    candidates = []
+    for move in legal_moves:
+        try:
+            token = apply_legal_move(board, move)
+        except:
+            candidates.append((move, None))  # Moves that cannot be applied keep a neutral score
+            continue
+        if token is None:
+            candidates.append((move, board))
+        else:
+            candidates.append((move, board.copy()))
+            board.undo(token)
+    return candidates
+
+
+def get_best_move_simple(game_state, difficulty, legal_moves, deadline=None):
     """
     Get best move using evaluation (GNU Backgammon if available, otherwise simple evaluation)
     Difficulty affects how optimal the move selection is
@@ -965,30 +1196,173 @@ def get_best_move_simple(game_state, difficulty, legal_moves):
     if not legal_moves or len(legal_moves) == 0:
         return None
     
+    if deadline is None:
+        deadline = time.time() + CPU_MOVE_DEADLINE
+    move_scores, _, _ = rank_moves_anytime(game_state, difficulty,
+                                           legal_move_candidates(game_state, legal_moves), deadline)
+    
+    # If no moves were successfully evaluated, return first move
+    if not move_scores:
+        return legal_moves[0] if legal_moves else None
+    
+    return choose_move_for_difficulty(move_scores, difficulty)
+
+
+def search_depth_for_difficulty(difficulty):
+    """
+    Plies of expectiminimax lookahead for a difficulty (1 = static ranking only)
+    Capped by SEARCH_MAX_DEPTH; deeper passes only run while the move deadline allows
+    """
+    if difficulty <= 4:
+        depth = 1
+    elif difficulty <= 8:
+        depth = 2
+    else:
+        depth = 3
+    return min(depth, SEARCH_MAX_DEPTH)
+
+
+def get_best_play(game_state, difficulty, plays, stats=None, deadline=None):
+    """
+    Pick a full-turn play (from movegen.generate_plays) for the CPU
+    Plays are already collapsed to unique resulting positions, so every
+    evaluation - including the GNU Backgammon batch - is spent on a distinct position.
+    
+    Without GNU Backgammon, stronger difficulties search opponent replies with
+    an n-ply expectiminimax search; pass a SearchStats as `stats` to get its node counts.
+    """
+    if not plays:
+        return None
+    
+    if deadline is None:
+        deadline = time.time() + CPU_MOVE_DEADLINE
+    move_scores, _, _ = rank_moves_anytime(game_state, difficulty, [(play, play.board) for play in plays],
+                                           deadline, searchable=True, stats=stats)
+    if not move_scores:
+        return plays[0]
+    return choose_move_for_difficulty(move_scores, difficulty)
+
+
+def rank_moves_anytime(game_state, difficulty, candidates, deadline, searchable=False, stats=None, executor=None):
+    """
+    Rank candidate moves by iterative deepening until `deadline` (a time.time() value)
+    Stages, each replacing the current answer once it completes:
+    - 'heuristic': the vectorized static evaluation
+    - 'gnubg': GNU Backgammon re-scores the top candidates (difficulties 7-9 when available)
+    - 'neural': otherwise the neural-network evaluator ranks them (difficulties 7-9 when loaded)
+    - 'search-2ply', 'search-3ply': expectiminimax search one ply deeper per pass, up to the
+      difficulty's depth, on the same static evaluator (only when `searchable`, i.e. the
+      moves are movegen plays)
+    
+    The stages run on `executor` (default MOVE_EXECUTOR); when the deadline expires the deepest completed
+    ranking is returned and the unfinished stage is cancelled (the search and any
+    GNU Backgammon call in flight stop, and the gnubg process is replaced).
+    Returns (move_scores, stage, deadline_reached); move_scores is None if not even the
+    heuristic ranking finished in time. `stats` (a SearchStats) receives the work of the
+    search passes behind the returned ranking; passes cut off by the deadline are left out.
+    """
+    # Replaced as a whole after each stage so the caller never sees a half-updated answer;
+    # the third item is the search work behind the ranking (as_dict() of completed passes)
+    current = [(None, None, None)]
+    search_timed_out = [False]
+    use_gnubg = GNUBG_AVAILABLE and difficulty >= 7
+    evaluate = static_evaluator_for_difficulty(difficulty)
+    
+    def deepen(cancel):
+        current[0] = (rank_candidates(game_state, difficulty, candidates, use_gnubg=False), 'heuristic', None)
+        cancel.check()
+        if use_gnubg:
+            current[0] = (rank_candidates(game_state, difficulty, candidates, cancel=cancel), 'gnubg', None)
+            return
+        if evaluate is not evaluate_positions_simple:
+            current[0] = (rank_candidates(game_state, difficulty, candidates, use_gnubg=False, evaluate=evaluate),
+                          'neural', None)
+            cancel.check()
+        if not searchable:
+            return
+        plays = [move for move, _ in candidates]
+        max_depth = search_depth_for_difficulty(difficulty)
+        if max_depth > 1 and SEARCH_PROCESS_POOL is not None and SEARCH_PROCESS_POOL.ready():
+            with metrics.stage('search'):
+                result = SEARCH_PROCESS_POOL.search(Board.from_game_state(game_state), remaining_dice(game_state),
+                                                    evaluate.__name__, max_depth, deadline, SEARCH_TOP_K,
+                                                    SEARCH_ROOT_TOP_K, cancel=cancel)
+            if result is not None and len(result[0]) == len(plays):
+                ranking, depth, job_stats = result
+                current[0] = ([{'move': plays[index], 'score': score} for index, score in ranking],
+                              f'search-{depth}ply', job_stats)
+                search_timed_out[0] = depth < max_depth
+                print(f"✓ {depth}-ply search in worker process: {job_stats['nodes']} nodes in "
+                      f"{job_stats['elapsed_ms']:.0f}ms")
+                return
+            cancel.check()
+        # Every pass counts into its own SearchStats: an abandoned pass may still be running
+        # when the response is built, so only completed passes are reported
+        completed = SearchStats()
+        for depth in range(2, max_depth + 1):
+            search = ExpectiminimaxSearch(evaluate, top_k=SEARCH_TOP_K, root_top_k=SEARCH_ROOT_TOP_K,
+                                          deadline=deadline, cancel=cancel)
+            try:
+                with metrics.stage('search'):
+                    ranked = search.rank(plays, game_state.get('currentPlayer', 2), depth)
+            except SearchTimeout:
+                search_timed_out[0] = True
+                print(f"ℹ {depth}-ply search stopped at the deadline, keeping the {current[0][1]} ranking")
+                return
+            completed.add(search.stats.as_dict())
+            current[0] = ([{'move': play, 'score': score} for play, score in ranked], f'search-{depth}ply',
+                          completed.as_dict())
+            print(f"✓ {depth}-ply search: {search.stats.nodes} nodes in {search.stats.elapsed * 1000:.0f}ms "
+                  f"({search.stats.nodes_per_second():.0f} nodes/s, {search.stats.cutoffs} cutoffs)")
+    
+    finished = (executor or MOVE_EXECUTOR).run(deepen, deadline - time.time())
+    move_scores, stage, search_work = current[0]
+    if stats is not None and search_work is not None:
+        stats.add(search_work)
+    if not finished:
+        print(f"⚠ Move deadline reached, returning the {stage or 'unranked'} answer")
+    return move_scores, stage, not finished or search_timed_out[0]
+
+
+def gnubg_candidates(quick_scores, difficulty, in_opening):
+    """The items of a quick-score ranking (best first) that GNU Backgammon re-scores"""
+    # For openings: evaluate top 2 moves only (openings usually have fewer legal moves, simple eval is good enough)
+    # For mid-game: evaluate top 2-3 moves only (this is enough to find the best move)
+    num_to_evaluate = 2 if in_opening else (3 if difficulty >= 9 else 2)
+    num_to_evaluate = min(num_to_evaluate, len(quick_scores))
+    
+    return [item for item in quick_scores[:num_to_evaluate] if item['board'] is not None]
+
+
+def rank_candidates(game_state, difficulty, candidates, use_gnubg=None, cancel=None, evaluate=None):
+    """
+    Score candidate moves, best first
+    candidates: list of (move, resulting Board or None if it could not be simulated)
+    use_gnubg: re-score the top candidates with GNU Backgammon (default: difficulties 7-9 when available)
+    evaluate: batch static evaluator for the first pass (default: evaluate_positions_simple)
+    cancel: CancelToken checked before and during the GNU Backgammon stage
+    Returns [{'move': move, 'score': score}, ...] sorted by score (higher is better for CPU)
+    """
     # Check if we're in the opening phase
     in_opening = is_opening_phase(game_state)
     
     # For high difficulties (7-9), use GNU Backgammon but VERY efficiently
     # Key optimization: Only evaluate top 2-3 moves with GNU Backgammon
     # This matches how GNU Backgammon desktop works - it evaluates the top candidates
-    use_gnubg = GNUBG_AVAILABLE and difficulty >= 7
+    if use_gnubg is None:
+        use_gnubg = GNUBG_AVAILABLE and difficulty >= 7
     
     # For ALL difficulties, start with fast simple evaluation to identify best candidates
-    # This is very fast (milliseconds) and accurate enough for initial filtering
-    quick_scores = []
-    for move in legal_moves:
-        try:
-            temp_state = apply_move(game_state.copy(), move)
-            quick_score = evaluate_position_simple(temp_state)
-            quick_scores.append({
-                'move': move,
-                'score': quick_score if quick_score is not None else 0.0
-            })
-        except:
-            quick_scores.append({
-                'move': move,
-                'score': 0.0
-            })
+    # All resulting positions are scored together in one vectorized pass
+    candidate_boards = [board for _, board in candidates if board is not None]
+    evaluate = evaluate or evaluate_positions_simple
+    with metrics.stage('heuristic' if evaluate is evaluate_positions_simple else 'neural'):
+        batch_scores = iter(evaluate(candidate_boards))
+    quick_scores = [{
+        'move': move,
+        'score': float(next(batch_scores)) if board is not None else 0.0,
+        'board': board
+    } for move, board in candidates]
     
     # Sort by quick score to identify top candidates
     quick_scores.sort(key=lambda x: x['score'], reverse=True)
@@ -996,45 +1370,47 @@ def get_best_move_simple(game_state, difficulty, legal_moves):
     # If using GNU Backgammon, ONLY evaluate the top 2-3 moves (not all!)
     # This is the key optimization - GNU Backgammon is slow, so we minimize calls
     if use_gnubg and len(quick_scores) > 1:
-        # For openings: evaluate top 2 moves only (openings usually have fewer legal moves, simple eval is good enough)
-        # For mid-game: evaluate top 2-3 moves only (this is enough to find the best move)
-        num_to_evaluate = 2 if in_opening else (3 if difficulty >= 9 else 2)
-        num_to_evaluate = min(num_to_evaluate, len(quick_scores))
+        top_items = []
+        for item in gnubg_candidates(quick_scores, difficulty, in_opening):
+            # Bear-offs take their exact equity, on the same scale as GNU Backgammon's
+            bearoff_equity = evaluate_bearoff(item['board'])
+            if bearoff_equity is None:
+                top_items.append(item)
+            else:
+                item['score'] = bearoff_equity
         
-        top_moves = [item['move'] for item in quick_scores[:num_to_evaluate]]
+        # Re-evaluate ONLY top moves with GNU Backgammon, all in one batch round-trip
+        if cancel is not None:
+            cancel.check()
+        gnubg_scores = None
+        try:
+            if top_items:
+                with metrics.stage('gnubg'):
+                    gnubg_scores = evaluate_positions_gnubg([item['board'].to_game_state() for item in top_items],
+                                                            cancel=cancel)
+        except Exception as e:
+            print(f"✗ Error preparing GNU Backgammon batch: {e}")
         
-        # Re-evaluate ONLY top moves with GNU Backgammon
-        move_scores = []
-        for item in quick_scores:
-            move = item['move']
-            if move in top_moves:
-                try:
-                    temp_state = apply_move(game_state.copy(), move)
-                    # Evaluate with GNU Backgammon (has 1-second timeout per call)
-                    gnubg_score = evaluate_position_gnubg(temp_state)
-                    # Use GNU Backgammon score if available, otherwise use quick score
-                    final_score = gnubg_score if gnubg_score is not None else item['score']
-                    move_scores.append({
-                        'move': move,
-                        'score': final_score
-                    })
-                except Exception as e:
-                    # If GNU Backgammon fails, use the quick score
-                    move_scores.append(item)
-            else:
-                # For moves not in top 2-3, use quick score (not evaluated with GNU)
-                move_scores.append(item)
-    else:
-        # Not using GNU Backgammon, use simple evaluation for all moves
-        move_scores = quick_scores
-    
-    # If no moves were successfully evaluated, return first move
-    if not move_scores:
-        return legal_moves[0] if legal_moves else None
+        if gnubg_scores is None:
+            if top_items:
+                metrics.count('gnubg_fallback')
+        else:
+            for item, gnubg_score in zip(top_items, gnubg_scores):
+                # Use GNU Backgammon score if available, otherwise keep the quick score
+                if gnubg_score is not None:
+                    item['score'] = gnubg_score
     
     # Sort by score (higher is better for CPU)
+    move_scores = [{'move': item['move'], 'score': item['score']} for item in quick_scores]
     move_scores.sort(key=lambda x: x['score'], reverse=True)
-    
+    return move_scores
+
+
+def choose_move_for_difficulty(move_scores, difficulty):
+    """
+    Pick a move from ranked candidates (best first) according to difficulty
+    Lower difficulties deliberately choose weaker moves more often
+    """
     # Dramatically improved difficulty scaling to match FIBS rating system:
     # For difficulties 7-9, use GNU Backgammon evaluation and make errors very rarely
     # Level 1 (800 rating): 8% accuracy - makes terrible moves
@@ -1143,186 +1519,579 @@ def get_best_move_simple(game_state, difficulty, legal_moves):
 def apply_move(game_state, move):
     """
     Apply a move to game state for evaluation purposes
-    Creates a copy of the game state with the move applied
+    Returns a new gameState with the move applied (thin JSON wrapper around apply_legal_move)
+    """
+    board = Board.from_game_state(game_state).copy()
+    apply_legal_move(board, move)
+    return board.to_game_state()
+
+
+def apply_legal_move(board, move):
+    """
+    Apply a move from the frontend's legalMoves list to a Board in place
+    Returns an undo token for board.undo(), or None if the position is unchanged
+    
+    Moves can be:
+    - Integer: destination point (regular move)
+    - String "bearoff": single bearoff
+    - String "bearoff|sum|i,j": bearoff using sum of two dice
+    - String "point|steps|type|dice": complex move format
     """
-    import copy
-    
-    # Deep copy the game state
-    new_state = copy.deepcopy(game_state)
-    
-    # Get move details
-    checkers = new_state.get('checkers', [])
-    bar = new_state.get('bar', {})
-    borne_off = new_state.get('borneOff', {})
-    current_player = new_state.get('currentPlayer', 1)
-    used_dice = new_state.get('usedDice', [])
-    
-    # Parse move format
-    # Moves can be:
-    # - Integer: destination point (regular move)
-    # - String "bearoff": single bearoff
-    # - String "bearoff|sum|i,j": bearoff using sum of two dice
-    # - String "point|steps|type|dice": complex move format
-    
     if isinstance(move, int):
         # Simple destination point (we can't simulate this properly without knowing the source)
-        # For evaluation, we'll just return the state unchanged
+        # For evaluation, we'll just leave the position unchanged
         # The actual move evaluation will be done by the frontend before sending moves
-        return new_state
-    elif isinstance(move, str):
-        if move == 'bearoff':
-            # Single bearoff - remove one checker from home and add to borne off
-            home_quadrant = [18, 19, 20, 21, 22, 23] if current_player == 1 else [0, 1, 2, 3, 4, 5]
-            home_checkers = [c for c in checkers if c.get('player') == current_player and c.get('point') in home_quadrant]
-            if home_checkers:
-                # Remove the farthest checker (highest point for player 1, lowest for player 2)
-                if current_player == 1:
-                    farthest = max(home_checkers, key=lambda c: c.get('point', 0))
-                else:
-                    farthest = min(home_checkers, key=lambda c: c.get('point', 23))
-                
-                checkers.remove(farthest)
-                borne_off[str(current_player)] = borne_off.get(str(current_player), 0) + 1
-        elif move.startswith('bearoff|sum|'):
-            # Bearoff using sum of dice
-            parts = move.split('|')
-            if len(parts) >= 3:
-                home_quadrant = [18, 19, 20, 21, 22, 23] if current_player == 1 else [0, 1, 2, 3, 4, 5]
-                home_checkers = [c for c in checkers if c.get('player') == current_player and c.get('point') in home_quadrant]
-                if home_checkers:
-                    if current_player == 1:
-                        farthest = max(home_checkers, key=lambda c: c.get('point', 0))
-                    else:
-                        farthest = min(home_checkers, key=lambda c: c.get('point', 23))
-                    checkers.remove(farthest)
-                    borne_off[str(current_player)] = borne_off.get(str(current_player), 0) + 1
-    
-    new_state['checkers'] = checkers
-    new_state['bar'] = bar
-    new_state['borneOff'] = borne_off
-    
-    return new_state
+        return None
+    
+    if isinstance(move, str) and (move == 'bearoff' or move.startswith('bearoff|sum|')):
+        # Bearoff (single die or sum of dice) - remove one checker from home and add to borne off
+        player = board.current_player
+        home_points = np.flatnonzero(board.points[player - 1][HOME_BOARD[player]]) + HOME_BOARD[player].start
+        if len(home_points):
+            # Remove the farthest checker (highest point for player 1, lowest for player 2)
+            farthest = int(home_points[-1]) if player == 1 else int(home_points[0])
+            return board.apply(player, farthest, OFF)
+    
+    return None
 
 
-@app.route('/api/cpu/move', methods=['POST'])
-def get_cpu_move():
+def turn_plays(game_state):
+    """Full-turn plays for the dice still to be played, or None when the dice are unknown"""
+    dice = remaining_dice(game_state)
+    if not dice:
+        return None
+    try:
+        board = Board.from_game_state(game_state)
+        return generate_plays(board, game_state.get('currentPlayer', 2), dice)
+    except Exception as e:
+        print(f"✗ Error generating plays: {e}")
+        return None
+
+
+def _play_cache_key(board, dice, difficulty):
+    return eval_cache_key(board, f"play:{difficulty}:{','.join(map(str, sorted(dice)))}")
+
+
+def remember_play(game_state, play, dice, difficulty, stage):
     """
-    Calculate CPU move based on game state and difficulty
-    Has a 5-second timeout - will return best move found so far or fallback
+    Keep the chosen play for the rest of the turn: the frontend moves one checker
+    per /api/cpu/move request, so each position it will ask about after the first
+    step (with the dice then left) maps to the play's final position in EVAL_CACHE.
     """
-    import signal
-    import threading
-    
+    board = Board.from_game_state(game_state).copy()
+    player = game_state.get('currentPlayer', 2)
+    dice = list(dice)
+    final_key = play.board.key()
+    for frm, to, die in play.steps[:-1]:
+        board.apply(player, frm, to)
+        if die not in dice:
+            return
+        dice.remove(die)
+        EVAL_CACHE.put(_play_cache_key(board, dice, difficulty), (final_key, stage))
+
+
+def remembered_play(game_state, plays, dice, difficulty):
+    """(play, stage) chosen earlier in this turn (see remember_play), or (None, None)"""
+    cached = EVAL_CACHE.get(_play_cache_key(Board.from_game_state(game_state), dice, difficulty))
+    if cached is None:
+        return None, None
+    final_key, stage = cached
+    return next((play for play in plays if play.board.key() == final_key), None), stage
+
+
+def compute_cpu_move(game_state, difficulty, legal_moves, deadline_ms=None, plays=None, executor=None):
+    """
+    CPU move for one game state: (response dict, HTTP status)
+    Ranks moves by iterative deepening and returns the best move found when the
+    deadline (CPU_MOVE_DEADLINE, or `deadline_ms`) expires. `plays` may be
+    passed in when the caller has already generated them (see turn_plays), and
+    `executor` is where the ranking stages run (see rank_moves_anytime).
+    Later steps of a turn continue the play chosen for its first step instead of
+    ranking again (see remember_play).
+    """
+    metrics.set_difficulty(difficulty)
     try:
-        data = request.json
-        game_state = data.get('gameState')
-        difficulty = data.get('difficulty', 5)
-        legal_moves = data.get('legalMoves', [])
-        
-        if not game_state:
-            return jsonify({'error': 'Game state required'}), 400
+        # Generate full-turn plays server-side when the dice are known
+        dice = remaining_dice(game_state)
+        if plays is None:
+            with metrics.stage('movegen'):
+                plays = turn_plays(game_state)
         
-        if not legal_moves:
-            return jsonify({'error': 'No legal moves available', 'move': None}), 400
+        if not legal_moves and not plays:
+            return {'error': 'No legal moves available', 'move': None}, 400
         
-        # Use timeout mechanism - return within 5 seconds max
+        # Anytime selection: the deepest ranking finished by the deadline is used
+        deadline_seconds = CPU_MOVE_DEADLINE
+        if deadline_ms is not None:
+            deadline_seconds = max(0.05, float(deadline_ms) / 1000.0)
+        deadline = time.time() + deadline_seconds
         best_move = None
-        timeout_occurred = [False]  # Use list to allow modification in nested function
+        best_play = None
+        stage = None
+        deadline_reached = False
+        search_stats = SearchStats()
         
-        def move_selection():
-            nonlocal best_move
-            try:
-                best_move = get_best_move_simple(game_state, difficulty, legal_moves)
-            except Exception as e:
-                print(f"Error in move selection: {e}")
-                best_move = legal_moves[0] if legal_moves else None
+        def play_first_move(play):
+            # The frontend applies one checker at a time: return the play's first step in its format
+            if legal_moves:
+                return match_legal_move(play.steps[0], legal_moves)
+            return step_to_legal_move(play.steps[0], game_state)
         
-        # Run move selection in a thread with timeout
-        thread = threading.Thread(target=move_selection)
-        thread.daemon = True
-        thread.start()
-        thread.join(timeout=5.0)  # Wait max 5 seconds
+        # A later step of a turn whose play was chosen already
+        if plays:
+            play, cached_stage = remembered_play(game_state, plays, dice, difficulty)
+            move = play_first_move(play) if play else None
+            if move is not None:
+                best_play, best_move, stage = play, move, cached_stage
+                metrics.count('play_cache_hit')
         
-        if thread.is_alive():
-            # Timeout occurred - use fallback
-            timeout_occurred[0] = True
-            print(f"⚠ Move selection timed out after 5 seconds, using fast fallback")
-            # Use simple heuristic: pick first move or random from first 3
-            if len(legal_moves) > 0:
-                best_move = legal_moves[0] if difficulty <= 5 else random.choice(legal_moves[:min(3, len(legal_moves))])
+        # Opening book: the stronger the level, the more often the book play is used
+        if plays and best_move is None and random.random() < get_accuracy_for_difficulty(difficulty):
+            with metrics.stage('book'):
+                play = book_play(game_state, plays, dice)
+                move = play_first_move(play) if play else None
+            if move is not None:
+                best_play, best_move, stage = play, move, 'book'
         
-        # If no move was selected (shouldn't happen but safety check)
-        if best_move is None:
-            best_move = legal_moves[0] if legal_moves else None
+        if plays and best_move is None:
+            move_scores, stage, deadline_reached = rank_moves_anytime(
+                game_state, difficulty, [(play, play.board) for play in plays], deadline,
+                searchable=True, stats=search_stats, executor=executor)
+            with metrics.stage('selection'):
+                chosen = choose_move_for_difficulty(move_scores, difficulty) if move_scores else None
+                move = play_first_move(chosen) if chosen else None
+            if move is not None:
+                best_play, best_move = chosen, move
         
-        # If no move was returned, use the first legal move as fallback
         if best_move is None and legal_moves:
-            print(f"Warning: get_best_move_simple returned None, using first legal move as fallback")
-            best_move = legal_moves[0]
+            move_scores, stage, reached = rank_moves_anytime(
+                game_state, difficulty, legal_move_candidates(game_state, legal_moves), deadline,
+                executor=executor)
+            deadline_reached = deadline_reached or reached
+            with metrics.stage('selection'):
+                best_move = choose_move_for_difficulty(move_scores, difficulty) if move_scores else None
+        
+        if best_move is None:
+            # Not even the heuristic ranking finished in time
+            stage = 'unranked'
+            metrics.count('unranked_fallback')
+            if legal_moves:
+                best_move = legal_moves[0]
+            elif plays:
+                best_play = plays[0]
+                best_move = play_first_move(best_play)
         
         if best_move is None:
             print(f"Error: No valid moves available (legal_moves was empty or all evaluations failed)")
-            return jsonify({'error': 'No valid moves available', 'move': None}), 400
+            return {'error': 'No valid moves available', 'move': None}, 400
         
         accuracy = get_accuracy_for_difficulty(difficulty)
-        method_note = 'timeout-fallback' if timeout_occurred[0] else 'evaluated'
+        metrics.count_move(stage)
+        if deadline_reached:
+            metrics.count('deadline_reached')
         
-        return jsonify({
+        response = {
             'move': best_move,
-            'method': method_note,
+            'method': stage,
             'difficulty': difficulty,
-            'note': f'Move selected (timeout: {timeout_occurred[0]}, accuracy: {accuracy:.1%})'
-        })
+            'deadline_reached': deadline_reached,
+            'note': f'Move selected (stage: {stage}, deadline reached: {deadline_reached}, accuracy: {accuracy:.1%})'
+        }
+        if best_play is not None:
+            response['moves'] = steps_to_json(best_play.steps)
+            response['from'] = best_play.steps[0][0]
+            remember_play(game_state, best_play, dice, difficulty, stage)
+        if search_stats.depth > 1:
+            response['search'] = search_stats.as_dict()
+        return response, 200
     
     except Exception as e:
         import traceback
         print(f"Error calculating CPU move: {e}")
         traceback.print_exc()
+        metrics.count('error')
         # Return first legal move as emergency fallback
-        legal_moves = request.json.get('legalMoves', []) if request.json else []
         fallback_move = legal_moves[0] if legal_moves else None
-        return jsonify({'error': str(e), 'move': fallback_move}), 500
+        return {'error': str(e), 'move': fallback_move}, 500
+
+
+@app.route('/api/cpu/move', methods=['POST'])
+@metrics.instrument('/api/cpu/move')
+def get_cpu_move():
+    """
+    Calculate CPU move based on game state and difficulty
+    'method' reports the stage reached: heuristic, gnubg, search-2ply, search-3ply
+    (or unranked if nothing finished in time), or 'book' for an opening book play.
+    
+    When the dice are known (gameState.movesAllowed/usedDice or gameState.dice),
+    the server generates the full-turn plays itself, so legalMoves is optional.
+    The response then also carries the whole chosen play in 'moves', and in
+    'from' the point (or 'bar') of the checker that 'move' applies to, since a
+    legalMoves entry only names the destination.
+    
+    The body is either JSON ({gameState, difficulty, legalMoves, deadlineMs}) or
+    the binary move_wire request (Content-Type MOVE_MEDIA_TYPE). A binary request
+    is answered in binary when its Accept header includes MOVE_MEDIA_TYPE; errors
+    are always JSON.
+    """
+    with metrics.stage('parse'):
+        if request.mimetype == MOVE_MEDIA_TYPE:
+            try:
+                game_state, difficulty, deadline_ms = decode_move_request(request.get_data())
+            except ValueError as e:
+                return jsonify({'error': f'Invalid move request: {e}'}), 400
+            legal_moves = []
+        else:
+            data = request.get_json(silent=True) or {}
+            game_state = data.get('gameState')
+            difficulty = data.get('difficulty', 5)
+            legal_moves = data.get('legalMoves', [])
+            deadline_ms = data.get('deadlineMs')
+            if not game_state:
+                return jsonify({'error': 'Game state required'}), 400
+    
+    response, status = compute_cpu_move(game_state, difficulty, legal_moves, deadline_ms)
+    with metrics.stage('serialization'):
+        if (status == 200 and 'moves' in response and request.mimetype == MOVE_MEDIA_TYPE and
+                MOVE_MEDIA_TYPE in request.accept_mimetypes.values()):
+            return Response(encode_move_response(response), mimetype=MOVE_MEDIA_TYPE)
+        return jsonify(response), status
+
+
+def prefetch_move_evaluations(jobs):
+    """
+    Score the candidate plays of several games together before each game is ranked
+    One vectorized heuristic pass (plus one neural-network pass for the levels
+    that use it) covers every game's plays, and the candidates each level 7-9
+    game re-scores with GNU Backgammon go to gnubg as one batch. The results land
+    in EVAL_CACHE, where the per-game ranking then finds them.
+    jobs: list of (game_state, difficulty, plays)
+    """
+    boards, nn_boards = [], []
+    for _, difficulty, plays in jobs:
+        boards.extend(play.board for play in plays)
+        if static_evaluator_for_difficulty(difficulty) is evaluate_positions_nn:
+            nn_boards.extend(play.board for play in plays)
+    if not boards:
+        return
+    scores = evaluate_positions_simple(boards)
+    if nn_boards:
+        evaluate_positions_nn(nn_boards)
+    if not GNUBG_AVAILABLE:
+        return
+    
+    # Same candidates as rank_candidates picks from the heuristic ranking
+    gnubg_states = []
+    offset = 0
+    for game_state, difficulty, plays in jobs:
+        game_scores = scores[offset:offset + len(plays)]
+        offset += len(plays)
+        if difficulty < 7 or len(plays) < 2:
+            continue
+        quick_scores = [{'board': play.board, 'score': float(score)} for play, score in zip(plays, game_scores)]
+        quick_scores.sort(key=lambda x: x['score'], reverse=True)
+        gnubg_states.extend(item['board'].to_game_state()
+                            for item in gnubg_candidates(quick_scores, difficulty, is_opening_phase(game_state)))
+    if gnubg_states:
+        evaluate_positions_gnubg(gnubg_states)
+
+
+def compute_cpu_moves(requests):
+    """
+    CPU moves for several independent games: one (response dict, status) per request
+    requests: list of (game_state, difficulty, legal_moves, deadline_ms)
+    
+    The games share the evaluation passes (see prefetch_move_evaluations), then
+    each is ranked with its own deadline as in compute_cpu_move, side by side on
+    MOVE_BATCH_EXECUTOR. Each game's ranking stages run inline on its batch
+    thread: on the much smaller MOVE_EXECUTOR, the games past its first few
+    would reach their deadline in its queue and get no search at all.
+    A game whose request cannot be read gets a 400 result of its own.
+    """
+    results = [None] * len(requests)
+    jobs = []
+    for index, (game_state, difficulty, legal_moves, deadline_ms) in enumerate(requests):
+        try:
+            jobs.append((index, game_state, difficulty, legal_moves, deadline_ms, turn_plays(game_state)))
+        except Exception as e:
+            results[index] = ({'error': f'Invalid move request: {e}', 'move': None}, 400)
+    
+    start_time = time.time()
+    try:
+        with metrics.stage('prefetch'):
+            prefetch_move_evaluations([(game_state, difficulty, plays)
+                                       for _, game_state, difficulty, _, _, plays in jobs if plays])
+    except Exception as e:
+        # Only a head start: each game is still evaluated on its own below
+        print(f"✗ Error prefetching batch evaluations: {e}")
+    prefetch_ms = (time.time() - start_time) * 1000
+    
+    def compute(job):
+        index, game_state, difficulty, legal_moves, deadline_ms, plays = job
+        
+        def run(cancel):
+            results[index] = compute_cpu_move(game_state, difficulty, legal_moves, deadline_ms, plays=plays,
+                                              executor=InlineExecutor())
+        return run
+    
+    # Every game returns by its own deadline; the margin covers the work after it
+    longest = max([CPU_MOVE_DEADLINE if job[4] is None else max(0.05, float(job[4]) / 1000.0) for job in jobs],
+                  default=0.0)
+    MOVE_BATCH_EXECUTOR.run_all([compute(job) for job in jobs], longest + 1.0)
+    for index, result in enumerate(results):
+        if result is None:
+            results[index] = ({'error': 'Move computation did not finish', 'move': None}, 504)
+            metrics.count('timeout')
+    print(f"✓ Move batch: {len(jobs)} games in {(time.time() - start_time) * 1000:.0f}ms "
+          f"(shared evaluation {prefetch_ms:.0f}ms)")
+    return results
+
+
+@app.route('/api/cpu/move/batch', methods=['POST'])
+@metrics.instrument('/api/cpu/move/batch')
+def get_cpu_moves_batch():
+    """
+    CPU moves for many games at once (see compute_cpu_moves)
+    JSON body: {"requests": [{gameState, difficulty, legalMoves, deadlineMs}, ...]},
+    answered with {"results": [...]} in request order; each result is the
+    /api/cpu/move response plus its 'status', so one failing game does not fail
+    the others. A binary body is the concatenation of move_wire requests and is
+    answered with move_wire batch records when Accept includes MOVE_MEDIA_TYPE.
+    At most MOVE_BATCH_MAX_ITEMS games per request.
+    """
+    binary = request.mimetype == MOVE_MEDIA_TYPE
+    # Items that cannot be parsed get their error here; the rest are computed together
+    results, requests, indexes = [], [], []
+    if binary:
+        try:
+            items = split_move_batch(request.get_data())
+        except ValueError as e:
+            return jsonify({'error': f'Invalid batch request: {e}'}), 400
+    else:
+        items = (request.get_json(silent=True) or {}).get('requests')
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'requests list required'}), 400
+    if len(items) > MOVE_BATCH_MAX_ITEMS:
+        return jsonify({'error': f'At most {MOVE_BATCH_MAX_ITEMS} games per batch'}), 413
+    
+    for item in items:
+        results.append(None)
+        if binary:
+            try:
+                game_state, difficulty, deadline_ms = decode_move_request(item)
+            except ValueError as e:
+                results[-1] = ({'error': f'Invalid move request: {e}', 'move': None}, 400)
+                continue
+            requests.append((game_state, difficulty, [], deadline_ms))
+        elif not isinstance(item, dict) or not item.get('gameState'):
+            results[-1] = ({'error': 'Game state required', 'move': None}, 400)
+            continue
+        else:
+            requests.append((item['gameState'], item.get('difficulty', 5), item.get('legalMoves', []),
+                             item.get('deadlineMs')))
+        indexes.append(len(results) - 1)
+    
+    for index, result in zip(indexes, compute_cpu_moves(requests)):
+        results[index] = result
+    with metrics.stage('serialization'):
+        if binary and MOVE_MEDIA_TYPE in request.accept_mimetypes.values():
+            return Response(encode_move_batch_response(results), mimetype=MOVE_MEDIA_TYPE)
+        return jsonify({'results': [dict(response, status=status) for response, status in results]})
 
 
 @app.route('/api/cpu/double', methods=['POST'])
+@metrics.instrument('/api/cpu/double')
 def should_double():
     """
-    Determine if CPU should offer/accept double based on position
+    Cube decisions for the CPU from no-double / double-take / double-pass equities
+    Offer, take and beaver decisions come back together: with action 'offer' the
+    CPU is the doubler, with action 'accept' the player has doubled and 'take' /
+    'beaver' are the CPU's answer (without an action the side on roll doubles).
+    'should' answers the requested action.
+    
+    Optional gameState keys: cubeValue (or gameStakes), cubeOwner, and for match
+    play matchLength, matchScore and crawford (see match_state).
     """
     try:
-        data = request.json
-        game_state = data.get('gameState')
-        difficulty = data.get('difficulty', 5)
-        action = data.get('action')  # 'offer' or 'accept'
+        with metrics.stage('parse'):
+            data = request.json
+            game_state = data.get('gameState')
+            difficulty = data.get('difficulty', 5)
+            action = data.get('action')  # 'offer' or 'accept'
         
         if not game_state:
             return jsonify({'error': 'Game state required'}), 400
-        
-        # Simple evaluation
-        evaluation = evaluate_position_simple(game_state)
+        metrics.set_difficulty(difficulty)
         
         if action == 'offer':
-            # Offer double if CPU has 80%+ win chance
-            # evaluation range: -1 (0% win) to 1 (100% win)
-            # 80% win = (evaluation + 1) / 2 = 0.8, so evaluation = 0.6
-            should_offer = evaluation > 0.6
-        else:  # accept
-            # Accept double if CPU has >30% win chance
-            # 30% win = (evaluation + 1) / 2 = 0.3, so evaluation = -0.4
-            should_accept = evaluation > -0.4
+            doubler = 2
+        elif action == 'accept':
+            doubler = 1
+        else:
+            doubler = int(game_state.get('currentPlayer', 2))
+        
+        with metrics.stage('evaluation'):
+            analysis = cube_analysis(game_state, doubler)
+        # No-double equity as the CPU sees it (-1 .. 1 per unit of cube value)
+        evaluation = analysis['normalized']['noDouble']
         
-        return jsonify({
-            'should': should_offer if action == 'offer' else should_accept,
-            'evaluation': evaluation,
-            'difficulty': difficulty
+        response = dict(analysis)
+        response.update({
+            'should': analysis['offer'] if doubler == 2 else analysis['take'],
+            'doubler': doubler,
+            'evaluation': evaluation if doubler == 2 else -evaluation,
+            'difficulty': difficulty,
         })
+        with metrics.stage('serialization'):
+            return jsonify(response)
     
     except Exception as e:
         print(f"Error evaluating double: {e}")
+        metrics.count('error')
         return jsonify({'error': str(e)}), 500
 
 
+def analysis_evaluator():
+    """Static evaluator for game analysis and its method name"""
+    if NN_EVALUATOR is not None:
+        return evaluate_positions_nn, 'neural'
+    return evaluate_positions_simple, 'heuristic'
+
+
+def analyze_turn(turn, plies=1, deadline=None, cancel=None):
+    """
+    The play made in one turn (a game_analysis.Turn) against the best play
+    Returns a JSON-ready row with both plays in notation, their equities from the
+    mover's point of view and the 'loss' (0 for the best play). GNU Backgammon
+    re-scores the ANALYSIS_GNUBG_CANDIDATES best plays by the static evaluator and
+    the one played; without it the static evaluator scores every play, looking
+    `plies` ahead with the search when plies > 1.
+    """
+    row = {'index': turn.index, 'player': turn.player, 'dice': turn.dice}
+    if turn.played is not None:
+        row['played'] = format_play(turn.player, turn.played.steps, turn.board)
+    if turn.error:
+        row['error'] = turn.error
+        return row
+    if len(turn.plays) <= 1:
+        row.update({'best': row.get('played', '-'), 'forced': True, 'loss': 0.0})
+        return row
+    
+    plays = turn.plays
+    played_index = next(index for index, play in enumerate(plays) if play is turn.played)
+    # Evaluators score for the CPU (player 2)
+    sign = 1.0 if turn.player == 2 else -1.0
+    evaluate, method = analysis_evaluator()
+    with metrics.stage(method):
+        static = [sign * float(score) for score in evaluate([play.board for play in plays])]
+    equities = dict(enumerate(static))
+    
+    if GNUBG_AVAILABLE:
+        candidates = sorted(range(len(plays)), key=lambda index: static[index], reverse=True)
+        candidates = candidates[:ANALYSIS_GNUBG_CANDIDATES]
+        if played_index not in candidates:
+            candidates.append(played_index)
+        with metrics.stage('gnubg'):
+            gnubg_scores = evaluate_positions_gnubg([plays[index].board.to_game_state() for index in candidates],
+                                                    cancel=cancel)
+        if gnubg_scores is not None and None not in gnubg_scores:
+            equities = {index: sign * score for index, score in zip(candidates, gnubg_scores)}
+            method = 'gnubg'
+    elif plies > 1:
+        search = ExpectiminimaxSearch(evaluate, top_k=SEARCH_TOP_K, root_top_k=SEARCH_ROOT_TOP_K,
+                                      deadline=deadline, cancel=cancel)
+        try:
+            with metrics.stage('search'):
+                best_play, best_score = search.rank(plays, turn.player, plies)[0]
+                best_index = next(index for index, play in enumerate(plays) if play is best_play)
+                equities = {best_index: sign * best_score}
+                if best_index != played_index:
+                    # Searched on its own for an exact value (in the ranking it may only be a bound)
+                    equities[played_index] = sign * search.rank([turn.played], turn.player, plies)[0][1]
+            method = f'search-{plies}ply'
+        except SearchTimeout:
+            metrics.count('deadline_reached')
+    
+    best_index = max(equities, key=equities.get)
+    row.update({
+        'best': format_play(turn.player, plays[best_index].steps, turn.board),
+        'playedEquity': round(equities[played_index], 4),
+        'bestEquity': round(equities[best_index], 4),
+        'loss': round(equities[best_index] - equities[played_index], 4),
+        'method': method,
+    })
+    return row
+
+
+@app.route('/api/analyze/game', methods=['POST'])
+@metrics.instrument('/api/analyze/game')
+def analyze_game():
+    """
+    Whole-game analysis, streamed one line per turn as the turns are evaluated
+    Body: {"moves": [...]} (the move log, see game_analysis.py), optionally with
+    "gameState" (starting position and first player when not the usual start) and
+    "plies" (look-ahead without GNU Backgammon, default 1).
+    
+    Turns are evaluated side by side on GAME_ANALYSIS_EXECUTOR, after one
+    vectorized pass has put every turn's plays in EVAL_CACHE, and stream out in
+    the order they finish (see analyze_turn; 'index' is the turn's position in the
+    log). Turns not done within GAME_ANALYSIS_DEADLINE come back with an 'error'.
+    A final line {"done": true, "turns": n, "loss": {"1": ..., "2": ...}, "elapsedMs": ...}
+    sums each side's losses.
+    
+    The stream is NDJSON (application/x-ndjson), or server-sent events when the
+    Accept header asks for text/event-stream.
+    """
+    data = request.get_json(silent=True) or {}
+    moves = data.get('moves')
+    if not isinstance(moves, list) or not moves:
+        return jsonify({'error': 'moves list required'}), 400
+    game_state = data.get('gameState')
+    try:
+        board = Board.from_game_state(game_state).copy() if game_state else starting_board()
+        plies = max(1, min(int(data.get('plies', 1)), SEARCH_MAX_DEPTH))
+        turns = replay_game(board, moves, first_player=int((game_state or {}).get('currentPlayer', 1)))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid move log: {e}'}), 400
+    
+    start_time = time.time()
+    deadline = start_time + GAME_ANALYSIS_DEADLINE
+    evaluate, _ = analysis_evaluator()
+    evaluate([play.board for turn in turns for play in turn.plays])
+    rows = [None] * len(turns)
+    
+    def analyze(turn):
+        def run(cancel):
+            rows[turn.index] = analyze_turn(turn, plies, deadline, cancel)
+        return run
+    
+    event_stream = 'text/event-stream' in request.accept_mimetypes.values()
+    
+    def line(row):
+        return f"data: {json.dumps(row)}\n\n" if event_stream else json.dumps(row) + '\n'
+    
+    def stream():
+        loss = {'1': 0.0, '2': 0.0}
+        finished = set()
+        for index in GAME_ANALYSIS_EXECUTOR.run_each([analyze(turn) for turn in turns], deadline - time.time()):
+            finished.add(index)
+            row = rows[index] or {'index': index, 'player': turns[index].player, 'error': 'analysis failed'}
+            loss[str(row['player'])] += row.get('loss', 0.0)
+            yield line(row)
+        for index, turn in enumerate(turns):
+            if index not in finished:
+                yield line({'index': index, 'player': turn.player, 'error': 'analysis deadline reached'})
+        elapsed_ms = (time.time() - start_time) * 1000
+        print(f"✓ Game analysis: {len(turns)} turns in {elapsed_ms:.0f}ms")
+        yield line({'done': True, 'turns': len(turns), 'loss': {player: round(value, 4) for player, value in loss.items()},
+                    'elapsedMs': round(elapsed_ms)})
+    
+    return Response(stream_with_context(metrics.stream(stream())),
+                    mimetype='text/event-stream' if event_stream else 'application/x-ndjson')
+
+
 @app.route('/api/evaluate', methods=['POST'])
+@metrics.instrument('/api/evaluate')
 def evaluate_position():
     """
     Evaluate current game position
@@ -1330,29 +2099,48 @@ def evaluate_position():
     Uses GNU Backgammon if available, otherwise falls back to simple evaluation
     """
     try:
-        data = request.json
-        game_state = data.get('gameState')
-        
-        if not game_state:
-            return jsonify({'error': 'Game state required'}), 400
+        with metrics.stage('parse'):
+            data = request.json
+            game_state = data.get('gameState')
+            
+            if not game_state:
+                return jsonify({'error': 'Game state required'}), 400
+            board = Board.from_game_state(game_state)
         
-        # Try GNU Backgammon first, fallback to simple evaluation
-        if GNUBG_AVAILABLE:
-            evaluation = evaluate_position_gnubg(game_state)
-            if evaluation is None:
-                print("  → Using simple evaluation (fallback)")
-                evaluation = evaluate_position_simple(game_state)
+        # Bear-offs are looked up exactly; otherwise try GNU Backgammon first, then the
+        # neural network, fallback to simple evaluation
+        with metrics.stage('evaluation'):
+            bearoff_equity = evaluate_bearoff(board)
+            probabilities = None
+            if bearoff_equity is not None:
+                print(f"  → Using bear-off database: {bearoff_equity:.4f}")
+                evaluation = bearoff_equity
+            elif GNUBG_AVAILABLE:
+                evaluation = evaluate_position_gnubg(game_state)
+                if evaluation is None:
+                    print("  → Using simple evaluation (fallback)")
+                    metrics.count('gnubg_fallback')
+                    evaluation = evaluate_position_simple(game_state)
+                else:
+                    print(f"  → Using GNU Backgammon evaluation: {evaluation:.4f}")
+            elif NN_EVALUATOR is not None:
+                probabilities = NN_EVALUATOR.probabilities([board])[0]
+                evaluation = float(evaluate_positions_nn([board])[0])
+                print(f"  → Using neural network evaluation: {evaluation:.4f}")
             else:
-                print(f"  → Using GNU Backgammon evaluation: {evaluation:.4f}")
-        else:
-            print("  → Using simple evaluation (GNU Backgammon not available)")
-            evaluation = evaluate_position_simple(game_state)
+                print("  → Using simple evaluation (GNU Backgammon not available)")
+                evaluation = evaluate_position_simple(game_state)
         
-        return jsonify({
-            'evaluation': evaluation
-        })
+        with metrics.stage('serialization'):
+            response = {
+                'evaluation': evaluation
+            }
+            if probabilities is not None:
+                response['probabilities'] = probabilities_json(probabilities)
+            return jsonify(response)
     except Exception as e:
         print(f"Error evaluating position: {e}")
+        metrics.count('error')
         return jsonify({'error': str(e)}), 500
 
 
@@ -1362,10 +2150,94 @@ def health_check():
     return jsonify({
         'status': 'ok',
         'gnubg_available': GNUBG_AVAILABLE,
+        'gnubg_pool': GNUBG_POOL.stats() if GNUBG_POOL else None,
+        'move_executor': MOVE_EXECUTOR.stats(),
+        'move_batch_executor': MOVE_BATCH_EXECUTOR.stats(),
+        'game_analysis_executor': GAME_ANALYSIS_EXECUTOR.stats(),
+        'search_process_pool': SEARCH_PROCESS_POOL.stats() if SEARCH_PROCESS_POOL else None,
+        'eval_cache': EVAL_CACHE.stats(),
+        'bearoff_db': BEAROFF_DB is not None,
+        'bearoff2_db': BEAROFF2_DB is not None,
+        'nn_evaluator': NN_EVALUATOR is not None,
+        'match_equity_table': MATCH_EQUITY_TABLE.size if MATCH_EQUITY_TABLE is not None else None,
+        'opening_book': len(OPENING_BOOK) if OPENING_BOOK is not None else 0,
         'service': 'python_ai'
     })
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Prometheus metrics for this service worker (text exposition format)
+    Request and per-stage latency histograms and the cache hit / timeout /
+    fallback counters (see metrics.py), plus the pool, executor and cache
+    numbers of /api/health as gauges.
+    """
+    lines = [metrics.REGISTRY.render().rstrip('\n')]
+    for prefix, stats in (('backgammon_eval_cache', EVAL_CACHE.stats()),
+                          ('backgammon_move_executor', MOVE_EXECUTOR.stats()),
+                          ('backgammon_move_batch_executor', MOVE_BATCH_EXECUTOR.stats()),
+                          ('backgammon_game_analysis_executor', GAME_ANALYSIS_EXECUTOR.stats()),
+                          ('backgammon_gnubg_pool', GNUBG_POOL.stats() if GNUBG_POOL else {}),
+                          ('backgammon_search_process_pool', SEARCH_PROCESS_POOL.stats() if SEARCH_PROCESS_POOL else {})):
+        lines.extend(metrics.stats_lines(prefix, stats))
+    return Response('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.before_request
+def start_request_profile():
+    """Profile requests that ask for it with X-Profile, or a PROFILE_SAMPLE_RATE share of them"""
+    if request.path.startswith('/api/debug/') or request.path == '/metrics':
+        return
+    if profiling.requested(request.headers.get(profiling.PROFILE_HEADER)):
+        g.profile = profiling.start(f"{request.method} {request.path}")
+
+
+@app.after_request
+def finish_request_profile(response):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        response.headers['X-Profile-Id'] = profile.id
+        if response.is_streamed:
+            # The body has not run yet: keep sampling until the stream is closed
+            response.call_on_close(lambda: profiling.finish(profile, response.status_code))
+        else:
+            profiling.finish(profile, response.status_code)
+    return response
+
+
+@app.teardown_request
+def discard_request_profile(error=None):
+    # Requests that failed before after_request still stop their sampler
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiling.finish(profile, 500)
+
+
+@app.route('/api/debug/profiles', methods=['GET'])
+def list_profiles():
+    """
+    Recently profiled requests of this service worker, newest first (see profiling.py)
+    Each entry has the request, its duration, the sample count and the frames with
+    the most self time; /api/debug/profiles/<id> returns its collapsed stacks.
+    """
+    return jsonify({
+        'profiles': [profile.summary() for profile in profiling.recent()],
+        'headerEnabled': profiling.PROFILE_HEADER_ENABLED,
+        'sampleRate': profiling.PROFILE_SAMPLE_RATE,
+        'intervalMs': profiling.PROFILE_INTERVAL * 1000,
+    })
+
+
+@app.route('/api/debug/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Collapsed stacks of one profile (input for flamegraph.pl or speedscope)"""
+    profile = profiling.get(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return Response(profile.collapsed(), mimetype='text/plain')
+
+
 if __name__ == '__main__':
     print("=" * 50)
     print("Backgammon Arena - GNU Backgammon AI Service")
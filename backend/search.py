@@ -0,0 +1,219 @@
+"""
+Expectiminimax search for CPU move selection
+Looks ahead over the 21 distinct dice rolls (doubles weighted 1/36, the rest
+2/36) to a fixed depth in plies. A ply is one side rolling and playing; depth
+1 is the static ranking the service always did, depth 2 adds every opponent
+reply to each candidate, and so on.
+
+Two things keep this affordable:
+  - move filtering: at every decision node all plays are scored with the cheap
+    static evaluator in one batch and only the best `top_k` are searched deeper
+  - star pruning (Ballard's Star1): equities are bounded to [-1, 1], so a chance
+    node stops expanding rolls once the remaining probability mass can no longer
+    move its value back inside the alpha-beta window
+
+All values are from the CPU's (player 2's) point of view: player 2 maximises,
+player 1 minimises.
+
+A search can be given a deadline; it then raises SearchTimeout as soon as the
+deadline passes, so callers can deepen iteratively and keep the last result.
+A cancel token (anything with a check() method that raises) is checked at the
+same points, so an abandoned search stops promptly.
+"""
+
+import time
+
+from board import CHECKERS_PER_PLAYER
+from movegen import generate_plays
+
+# The 21 distinct rolls and their probabilities
+ROLLS = [((a, b), (1 if a == b else 2) / 36.0) for a in range(1, 7) for b in range(a, 7)]
+
+MIN_EQUITY = -1.0
+MAX_EQUITY = 1.0
+
+
+class SearchTimeout(Exception):
+    """The search deadline passed before the current depth was finished"""
+
+
+class SearchStats:
+    """
+    Work done by a search (reported with the move so depth can be tuned per difficulty).
+    Shared across iterative-deepening passes: nodes and time accumulate, depth is
+    the deepest pass that completed.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.nodes = 0  # Positions generated (plays considered at decision nodes)
+        self.evaluations = 0  # Positions scored by the static evaluator
+        self.cutoffs = 0  # Chance nodes cut short by star pruning
+        self.elapsed = 0.0
+
+    def add(self, stats):
+        """Fold in the as_dict() of a search that ran elsewhere (e.g. in a worker process)"""
+        self.depth = max(self.depth, stats['depth'])
+        self.nodes += stats['nodes']
+        self.evaluations += stats['evaluations']
+        self.cutoffs += stats['cutoffs']
+        self.elapsed += stats['elapsed_ms'] / 1000.0
+
+    def nodes_per_second(self):
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            'depth': self.depth,
+            'nodes': self.nodes,
+            'evaluations': self.evaluations,
+            'cutoffs': self.cutoffs,
+            'elapsed_ms': round(self.elapsed * 1000, 1),
+            'nodes_per_second': round(self.nodes_per_second()),
+        }
+
+
+def _other(player):
+    return 1 if player == 2 else 2
+
+
+class ExpectiminimaxSearch:
+    """
+    n-ply search over full-turn plays.
+    `evaluate` scores a list of Boards statically (CPU's point of view, -1..1),
+    e.g. the service's vectorized evaluate_positions_simple.
+    """
+
+    def __init__(self, evaluate, top_k=3, root_top_k=5, stats=None, deadline=None, cancel=None):
+        self.evaluate = evaluate
+        self.top_k = top_k
+        self.root_top_k = root_top_k
+        self.stats = stats if stats is not None else SearchStats()
+        self.deadline = deadline  # time.time() value, or None for no limit
+        self.cancel = cancel
+
+    def _static(self, boards):
+        self.stats.evaluations += len(boards)
+        values = []
+        pending = []
+        for board in boards:
+            # Finished games are worth a full point (gammons are not modelled)
+            if board.off[1] == CHECKERS_PER_PLAYER:
+                values.append(MAX_EQUITY)
+            elif board.off[0] == CHECKERS_PER_PLAYER:
+                values.append(MIN_EQUITY)
+            else:
+                values.append(None)
+                pending.append(board)
+        if pending:
+            scores = iter(self.evaluate(pending))
+            values = [float(next(scores)) if value is None else value for value in values]
+        return values
+
+    def _children(self, board, player, dice):
+        plays = generate_plays(board, player, dice)
+        if plays:
+            children = [play.board for play in plays]
+        else:
+            # No legal move: the turn passes with the position unchanged
+            child = board.copy()
+            child.current_player = _other(player)
+            children = [child]
+        self.stats.nodes += len(children)
+        return children
+
+    def _best_reply(self, board, player, dice, depth, alpha, beta):
+        """Value after `player` plays `dice` as well as possible and `depth` - 1 further plies follow"""
+        if self.deadline is not None and time.time() > self.deadline:
+            raise SearchTimeout()
+        if self.cancel is not None:
+            self.cancel.check()
+        children = self._children(board, player, dice)
+        static = self._static(children)
+        maximising = player == 2
+
+        if depth <= 1:
+            return max(static) if maximising else min(static)
+
+        ordered = sorted(zip(static, range(len(children))), reverse=maximising)[:self.top_k]
+        best = MIN_EQUITY - 1.0 if maximising else MAX_EQUITY + 1.0
+        for value, index in ordered:
+            child = children[index]
+            if child.off[player - 1] == CHECKERS_PER_PLAYER:
+                value = MAX_EQUITY if maximising else MIN_EQUITY
+            elif maximising:
+                value = self._chance(child, _other(player), depth - 1, max(alpha, best), beta)
+            else:
+                value = self._chance(child, _other(player), depth - 1, alpha, min(beta, best))
+            if maximising:
+                best = max(best, value)
+                if best >= beta:
+                    break
+            else:
+                best = min(best, value)
+                if best <= alpha:
+                    break
+        return best
+
+    def _chance(self, board, player, depth, alpha, beta):
+        """Expected value with `player` to roll (Star1 pruning inside the (alpha, beta) window)"""
+        total = 0.0
+        remaining = 1.0
+        for dice, weight in ROLLS:
+            remaining -= weight
+            # Window for this roll such that the node's value could still land inside (alpha, beta)
+            child_alpha = max(MIN_EQUITY, (alpha - total - remaining * MAX_EQUITY) / weight)
+            child_beta = min(MAX_EQUITY, (beta - total - remaining * MIN_EQUITY) / weight)
+            total += weight * self._best_reply(board, player, dice, depth, child_alpha, child_beta)
+
+            if total + remaining * MAX_EQUITY <= alpha:
+                self.stats.cutoffs += 1
+                return total + remaining * MAX_EQUITY
+            if total + remaining * MIN_EQUITY >= beta:
+                self.stats.cutoffs += 1
+                return total + remaining * MIN_EQUITY
+        return total
+
+    def rank(self, plays, player, depth):
+        """
+        Rank the root plays for `player` (the side that rolled), best first.
+        The top `root_top_k` plays by static score are searched to `depth` plies;
+        the rest keep their static score and rank after them.
+        Returns [(play, score), ...]. Scores of searched plays other than the best
+        may be bounds (they were only proven worse than the best).
+        Raises SearchTimeout if the deadline passes first.
+        """
+        start_time = time.time()
+        try:
+            ranked = self._rank(plays, player, depth)
+        finally:
+            self.stats.elapsed += time.time() - start_time
+        self.stats.depth = depth
+        return ranked
+
+    def _rank(self, plays, player, depth):
+        maximising = player == 2
+
+        static = self._static([play.board for play in plays])
+        self.stats.nodes += len(plays)
+        ranked = sorted(zip(static, range(len(plays))), reverse=maximising)
+
+        if depth <= 1:
+            return [(plays[index], value) for value, index in ranked]
+
+        searched = []
+        best = MIN_EQUITY - 1.0 if maximising else MAX_EQUITY + 1.0
+        for _, index in ranked[:self.root_top_k]:
+            board = plays[index].board
+            if board.off[player - 1] == CHECKERS_PER_PLAYER:
+                value = MAX_EQUITY if maximising else MIN_EQUITY
+            elif maximising:
+                value = self._chance(board, _other(player), depth - 1, max(MIN_EQUITY, best), MAX_EQUITY)
+            else:
+                value = self._chance(board, _other(player), depth - 1, MIN_EQUITY, min(MAX_EQUITY, best))
+            best = max(best, value) if maximising else min(best, value)
+            searched.append((value, index))
+
+        searched.sort(reverse=maximising)
+        return ([(plays[index], value) for value, index in searched] +
+                [(plays[index], value) for value, index in ranked[self.root_top_k:]])
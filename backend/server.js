@@ -5,6 +5,9 @@ import { Server } from 'socket.io';
 import dotenv from 'dotenv';
 import fetch from 'node-fetch';
 import { supabase } from './supabase.js';
+import {
+  MOVE_MEDIA_TYPE, decodeMoveBatchResponse, decodeMoveResponse, encodeMoveRequest, stepToLegalMove
+} from './moveWire.js';
 
 // Load environment variables
 dotenv.config();
@@ -23,6 +26,11 @@ if (supabase) {
 }
 
 const PYTHON_AI_SERVICE_URL = process.env.PYTHON_AI_SERVICE_URL || 'http://localhost:5000';
+// CPU turns go to the Python service in its compact binary format unless PYTHON_AI_BINARY=0
+const PYTHON_AI_BINARY = process.env.PYTHON_AI_BINARY !== '0';
+// Binary CPU turns arriving within this many ms of each other go to the service as one batch (0 = no batching)
+const CPU_MOVE_BATCH_WINDOW_MS = Number(process.env.CPU_MOVE_BATCH_WINDOW_MS ?? 5);
+const CPU_MOVE_BATCH_MAX = Number(process.env.CPU_MOVE_BATCH_MAX || 32);
 
 const app = express();
 const httpServer = createServer(app);
@@ -49,9 +57,86 @@ app.get('/api/health', (req, res) => {
   res.json({ status: 'ok', message: 'Backgammon Arena API is running' });
 });
 
+// JSON reply for the browser from a decoded binary move response; null when the
+// play is not among the client's legalMoves (the JSON request then ranks those moves)
+function cpuMoveFromWire(data, { gameState, legalMoves = [] }) {
+  const move = data.moves.length ? stepToLegalMove(data.moves[0], gameState, legalMoves) : null;
+  if (move === null) return null;
+  return { ...data, move, from: data.moves[0].from };
+}
+
+async function fetchBinaryCpuMove(request, body) {
+  const response = await fetch(`${PYTHON_AI_SERVICE_URL}/api/cpu/move`, {
+    method: 'POST',
+    headers: { 'Content-Type': MOVE_MEDIA_TYPE, 'Accept': MOVE_MEDIA_TYPE },
+    body
+  });
+  if (!response.ok || !(response.headers.get('content-type') || '').startsWith(MOVE_MEDIA_TYPE)) return null;
+  return cpuMoveFromWire(decodeMoveResponse(await response.arrayBuffer()), request);
+}
+
+// CPU turns waiting for the current batch window: { request, body, resolve }
+let pendingCpuMoves = [];
+let cpuMoveBatchTimer = null;
+
+async function flushCpuMoves() {
+  clearTimeout(cpuMoveBatchTimer);
+  cpuMoveBatchTimer = null;
+  const batch = pendingCpuMoves;
+  pendingCpuMoves = [];
+  if (batch.length === 1) {
+    const [{ request, body, resolve }] = batch;
+    resolve(await fetchBinaryCpuMove(request, body).catch((error) => {
+      console.error('Error calling Python AI service:', error);
+      return null;
+    }));
+    return;
+  }
+
+  try {
+    const response = await fetch(`${PYTHON_AI_SERVICE_URL}/api/cpu/move/batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': MOVE_MEDIA_TYPE, 'Accept': MOVE_MEDIA_TYPE },
+      body: Buffer.concat(batch.map((item) => item.body))
+    });
+    if (!response.ok || !(response.headers.get('content-type') || '').startsWith(MOVE_MEDIA_TYPE)) {
+      throw new Error(`batch request failed with status ${response.status}`);
+    }
+    const results = decodeMoveBatchResponse(await response.arrayBuffer());
+    // Games that failed in the batch are retried on their own as JSON requests
+    batch.forEach((item, i) => {
+      const [data, status] = results[i] || [null, 0];
+      item.resolve(status === 200 ? cpuMoveFromWire(data, item.request) : null);
+    });
+  } catch (error) {
+    console.error('Error calling Python AI service batch:', error);
+    batch.forEach((item) => item.resolve(null));
+  }
+}
+
+// CPU move in the binary format (see moveWire.js), coalesced with other tables' turns
+// arriving in the same window; null when the turn needs the JSON request
+function queueBinaryCpuMove(request) {
+  const body = encodeMoveRequest(request.gameState, request.difficulty, request.deadlineMs);
+  if (!body) return Promise.resolve(null);
+  if (!(CPU_MOVE_BATCH_WINDOW_MS > 0)) return fetchBinaryCpuMove(request, body);
+  return new Promise((resolve) => {
+    pendingCpuMoves.push({ request, body, resolve });
+    if (pendingCpuMoves.length >= CPU_MOVE_BATCH_MAX) {
+      flushCpuMoves();
+    } else if (!cpuMoveBatchTimer) {
+      cpuMoveBatchTimer = setTimeout(flushCpuMoves, CPU_MOVE_BATCH_WINDOW_MS);
+    }
+  });
+}
+
 // Proxy CPU move requests to Python AI service
 app.post('/api/cpu/move', async (req, res) => {
   try {
+    if (PYTHON_AI_BINARY) {
+      const data = await queueBinaryCpuMove(req.body);
+      if (data) return res.json(data);
+    }
     const response = await fetch(`${PYTHON_AI_SERVICE_URL}/api/cpu/move`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
@@ -97,6 +182,30 @@ app.post('/api/evaluate', async (req, res) => {
   }
 });
 
+// Whole-game analysis: the Python service streams one line per turn (NDJSON,
+// or SSE when asked for text/event-stream), passed through as it arrives
+app.post('/api/analyze/game', async (req, res) => {
+  try {
+    const response = await fetch(`${PYTHON_AI_SERVICE_URL}/api/analyze/game`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', Accept: req.get('Accept') || 'application/x-ndjson' },
+      body: JSON.stringify(req.body)
+    });
+    res.status(response.status);
+    res.set('Content-Type', response.headers.get('content-type'));
+    res.set('Cache-Control', 'no-cache');
+    res.flushHeaders();
+    response.body.pipe(res);
+    // The response closes early when the client disconnects; stop reading from the service
+    res.on('close', () => {
+      if (!res.writableFinished) response.body.destroy();
+    });
+  } catch (error) {
+    console.error('Error calling Python AI service for game analysis:', error);
+    res.status(500).json({ error: 'AI service unavailable' });
+  }
+});
+
 // Matchmaking queues
 const guestQueue = []; // Simple queue for guest matchmaking
 const rankedQueue = []; // Array of { socketId, userId, elo, timestamp } for ranked matchmaking
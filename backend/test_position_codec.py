@@ -0,0 +1,116 @@
+"""
+Round trips and known GNU Backgammon identifiers for position_codec.py
+
+Run with `python -m pytest` from the backend directory.
+"""
+
+import random
+
+import pytest
+
+from board import Board, starting_board
+from position_codec import (CHECKERS_PER_PLAYER, GAME_DROPPED, GAME_NONE, MATCH_ID_LENGTH, NUM_POINTS,
+                            POSITION_ID_LENGTH, decode_match_id, decode_position_id, decode_position_key,
+                            match_id, position_id, position_key)
+
+START_POSITION_ID = '4HPwATDgc/ABMA'
+
+
+def start_points():
+    points = [[0] * NUM_POINTS, [0] * NUM_POINTS]
+    for point, (player, count) in {0: (1, 2), 11: (1, 5), 16: (1, 3), 18: (1, 5),
+                                   23: (2, 2), 12: (2, 5), 7: (2, 3), 5: (2, 5)}.items():
+        points[player - 1][point] = count
+    return points
+
+
+def random_positions(count, seed=1):
+    """(points, bar, off, on_roll) for `count` random positions, bar and borne-off checkers included"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        points, bar, off = [[0] * NUM_POINTS, [0] * NUM_POINTS], [0, 0], [0, 0]
+        for player in (1, 2):
+            for _ in range(rng.randint(0, CHECKERS_PER_PLAYER)):
+                spot = rng.randint(-1, NUM_POINTS - 1)
+                if spot < 0:
+                    bar[player - 1] += 1
+                else:
+                    points[player - 1][spot] += 1
+            off[player - 1] = CHECKERS_PER_PLAYER - sum(points[player - 1]) - bar[player - 1]
+        yield points, bar, off, rng.choice((1, 2))
+
+
+@pytest.mark.parametrize('on_roll', [1, 2])
+def test_start_position_id(on_roll):
+    assert position_id(start_points(), [0, 0], on_roll) == START_POSITION_ID
+    assert decode_position_id(START_POSITION_ID, on_roll) == (start_points(), [0, 0], [0, 0])
+
+
+@pytest.mark.parametrize('on_roll', [1, 2])
+def test_board_uses_the_codec(on_roll):
+    board = starting_board()
+    assert board.position_id(on_roll) == START_POSITION_ID
+    decoded = Board.from_position_id(START_POSITION_ID, on_roll)
+    assert decoded.key() == board.key()
+    assert decoded.current_player == on_roll
+
+
+def test_position_round_trips():
+    for points, bar, off, on_roll in random_positions(2000):
+        key = position_key(points, bar, on_roll)
+        assert decode_position_key(key, on_roll) == (points, bar, off)
+        text = position_id(points, bar, on_roll)
+        assert len(text) == POSITION_ID_LENGTH
+        assert decode_position_id(text, on_roll) == (points, bar, off)
+
+
+def test_mirrored_position_has_the_same_key():
+    # The key is written from the side on roll, so the colour-swapped position seen from the other side matches
+    for points, bar, _, on_roll in random_positions(500, seed=2):
+        mirrored = [points[1][::-1], points[0][::-1]]
+        assert position_key(mirrored, bar[::-1], 1 if on_roll == 2 else 2) == position_key(points, bar, on_roll)
+
+
+@pytest.mark.parametrize('text', ['4HPwATDgc/AB', '4HPwATDgc/AB!A', '//////////////'])
+def test_invalid_position_ids(text):
+    with pytest.raises(ValueError):
+        decode_position_id(text, 2)
+
+
+@pytest.mark.parametrize('text, fields', [
+    # Money game, gnubg's player 1 (our player 2) to roll
+    ('cAkAAAAAAAAA', {'on_roll': 2, 'turn': 2}),
+    # The example in the GNU Backgammon manual: 9-point match at 2-4, 52 rolled, cube on 2 owned by player 0
+    ('QYkqASAAIAAA', {'on_roll': 2, 'dice': (5, 2), 'cube_value': 2, 'cube_owner': 1, 'match_length': 9,
+                      'score': (2, 4)}),
+])
+def test_known_match_ids(text, fields):
+    assert match_id(**fields) == text
+    decoded = decode_match_id(text)
+    assert {name: decoded[name] for name in fields} == fields
+
+
+def test_match_id_round_trips():
+    rng = random.Random(3)
+    for _ in range(2000):
+        fields = {
+            'on_roll': rng.choice((1, 2)),
+            'dice': (rng.randint(1, 6), rng.randint(1, 6)) if rng.random() < 0.5 else None,
+            'cube_value': 1 << rng.randint(0, 6),
+            'cube_owner': rng.choice((None, 1, 2)),
+            'match_length': rng.choice((0, 5, 7, 25)),
+            'score': (rng.randint(0, 24), rng.randint(0, 24)),
+            'crawford': rng.random() < 0.2,
+            'game_state': rng.randint(GAME_NONE, GAME_DROPPED),
+            'turn': rng.choice((1, 2)),
+            'double_offered': rng.random() < 0.2,
+            'resigned': rng.randint(0, 3),
+        }
+        text = match_id(**fields)
+        assert len(text) == MATCH_ID_LENGTH
+        assert decode_match_id(text) == fields
+
+
+def test_invalid_cube_value():
+    with pytest.raises(ValueError):
+        match_id(1, cube_value=3)
@@ -0,0 +1,106 @@
+"""
+Train the neural evaluator used by nn_eval.py by TD self-play
+
+Usage:
+    python train_nn.py [games] [weights path]
+
+The network plays against itself, each side choosing the play whose resulting
+position the network rates best. After every play the previous position's
+outputs are moved towards the outputs for the new position (TD(0)), and the
+final position towards the actual result (win, gammon or backgammon).
+Training continues from the weights file if it exists and saves a checkpoint
+every 1000 games. Expect about 30 games per second on one core; useful play
+needs tens of thousands of games, strong play several hundred thousand.
+"""
+
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+from board import CHECKERS_PER_PLAYER, HOME_BOARD, starting_board
+from movegen import generate_plays
+from nn_eval import (DEFAULT_NN_WEIGHTS_PATH, LOSE_BACKGAMMON, LOSE_GAMMON, NUM_OUTPUTS, WIN, WIN_BACKGAMMON,
+                     WIN_GAMMON, NeuralEvaluator, cubeless_equity, encode_boards)
+
+LEARNING_RATE = 0.1
+CHECKPOINT_GAMES = 1000
+
+
+def result_outputs(board, winner):
+    """Target outputs (CPU's point of view) once `winner` has borne off every checker"""
+    loser = 1 if winner == 2 else 2
+    gammon = board.off[loser - 1] == 0
+    backgammon = gammon and (board.bar[loser - 1] > 0 or board.player_points(loser)[HOME_BOARD[winner]].any())
+    target = np.zeros(NUM_OUTPUTS, dtype=np.float32)
+    if winner == 2:
+        target[[WIN, WIN_GAMMON, WIN_BACKGAMMON]] = 1.0, gammon, backgammon
+    else:
+        target[[LOSE_GAMMON, LOSE_BACKGAMMON]] = gammon, backgammon
+    return target
+
+
+def td_update(network, inputs, target):
+    """One gradient step moving the network's outputs for `inputs` towards `target`"""
+    hidden, outputs = network.forward(inputs[None, :])
+    output_delta = (target - outputs) * outputs * (1.0 - outputs)
+    hidden_delta = (output_delta @ network.output_weights.T) * hidden * (1.0 - hidden)
+    network.output_weights += LEARNING_RATE * hidden.T @ output_delta
+    network.output_bias += LEARNING_RATE * output_delta[0]
+    network.hidden_weights += LEARNING_RATE * inputs[:, None] @ hidden_delta
+    network.hidden_bias += LEARNING_RATE * hidden_delta[0]
+
+
+def play_training_game(network):
+    """Self-play one game, updating the network after every play. Returns the winner."""
+    player = random.choice((1, 2))
+    board = starting_board(player)
+    previous = None
+    while True:
+        dice = [random.randint(1, 6), random.randint(1, 6)]
+        plays = generate_plays(board, player, dice)
+        if plays:
+            inputs = encode_boards([play.board for play in plays])
+            outputs = network.forward(inputs)[1]
+            equities = cubeless_equity(outputs)
+            choice = int(np.argmax(equities)) if player == 2 else int(np.argmin(equities))
+            board, current, current_outputs = plays[choice].board, inputs[choice], outputs[choice]
+        else:
+            board = board.copy()
+            board.current_player = 1 if player == 2 else 2
+            current = encode_boards([board])[0]
+            current_outputs = network.forward(current[None, :])[1][0]
+
+        if previous is not None:
+            td_update(network, previous, current_outputs)
+        if board.off[player - 1] == CHECKERS_PER_PLAYER:
+            td_update(network, current, result_outputs(board, player))
+            return player
+        previous = current
+        player = board.current_player
+
+
+def train(games, path):
+    if os.path.exists(path):
+        network = NeuralEvaluator.load(path)
+        print(f"Continuing from {path} ({network.hidden_units} hidden units)")
+    else:
+        network = NeuralEvaluator.random()
+        print(f"Starting a new network ({network.hidden_units} hidden units)")
+
+    start_time = time.time()
+    for game in range(1, games + 1):
+        play_training_game(network)
+        if game % CHECKPOINT_GAMES == 0 or game == games:
+            network.save(path)
+            elapsed = time.time() - start_time
+            print(f"{game} games in {elapsed:.0f}s ({game / elapsed:.1f} games/s), saved {path}")
+    print(f"✓ Trained {games} games")
+
+
+if __name__ == '__main__':
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    path = sys.argv[2] if len(sys.argv) > 2 else (os.environ.get('NN_WEIGHTS_PATH') or DEFAULT_NN_WEIGHTS_PATH)
+    train(games, path)
@@ -3167,10 +3167,11 @@ function GameBoard() {
       }
       
       try {
-        const bestMoveFromAI = await getCpuMove(gameState, cpuDifficulty, legalMovesForAI);
+        const aiMove = await getCpuMove(gameState, cpuDifficulty, legalMovesForAI);
+        const bestMoveFromAI = aiMove ? aiMove.move : null;
         if (bestMoveFromAI !== null && bestMoveFromAI !== undefined) {
           // Find the move object that matches the AI's recommendation
-          const matchingMove = allPossibleMoves.find(m => {
+          const sameMove = (m) => {
             // Handle different move formats
             if (typeof bestMoveFromAI === 'number') {
               return m.move === bestMoveFromAI || (typeof m.move === 'number' && m.move === bestMoveFromAI);
@@ -3178,7 +3179,11 @@ function GameBoard() {
               return String(m.move) === String(bestMoveFromAI);
             }
             return false;
-          });
+          };
+          // Several checkers can reach the same point: move the one the AI chose when it says which
+          const sameChecker = (m) => aiMove.from === 'bar' ? m.type === 'bar' : m.type !== 'bar' && m.checker.point === aiMove.from;
+          const matchingMove = (aiMove.from !== null && allPossibleMoves.find(m => sameMove(m) && sameChecker(m)))
+            || allPossibleMoves.find(sameMove);
           if (matchingMove) {
             moveToExecute = matchingMove;
           } else {
@@ -15,7 +15,9 @@
  * @param {Object} gameState - Current game state
  * @param {number} difficulty - Difficulty level (1-10)
  * @param {Array} legalMoves - Array of legal moves
- * @returns {Promise<Object|null>} - Best move object or null if no valid moves
+ * @returns {Promise<Object|null>} - { move, from } or null if no valid moves. `move` is an
+ *   entry of legalMoves; `from` is the point (or 'bar') of the checker the AI chose to move,
+ *   when the AI service knew it, since several checkers can share the same legal move.
  */
 export async function getCpuMove(gameState, difficulty, legalMoves = []) {
   try {
@@ -36,7 +38,8 @@ export async function getCpuMove(gameState, difficulty, legalMoves = []) {
     }
     
     const data = await response.json();
-    return data.move || null;
+    if (data.move === null || data.move === undefined) return null;
+    return { move: data.move, from: data.from ?? null };
   } catch (error) {
     console.error('Error getting CPU move:', error);
     // Fallback: return null (CPU will pass)